@@ -21,6 +21,7 @@ from ab.cli import (
     station,
     troposphere,
     download,
+    journal,
 )
 
 log = logging.getLogger(__name__)
@@ -64,6 +65,7 @@ main.add_command(logs.logs)
 main.add_command(qc.qc)
 main.add_command(dateinfo.dateinfo, aliases=["dt"])
 main.add_command(download.download, aliases=["dl"])
+main.add_command(journal.journal)
 main.add_command(campaign.campaign, aliases=["c"])
 main.add_command(station.station, aliases=["st"])
 main.add_command(troposphere.troposphere, aliases=["tr"])
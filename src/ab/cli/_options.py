@@ -4,6 +4,7 @@ Common command-line options
 """
 
 import typing as t
+from pathlib import Path
 
 import click
 from click.core import (
@@ -36,6 +37,30 @@ force = click.option(
     "-f", "--force", help="Force action.", required=False, is_flag=True
 )
 
+refresh = click.option(
+    "-r",
+    "--refresh",
+    help="Ignore cached remote-directory listings.",
+    required=False,
+    is_flag=True,
+)
+
+report = click.option(
+    "--report",
+    "reports",
+    multiple=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write a report of the transfers to given .json or .csv file.",
+)
+
+watch = click.option(
+    "-w",
+    "--watch",
+    help="Keep polling the sources and download new files until interrupted.",
+    required=False,
+    is_flag=True,
+)
+
 # General input
 ipath = click.option("-i", "--ipath", type=str)
 opath = click.option("-o", "--opath", type=str)
@@ -3,7 +3,7 @@ Common command-output
 
 """
 
-import os
+import shutil
 from typing import Final
 from collections.abc import Iterable
 import logging
@@ -14,7 +14,7 @@ from ab.tasks import Task
 
 log = logging.getLogger(__name__)
 
-TERM_WIDTH: Final = os.get_terminal_size().columns
+TERM_WIDTH: Final = shutil.get_terminal_size().columns
 
 
 def divide(fill: str = "=", /) -> str:
@@ -3,11 +3,30 @@ Command-line interface for downloading external and local data sources
 
 """
 
+import json
+import csv
+import time
+import heapq
+import datetime as dt
 import logging
+from pathlib import Path
 from types import ModuleType
-from dataclasses import asdict
+from typing import (
+    Any,
+    Final,
+)
+from collections.abc import Iterator
+from contextlib import contextmanager
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    Future,
+    FIRST_COMPLETED,
+    as_completed,
+    wait,
+)
 
 import click
+import humanize
 from click_aliases import ClickAliasedGroup
 from rich import print
 from rich.console import Console
@@ -23,11 +42,18 @@ from ab.cli import (
 from ab import configuration
 from ab.configuration import sources as _sources
 from ab.bsw import campaign as _campaign
+from ab.data.source import Source
 from ab.data import (
     TransferStatus,
+    cache as _cache,
+    claims as _claims,
+    limits as _limits,
     ftp as _ftp,
     http as _http,
     file as _file,
+    sftp as _sftp,
+    rsync as _rsync,
+    mirrors as _mirrors,
 )
 
 log = logging.getLogger(__name__)
@@ -38,26 +64,261 @@ PROTOCOLS: dict[str, ModuleType] = dict(
     http=_http,
     https=_http,
     file=_file,
+    sftp=_sftp,
+    rsync=_rsync,
+    **{"rsync+ssh": _rsync},
 )
 
+POLL_INTERVAL: Final = 900
+"Default number of seconds between polls of each source, when watching"
+
+
+@contextmanager
+def _closing_connections() -> Iterator[None]:
+    """
+    Keep pooled connections open across all sources and close them afterwards.
+
+    """
+    try:
+        yield
+    finally:
+        _ftp.close_pools()
+
+
+def _download(
+    source: Source, listings: dict[str, list[str]] | None = None
+) -> TransferStatus:
+    """
+    Download a single source, catching any error, so that it does not stop the
+    other sources being downloaded at the same time.
+
+    Given `listings`, only files that are not in the remote-directory listings
+    from the previous download of the source are downloaded.
+
+    A source with mirrors is downloaded from the fastest of them.
+
+    """
+    msg = f"Download: {source.identifier}: {source.description}"
+    log.info(msg)
+    started = time.monotonic()
+    try:
+        if source.mirrors:
+            status = _mirrors.download(source, PROTOCOLS, listings=listings)
+        else:
+            status = PROTOCOLS[source.protocol].download(source, listings=listings)
+    except Exception as e:
+        log.exception(f"Download of {source.identifier} failed ...")
+        status = TransferStatus(failed=1, exceptions=[e])
+    status.elapsed = time.monotonic() - started
+    return status
+
+
+COUNTS: Final = (
+    "existing",
+    "success",
+    "failed",
+    "not_found",
+    "skipped",
+    "linked",
+    "mismatch",
+)
+"Counts shown in the transfer-status table"
+
+
+def _row(status: TransferStatus) -> list[str]:
+    """
+    Return counts, size, time, throughput and number of errors for the
+    transfer-status table.
+
+    """
+    return [str(getattr(status, count)) for count in COUNTS] + [
+        humanize.naturalsize(status.bytes, gnu=True),
+        f"{status.elapsed:.0f}s",
+        f"{humanize.naturalsize(status.throughput, gnu=True)}/s",
+        str(len(status.exceptions)),
+    ]
+
+
+def _hosts(status: TransferStatus) -> dict[str, dict[str, Any]]:
+    return {
+        host: dict(
+            files=host_status.files,
+            bytes=host_status.bytes,
+            seconds=host_status.seconds,
+            throughput=host_status.throughput,
+        )
+        for (host, host_status) in status.hosts.items()
+    }
+
+
+def _write_report(
+    fname: Path, statuses: list[tuple[Source, TransferStatus]], total: TransferStatus
+) -> None:
+    """
+    Write status of each source, the transfers from each host and the total
+    status to given JSON or CSV file.
+
+    """
+    finished = dt.datetime.now().isoformat(timespec="seconds")
+    fname.parent.mkdir(parents=True, exist_ok=True)
+
+    if fname.suffix.lower() == ".json":
+        report = dict(
+            finished=finished,
+            sources=[
+                dict(
+                    identifier=source.identifier,
+                    protocol=source.protocol,
+                    host=source.host,
+                    **status.summary(),
+                    hosts=_hosts(status),
+                )
+                for (source, status) in statuses
+            ],
+            total=dict(**total.summary(), hosts=_hosts(total)),
+        )
+        fname.write_text(json.dumps(report, indent=2))
+        return
+
+    # One row for each source, each host and the total
+    rows: list[dict[str, Any]] = [
+        dict(
+            scope="source",
+            identifier=source.identifier,
+            protocol=source.protocol,
+            host=source.host,
+            **status.summary(),
+        )
+        for (source, status) in statuses
+    ]
+    rows.extend(
+        dict(scope="host", host=host, **values)
+        for (host, values) in _hosts(total).items()
+    )
+    rows.append(dict(scope="total", **total.summary()))
+
+    fieldnames = ["finished", "scope", "identifier", "protocol", "host", "files"]
+    fieldnames += list(total.summary())
+    with open(fname, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerows(dict(finished=finished, **row) for row in rows)
+
+
+def _watch(sources: list[Source], interval: int | float, console: Console) -> None:
+    """
+    Poll each source on its own interval, until interrupted, and download the
+    files that appeared since the previous poll.
+
+    The first poll of a source lists and checks all its files. Later polls
+    compare each remote directory with its listing from the previous poll, and
+    download only the new files. After a poll with errors, the source is
+    checked completely again at the next poll.
+
+    Configuration, resolved sources and connections are kept between polls.
+
+    """
+    intervals = [source.poll_interval or interval for source in sources]
+    # Remote-directory listings from the previous poll of each source
+    listings: list[dict[str, list[str]] | None] = [None] * len(sources)
+    # Indices of sources by the time they are due to be polled
+    due = [(time.monotonic(), index) for index in range(len(sources))]
+
+    with (
+        _closing_connections(),
+        ThreadPoolExecutor(
+            max_workers=len(sources), thread_name_prefix="source"
+        ) as executor,
+    ):
+        running: dict[Future[TransferStatus], tuple[int, dict[str, list[str]]]] = {}
+        try:
+            while True:
+                now = time.monotonic()
+                if due and due[0][0] <= now:
+                    # Directories must be listed again, and files may be new.
+                    _cache.get_cache().new_run()
+                    # Files fetched by earlier polls may have changed since,
+                    # but sources still running hold the claims of the files
+                    # they fetch, which must be shared with sources started now.
+                    _claims.get_claims().forget_fetched()
+                while due and due[0][0] <= now:
+                    _, index = heapq.heappop(due)
+                    current: dict[str, list[str]] = {}
+                    # An empty listing means a full pass for the protocols.
+                    previous = listings[index]
+                    if previous is not None:
+                        current.update(previous)
+                    future = executor.submit(_download, sources[index], current)
+                    running[future] = (index, current)
+
+                timeout = max(due[0][0] - now, 0) if due else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, current = running.pop(future)
+                    source = sources[index]
+                    status = future.result()
+                    incomplete = status.failed or status.mismatch or status.exceptions
+                    listings[index] = None if incomplete else current
+                    heapq.heappush(due, (time.monotonic() + intervals[index], index))
+
+                    stamp = dt.datetime.now().isoformat(timespec="seconds")
+                    counts = ", ".join(
+                        f"{key}={getattr(status, key)}"
+                        for key in COUNTS
+                        if getattr(status, key)
+                    )
+                    console.print(
+                        f"{stamp} {source.identifier}: {counts or 'no files'}",
+                        markup=False,
+                    )
+                    for exception in status.exceptions:
+                        console.print(
+                            f"{source.identifier}: {exception!r}", markup=False
+                        )
+
+        except KeyboardInterrupt:
+            log.info("Interrupted by user. Stop watching sources ...")
+            executor.shutdown(wait=False, cancel_futures=True)
+
 
 @click.command
 @_options.identifiers
 @_options.exclude
 @_options.force
+@_options.refresh
+@_options.report
+@_options.watch
 @_options.campaign
 @_options.yes
 def download(
     identifiers: list[str] | None,
     exclude: list[str] | None = None,
     force: bool = False,
+    refresh: bool = False,
+    reports: list[Path] | None = None,
+    watch: bool = False,
     name: str | None = None,
     yes: bool = False,
 ) -> None:
     """
     Download sources in common or campaign configuration file.
 
+    With `--watch`, the sources are polled for new files until interrupted.
+
     """
+    if watch and reports:
+        raise click.BadParameter(
+            "Reports are not written, when watching sources ...",
+            param_hint="--report",
+        )
+
+    for report in reports or []:
+        if report.suffix.lower() not in (".json", ".csv"):
+            raise click.BadParameter(
+                f"Expected a .json or .csv file. Got {report} ...",
+                param_hint="--report",
+            )
+
     if name is not None:
         log.info(f"Using campaign configuration from {name} ...")
         config = _campaign.load(name)
@@ -95,7 +356,7 @@ def download(
         table.add_row(
             source.identifier,
             source.description,
-            str(len(source.resolve())),
+            str(source.count()),
         )
     console = Console()
     console.print(table)
@@ -113,34 +374,77 @@ def download(
     if force:
         for source in sources:
             source.max_age = 0
+            source.sync = False
+            source.retry_interval = 0
+
+    # Remove cached directory listings
+    if refresh:
+        cache = _cache.get_cache()
+        for host in {source.host for source in sources}:
+            cache.invalidate(host)
+
+    # Limit concurrent transfers
+    settings = config.get("download", {})
+    _limits.configure(
+        settings.get("max_transfers"),
+        settings.get("max_transfers_per_host"),
+        settings.get("adaptive", False),
+    )
+
+    if watch:
+        interval = settings.get("poll_interval", POLL_INTERVAL)
+        log.info(f"Watching {len(sources)} sources every {interval} seconds ...")
+        _watch(sources, interval, console)
+        return
 
     # Prepare output layout
-    table = Table(title="Transfer Status", box=box.HORIZONTALS)
+    table = Table(title="Transfer Status", box=box.HORIZONTALS, collapse_padding=True)
     table.add_column("Identifier", no_wrap=True)
     table.add_column("Proto")
-    for key in asdict(TransferStatus()):
+    for key in COUNTS + ("size", "time", "rate", "errors"):
         table.add_column(key, justify="right")
 
-    with Live(table, console=console, screen=False, refresh_per_second=4) as live:
+    # Remote files shared by several sources are fetched once and linked
+    _claims.reset()
+
+    with (
+        Live(table, console=console, screen=False, refresh_per_second=4) as live,
+        _closing_connections(),
+        ThreadPoolExecutor(
+            max_workers=len(sources), thread_name_prefix="source"
+        ) as executor,
+    ):
+
+        started = time.monotonic()
+        futures = {executor.submit(_download, source): source for source in sources}
 
+        statuses: list[tuple[Source, TransferStatus]] = []
         status_total: TransferStatus = TransferStatus()
-        for source in sources:
-            msg = f"Download: {source.identifier}: {source.description}"
-            log.info(msg)
-            # live.console.print(msg)
+        try:
+            for future in as_completed(futures):
+                source = futures[future]
+                status = future.result()
+                statuses.append((source, status))
+                status_total += status
+                table.add_row(source.identifier, source.protocol, *_row(status))
 
-            agent = PROTOCOLS[source.protocol]
-            status = agent.download(source)
-            status_total += status
+        except KeyboardInterrupt:
+            log.info("Interrupted by user. Cancelling remaining sources ...")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
-            args = [source.identifier, source.protocol] + [
-                f"{total}" for total in asdict(status).values()
-            ]
-            table.add_row(*args)
+        log.debug("Finished downloading sources ...")
+        # The sources were downloaded at the same time
+        status_total.elapsed = time.monotonic() - started
 
-        else:
-            log.debug("Finished downloading sources ...")
-            # Add a line and print the totals
-            table.add_section()
-            args = ["", ""] + [f"{total}" for total in asdict(status_total).values()]
-            table.add_row(*args)
+        # Add a line and print the totals
+        table.add_section()
+        table.add_row("", "", *_row(status_total))
+
+    for source, status in statuses:
+        for exception in status.exceptions:
+            console.print(f"{source.identifier}: {exception!r}", markup=False)
+
+    for report in reports or []:
+        log.info(f"Write transfer report to {report} ...")
+        _write_report(report, statuses, status_total)
@@ -0,0 +1,41 @@
+"""
+Command-line interface for the journal of transferred files
+
+"""
+
+import logging
+
+import click
+from click_aliases import ClickAliasedGroup
+from rich import print
+
+from ab.data import journal as _journal
+
+log = logging.getLogger(__name__)
+
+
+@click.group(cls=ClickAliasedGroup, invoke_without_command=True)
+@click.pass_context
+def journal(ctx: click.Context) -> None:
+    """
+    Maintain the journal of files transferred by `ab download`.
+
+    """
+    if ctx.invoked_subcommand is None:
+        click.echo(ctx.get_help())
+
+
+@journal.command
+def reconcile() -> None:
+    """
+    Remove journal entries for files deleted or changed on disk.
+
+    Files whose entries are removed are checked on disk, the next time they are
+    downloaded.
+
+    """
+    log.info("Reconcile transfer journal with the files on disk ...")
+    checked, removed = _journal.reconcile(_journal.get_journal())
+    msg = f"Checked {checked} journal entries and removed {removed} ..."
+    log.info(msg)
+    print(msg)
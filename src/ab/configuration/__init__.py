@@ -157,6 +157,22 @@ def _common_config() -> Path:
     return Path(common_config)
 
 
+def _cache() -> Path:
+    cache = _runtime().get("cache")
+    # The path is a string or, with the `!Path` tag, a Path instance.
+    if not isinstance(cache, (str, Path)):
+        raise RuntimeError("No `cache` sub section found ...")
+    return Path(cache)
+
+
+def _journal() -> Path:
+    journal = _runtime().get("journal")
+    # The path is a string or, with the `!Path` tag, a Path instance.
+    if not isinstance(journal, (str, Path)):
+        raise RuntimeError("No `journal` sub section found ...")
+    return Path(journal)
+
+
 def _campaign_templates() -> Path:
 
     campaign_templates = _runtime().get("campaign_templates")
@@ -3,10 +3,59 @@ Transfer and manage local and remote data sources.
 
 """
 
+from typing import Any
+from types import TracebackType
+from collections.abc import (
+    Callable,
+    Iterator,
+    Mapping,
+)
 from dataclasses import (
     dataclass,
     field,
+    fields,
+)
+from concurrent.futures import (
+    Executor,
+    Future,
+    wait,
+    FIRST_COMPLETED,
+)
+import logging
+
+from ab.data.source import (
+    Source,
+    RemoteLocalPair,
 )
+from ab.data.cache import get_cache
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class HostStatus:
+    """
+    Files and bytes transferred from a single host, and the time it took.
+
+    """
+
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second of transfer time
+
+        """
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __add__(self, other: "HostStatus") -> "HostStatus":
+        self.files += other.files
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        return self
 
 
 @dataclass
@@ -15,13 +64,166 @@ class TransferStatus:
     success: int = 0
     failed: int = 0
     not_found: int = 0
+    skipped: int = 0
+    linked: int = 0
+    mismatch: int = 0
+    retries: int = 0
+    # Bytes transferred, the time the transfers took, all added up, and the
+    # wall-clock time it all took.
+    bytes: int = 0
+    seconds: float = 0.0
+    elapsed: float = 0.0
+    hosts: dict[str, HostStatus] = field(repr=False, default_factory=dict)
     exceptions: list[Exception] = field(repr=False, default_factory=list)
 
+    def transferred(self, host: str, size: int, seconds: float) -> None:
+        """
+        Add a file transferred from given host.
+
+        """
+        self.bytes += size
+        self.seconds += seconds
+        self.hosts.setdefault(host, HostStatus())
+        self.hosts[host] += HostStatus(1, size, seconds)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second of elapsed time, or of transfer time, if the elapsed
+        time is not known.
+
+        """
+        seconds = self.elapsed or self.seconds
+        return self.bytes / seconds if seconds > 0 else 0.0
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Return counts, bytes, times and throughput, and the number of
+        exceptions.
+
+        """
+        summary = {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if f.name not in ("hosts", "exceptions")
+        }
+        summary["throughput"] = self.throughput
+        summary["exceptions"] = len(self.exceptions)
+        return summary
+
     def __add__(self, other: "TransferStatus") -> "TransferStatus":
-        self.existing += other.existing
-        self.success += other.success
-        self.failed += other.failed
-        self.not_found += other.not_found
+        for f in fields(self):
+            if f.name in ("hosts", "exceptions"):
+                continue
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+        for host, status in other.hosts.items():
+            self.hosts.setdefault(host, HostStatus())
+            self.hosts[host] += status
+        self.exceptions.extend(other.exceptions)
         return self
 
     __radd__ = __add__
+
+
+class Pending:
+    """
+    Submit transfers to an executor, while keeping at most `limit` of them
+    waiting or running at a time.
+
+    Results of finished transfers are added to `status` as they complete, so
+    that neither the number of futures nor the queue of the executor grows with
+    the number of files resolved from a source.
+
+    Used as a context manager, the executor is shut down on leaving the context.
+    If the user interrupts, waiting transfers are cancelled, and the transfers
+    already running are not waited for.
+
+    """
+
+    def __init__(self, executor: Executor, limit: int, name: str = "transfers") -> None:
+        self.executor = executor
+        self.limit = max(limit, 1)
+        self.name = name
+        self.futures: set[Future[TransferStatus]] = set()
+        self.status = TransferStatus()
+
+    def __enter__(self) -> "Pending":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is not None and issubclass(exc_type, KeyboardInterrupt):
+            log.info(f"Interrupted by user. Cancelling {self.name} ...")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            self.executor.shutdown()
+
+    def _reap(self, return_when: str = FIRST_COMPLETED) -> None:
+        done, self.futures = wait(self.futures, return_when=return_when)
+        for future in done:
+            self.status += future.result()
+
+    def submit(
+        self, fn: Callable[..., TransferStatus], *args: Any, **kwargs: Any
+    ) -> None:
+        while len(self.futures) >= self.limit:
+            self._reap()
+        self.futures.add(self.executor.submit(fn, *args, **kwargs))
+
+    def result(self) -> TransferStatus:
+        """
+        Wait for the remaining transfers and return the summed status.
+
+        """
+        while self.futures:
+            self._reap()
+        return self.status
+
+
+def pairs_to_try(source: Source, status: TransferStatus) -> Iterator[RemoteLocalPair]:
+    """
+    Yield the pairs resolved from given source, skipping those, whose URI was
+    not found within the last `source.retry_interval` seconds.
+
+    Skipped pairs are counted in given status.
+
+    """
+    cache = get_cache()
+    for pair in source.pairs():
+        if source.retry_interval and cache.missed(
+            pair.uri, within=source.retry_interval
+        ):
+            log.debug(f"{pair.uri} was not found recently. Skipping ...")
+            status.skipped += 1
+            continue
+        yield pair
+
+
+def unlisted[T](
+    previous: Mapping[str, list[str]],
+    pair: RemoteLocalPair,
+    candidates: list[T],
+    status: TransferStatus,
+    *,
+    key: Callable[[T], str] | None = None,
+) -> list[T]:
+    """
+    Return the candidates matching the wildcard in the filename of given pair,
+    which were not in the previous listing of its remote directory.
+
+    Candidates listed before are counted as existing in given status. Without a
+    wildcard, or without a previous listing, all candidates are returned.
+
+    `key` gives the filename of a candidate, if it is not the candidate itself.
+
+    """
+    if "*" not in pair.fname or pair.path_remote not in previous:
+        return candidates
+    known = set(previous[pair.path_remote])
+    new = [c for c in candidates if (key(c) if key else str(c)) not in known]
+    status.existing += len(candidates) - len(new)
+    return new
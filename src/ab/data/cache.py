@@ -0,0 +1,213 @@
+"""
+Cache remote-directory listings and HTTP validators on disk
+
+The cache is an SQLite database in the AutoBernese runtime directory, so that
+listings obtained in one run of `ab download` can be re-used by later runs, as
+long as they are not older than the maximum age given by the caller.
+
+For files downloaded over HTTP, the validators `ETag` and `Last-Modified` sent
+by the server are stored, so that later requests for the same URI can be made
+conditional on the remote file having changed.
+
+URIs that were not found on the remote server are stored with the time of the
+miss, so that they need not be probed again within a given interval.
+
+Finally, the latency and throughput measured for each host are stored, so that
+mirrors of a source can be ranked by their performance in earlier runs.
+
+Within the same process, a directory is listed at most once, regardless of the
+maximum age given, so that sources or parameter permutations sharing a remote
+directory only trigger one listing of it.
+
+"""
+
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+import logging
+
+from ab import configuration
+
+log = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    host TEXT NOT NULL,
+    path TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    entries TEXT NOT NULL,
+    PRIMARY KEY (host, path)
+);
+CREATE TABLE IF NOT EXISTS validators (
+    uri TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS misses (
+    uri TEXT PRIMARY KEY,
+    missed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    latency REAL,
+    throughput REAL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class Cache:
+    """
+    Thread-safe access to the cache database.
+
+    """
+
+    def __init__(self, filename: Path | str) -> None:
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._seen: set[tuple[str, str]] = set()
+
+    def listing(
+        self, host: str, path: str, *, max_age: int | float = 0
+    ) -> list[str] | None:
+        """
+        Return cached listing of the remote directory, if it was listed in this
+        process or is younger than `max_age` seconds. Otherwise, return None.
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fetched, entries FROM listings WHERE host = ? AND path = ?",
+                (host, path),
+            ).fetchone()
+        if row is None:
+            return None
+        fetched, entries = row
+        if (host, path) not in self._seen and time.time() - fetched >= max_age:
+            return None
+        log.debug(f"Using cached listing of {host}{path} ...")
+        listing: list[str] = json.loads(entries)
+        return listing
+
+    def new_run(self) -> None:
+        """
+        Let directories already listed in this process be listed again, e.g.
+        for each poll, when watching sources.
+
+        """
+        with self._lock:
+            self._seen.clear()
+
+    def store_listing(self, host: str, path: str, entries: list[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?)",
+                (host, path, time.time(), json.dumps(entries)),
+            )
+            self._seen.add((host, path))
+
+    def validators(self, uri: str) -> dict[str, str]:
+        """
+        Return the stored validators for given URI as conditional-request
+        headers.
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT etag, last_modified FROM validators WHERE uri = ?", (uri,)
+            ).fetchone()
+        if row is None:
+            return {}
+        etag, last_modified = row
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def store_validators(
+        self, uri: str, etag: str | None, last_modified: str | None
+    ) -> None:
+        with self._lock, self._connection:
+            if etag is None and last_modified is None:
+                self._connection.execute("DELETE FROM validators WHERE uri = ?", (uri,))
+                return
+            self._connection.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?)",
+                (uri, etag, last_modified),
+            )
+
+    def missed(self, uri: str, *, within: int | float) -> bool:
+        """
+        Return True, if given URI was not found within the last `within`
+        seconds.
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT missed FROM misses WHERE uri = ?", (uri,)
+            ).fetchone()
+        return row is not None and time.time() - row[0] < within
+
+    def store_miss(self, uri: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO misses VALUES (?, ?)", (uri, time.time())
+            )
+
+    def performance(self, host: str) -> tuple[float | None, float | None]:
+        """
+        Return latency in seconds and throughput in bytes per second last
+        stored for given host, if any.
+
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT latency, throughput FROM hosts WHERE host = ?", (host,)
+            ).fetchone()
+        return (row[0], row[1]) if row is not None else (None, None)
+
+    def store_performance(
+        self, host: str, latency: float | None, throughput: float | None
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?)",
+                (host, latency, throughput, time.time()),
+            )
+
+    def invalidate(self, host: str | None = None) -> None:
+        """
+        Remove cached listings for given host or all hosts.
+
+        """
+        with self._lock, self._connection:
+            if host is None:
+                self._connection.execute("DELETE FROM listings")
+                self._seen.clear()
+            else:
+                self._connection.execute("DELETE FROM listings WHERE host = ?", (host,))
+                self._seen = {seen for seen in self._seen if seen[0] != host}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_CACHE: Cache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> Cache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = Cache(configuration._cache())
+        return _CACHE
@@ -0,0 +1,224 @@
+"""
+Verify downloaded files against published checksums
+
+Archives publish checksum files next to their products, either one file for
+each product (e.g. `file.gz.md5`) or one file for a whole directory (e.g.
+`MD5SUMS`). A source may name such a sidecar file, and files downloaded from the
+source are then hashed, while they are written, and compared with the checksum
+in the sidecar file. A file that does not match is deleted and downloaded again.
+
+The sidecar files are read in the common formats of `md5sum`/`sha256sum`
+
+    d41d8cd98f00b204e9800998ecf8427e  file.gz
+
+and the BSD format
+
+    MD5 (file.gz) = d41d8cd98f00b204e9800998ecf8427e
+
+and a sidecar file for a single product may contain only the checksum.
+
+"""
+
+import re
+import hashlib
+import threading
+from dataclasses import dataclass
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any
+import logging
+
+from ab.data import TransferStatus
+
+log = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = 1024 * 1024
+"Number of bytes read at a time, when hashing a partial file"
+
+_BSD_PATTERN = re.compile(r"^\w+ \((?P<name>.+)\) = (?P<checksum>[0-9A-Fa-f]+)$")
+
+
+def parse(text: str) -> dict[str, str]:
+    """
+    Return checksums in given sidecar file by filename.
+
+    A line with only a checksum is given the empty string as filename.
+
+    """
+    checksums: dict[str, str] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        match = _BSD_PATTERN.match(line)
+        if match is not None:
+            checksums[Path(match["name"]).name] = match["checksum"].lower()
+            continue
+
+        checksum, _, name = line.partition(" ")
+        # The asterisk marks files read in binary mode by `md5sum`.
+        name = name.strip().lstrip("*")
+        checksums[Path(name).name if name else ""] = checksum.lower()
+    return checksums
+
+
+class Digest:
+    """
+    Incremental hash of a file being written.
+
+    """
+
+    def __init__(self, algorithm: str) -> None:
+        self.algorithm = algorithm
+        self._hash = hashlib.new(algorithm)
+
+    def update(self, data: bytes) -> None:
+        self._hash.update(data)
+
+    def update_from(self, fname: Path) -> None:
+        """
+        Hash the data already written to given (partial) file.
+
+        """
+        with open(fname, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                self._hash.update(chunk)
+
+    @property
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def __str__(self) -> str:
+        return f"{self.algorithm}:{self.hexdigest}"
+
+
+@dataclass
+class Checksum:
+    """
+    Algorithm and expected checksum, if published, of a file to download.
+
+    """
+
+    algorithm: str
+    expected: str | None = None
+
+    def digest(self) -> Digest:
+        return Digest(self.algorithm)
+
+    def verify(self, digest: Digest, ofname: Path) -> bool:
+        """
+        Return True, if the downloaded file matches the expected checksum or if
+        no checksum was published. Otherwise, the file is deleted.
+
+        """
+        if self.expected is None or digest.hexdigest == self.expected:
+            return True
+        log.warning(
+            f"Checksum of {ofname.name} ({digest.hexdigest}) does not match "
+            f"{self.expected} ..."
+        )
+        ofname.unlink(missing_ok=True)
+        return False
+
+
+class Checksums:
+    """
+    Checksums of the files of a source, read from sidecar files on demand.
+
+    Each sidecar file is read at most once, using the function `read`, which
+    takes a remote directory and a filename and returns the file content or
+    None, if the file could not be read. Different sidecar files are read at the
+    same time, and a file asked for, while it is being read, is waited for.
+
+    Given no settings, nothing is verified.
+
+    """
+
+    def __init__(
+        self,
+        settings: dict[str, Any] | None = None,
+        read: Callable[[str, str], bytes | None] | None = None,
+    ) -> None:
+        settings = settings or {}
+        self.sidecar: str | None = settings.get("sidecar")
+        self.algorithm: str = settings.get("algorithm", "md5")
+        self.retries: int = settings.get("retries", 2)
+        self._read = read
+        self._lock = threading.Lock()
+        self._sidecars: dict[tuple[str, str], Future[dict[str, str]]] = {}
+
+    def _checksums(self, directory: str, sidecar: str) -> dict[str, str]:
+        key = (directory, sidecar)
+        with self._lock:
+            future = self._sidecars.get(key)
+            reading = future is None
+            if future is None:
+                future = self._sidecars[key] = Future()
+
+        if not reading:
+            return future.result()
+
+        # The sidecar file is read without the lock, which is only held to find
+        # or add it, so that other sidecar files can be read meanwhile.
+        try:
+            content = self._read(directory, sidecar) if self._read else None
+            if content is None:
+                log.info(f"Could not read checksums from {directory}/{sidecar} ...")
+            checksums = parse(
+                content.decode("utf-8", errors="replace") if content else ""
+            )
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(checksums)
+        return checksums
+
+    def checksum(self, directory: str, fname: str) -> Checksum | None:
+        """
+        Return the checksum to verify given file with, if any.
+
+        """
+        if self.sidecar is None:
+            return None
+
+        sidecar = self.sidecar.format(fname=fname)
+        checksums = self._checksums(directory, sidecar)
+        expected = checksums.get(fname)
+        if expected is None and sidecar != self.sidecar:
+            # A sidecar file for the file itself may hold only the checksum.
+            expected = checksums.get("")
+        if expected is None:
+            log.debug(f"No published checksum for {fname} ...")
+        return Checksum(self.algorithm, expected)
+
+    def run(
+        self,
+        directory: str,
+        fname: str,
+        fn: Callable[..., TransferStatus],
+        /,
+        *args: Any,
+        **kwargs: Any,
+    ) -> TransferStatus:
+        """
+        Download a file with given transfer function, verifying it against its
+        published checksum, and try again, if it does not match.
+
+        """
+        checksum = self.checksum(directory, fname)
+        status = TransferStatus()
+        for attempt in range(self.retries + 1):
+            result = fn(*args, checksum=checksum, **kwargs)
+            status += result
+            if not result.mismatch:
+                return status
+            if attempt < self.retries:
+                log.info(f"Downloading {fname} again (retry {attempt + 1}) ...")
+                status.retries += 1
+
+        log.warning(f"Gave up downloading {fname} with a matching checksum ...")
+        status.failed += 1
+        return status
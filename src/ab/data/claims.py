@@ -0,0 +1,170 @@
+"""
+Fetch each remote file only once per run
+
+Sources often overlap, e.g. when a common and a campaign-specific source pull
+the same orbit files into different directories. Before a remote file is
+transferred, the transfer function claims its URI. The first claim fetches the
+file, and any later claim for the same URI is given a local link (or copy) of
+the fetched file instead of transferring it again.
+
+Claims are kept in memory for one run of `ab download`, or for one poll, when
+watching the sources, and are never blocking: a claim made while the file is
+still being fetched is handed over to the transfer doing it, which links the
+file, when it is done.
+
+"""
+
+import os
+import shutil
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+import logging
+
+from ab.data import TransferStatus
+from ab.data.journal import get_journal
+
+log = logging.getLogger(__name__)
+
+
+def link(source: Path, destination: Path) -> None:
+    """
+    Hard-link source file to destination, or copy it, if that is not possible,
+    e.g. across file systems.
+
+    """
+    if source == destination:
+        return
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    destination.unlink(missing_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+class Claims:
+    """
+    Thread-safe register of URIs claimed during a run.
+
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # URIs being fetched and the destinations waiting for them
+        self._pending: dict[tuple[str, str], list[Path]] = {}
+        # URIs fetched and the local file they were fetched to
+        self._fetched: dict[tuple[str, str], Path] = {}
+
+    def claim(self, uri: str, ofname: Path) -> TransferStatus | None:
+        """
+        Claim given URI for transfer to `ofname`.
+
+        Returns None, if the caller should fetch the file, and the status of the
+        claim otherwise.
+
+        A URI is claimed together with the name of the local file, since the
+        same remote file may be stored under another name, e.g. decompressed.
+
+        """
+        key = (uri, ofname.name)
+        with self._lock:
+            if key in self._pending:
+                log.debug(f"{uri} is already being fetched. Link when done ...")
+                self._pending[key].append(ofname)
+                return TransferStatus()
+
+            fetched = self._fetched.get(key)
+            if fetched is None:
+                self._pending[key] = []
+                return None
+
+        log.debug(f"{uri} already fetched. Link {fetched} to {ofname} ...")
+        return _link(uri, fetched, ofname)
+
+    def run(
+        self,
+        uri: str,
+        ofname: Path,
+        fn: Callable[..., TransferStatus],
+        /,
+        *args: Any,
+        **kwargs: Any,
+    ) -> TransferStatus:
+        """
+        Fetch a claimed URI with given transfer function and hand the result
+        over to the destinations that claimed the URI in the meantime.
+
+        """
+        key = (uri, ofname.name)
+        try:
+            status = fn(*args, **kwargs)
+        except BaseException:
+            self._release(key)
+            raise
+
+        if not (status.success or status.existing):
+            for destination in self._release(key):
+                log.debug(f"{uri} could not be fetched for {destination} ...")
+                if status.not_found:
+                    status.not_found += 1
+                else:
+                    status.failed += 1
+            return status
+
+        with self._lock:
+            waiting = self._pending.pop(key, [])
+            self._fetched[key] = ofname
+
+        for destination in waiting:
+            status += _link(uri, ofname, destination)
+        return status
+
+    def forget_fetched(self) -> None:
+        """
+        Forget the files fetched, but not those still being fetched, e.g. before
+        the next poll, after which files fetched before may have changed.
+
+        """
+        with self._lock:
+            self._fetched.clear()
+
+    def _release(self, key: tuple[str, str]) -> list[Path]:
+        # Let a later claim try again.
+        with self._lock:
+            return self._pending.pop(key, [])
+
+
+def _link(uri: str, fetched: Path, ofname: Path) -> TransferStatus:
+    try:
+        link(fetched, ofname)
+    except OSError as e:
+        log.warning(f"Could not link {fetched} to {ofname} ...")
+        return TransferStatus(failed=1, exceptions=[e])
+
+    entry = get_journal().entry(fetched)
+    get_journal().record(
+        uri,
+        ofname,
+        size=ofname.stat().st_size,
+        checksum=entry.checksum if entry is not None else None,
+        remote_mtime=entry.remote_mtime if entry is not None else None,
+    )
+    return TransferStatus(linked=1)
+
+
+_CLAIMS = Claims()
+
+
+def reset() -> None:
+    """
+    Forget all claims, e.g. at the beginning of a run.
+
+    """
+    global _CLAIMS
+    _CLAIMS = Claims()
+
+
+def get_claims() -> Claims:
+    return _CLAIMS
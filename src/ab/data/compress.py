@@ -4,12 +4,17 @@ File compression
 """
 
 from pathlib import Path
+from typing import Final
 
 import shutil
+import zlib
 import gzip as _gzip
 
 from ab.paths import resolve_wildcards
 
+CHUNK_SIZE: Final = 1024 * 1024
+"Number of bytes decompressed at a time, when decompressing files"
+
 
 def gzip(fname: str | Path) -> None:
     ifname = Path(fname)
@@ -25,3 +30,187 @@ def gzip(fname: str | Path) -> None:
 def gzip_glob(fname: str | Path) -> None:
     for resolved in resolve_wildcards(fname):
         gzip(resolved)
+
+
+class GzipDecompressor:
+    """
+    Incremental decompression of gzip data with one or more members.
+
+    """
+
+    def __init__(self) -> None:
+        self._decompressor = zlib.decompressobj(wbits=31)
+        self._started = False
+
+    def decompress(self, data: bytes) -> bytes:
+        chunks = []
+        try:
+            while data:
+                self._started = True
+                chunks.append(self._decompressor.decompress(data))
+                if not self._decompressor.eof:
+                    break
+                # Concatenated gzip files are a valid gzip file.
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(wbits=31)
+                self._started = False
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip data: {e}") from e
+        return b"".join(chunks)
+
+    def flush(self) -> bytes:
+        if self._started and not self._decompressor.eof:
+            raise ValueError("Gzip data ended before the end of the stream ...")
+        return self._decompressor.flush()
+
+
+class LZWDecompressor:
+    """
+    Incremental decompression of data compressed with UNIX `compress` (.Z).
+
+    The data are LZW codes of 9 bits and up to 16 bits, packed in groups of
+    eight codes. Whenever the code width grows, or the code table is cleared,
+    the rest of the current group is padding.
+
+    """
+
+    CLEAR: Final = 256
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._header = False
+        self._maxbits = 16
+        self._block_mode = True
+        self._reset()
+        self._oldcode: int | None = None
+
+    def _reset(self) -> None:
+        self._bits = 9
+        self._table: list[bytes] = [bytes([code]) for code in range(256)]
+        self._maxcode = (1 << self._bits) - 1
+
+    def _widen(self) -> None:
+        self._bits += 1
+        if self._bits == self._maxbits:
+            self._maxcode = 1 << self._maxbits
+        else:
+            self._maxcode = (1 << self._bits) - 1
+
+    def _read_header(self) -> bool:
+        if len(self._buffer) < 3:
+            return False
+        if self._buffer[:2] != b"\x1f\x9d":
+            raise ValueError("Invalid header for compressed (.Z) data ...")
+        flags = self._buffer[2]
+        self._maxbits = flags & 0x1F
+        self._block_mode = bool(flags & 0x80)
+        if not 9 <= self._maxbits <= 16:
+            raise ValueError(f"Invalid maximum code width {self._maxbits} ...")
+        del self._buffer[:3]
+        self._header = True
+        if self._block_mode:
+            # Placeholder for the clear code
+            self._table.append(b"")
+        return True
+
+    def _code(self, code: int) -> bytes:
+        table = self._table
+        if self._oldcode is None:
+            if code >= 256:
+                raise ValueError(f"Invalid first code {code} ...")
+            self._oldcode = code
+            return table[code]
+
+        if code < len(table):
+            string = table[code]
+        elif code == len(table):
+            # The code being defined by this very code (cScSc).
+            previous = table[self._oldcode]
+            string = previous + previous[:1]
+        else:
+            raise ValueError(f"Invalid code {code} in compressed (.Z) data ...")
+
+        if len(table) < 1 << self._maxbits:
+            if self._block_mode and len(table) == self.CLEAR:
+                # The first code after clearing the table defines no string.
+                table.append(b"")
+            else:
+                table.append(table[self._oldcode] + string[:1])
+        self._oldcode = code
+        return string
+
+    def _decode(self, final: bool = False) -> bytes:
+        output = []
+        position = 0
+        buffer = self._buffer
+        while True:
+            if len(self._table) > self._maxcode:
+                self._widen()
+
+            bits = self._bits
+            group = buffer[position : position + bits]
+            if len(group) < bits and not final:
+                break
+            if not group:
+                break
+
+            codes = len(group) * 8 // bits
+            value = int.from_bytes(group, "little")
+            mask = (1 << bits) - 1
+            for index in range(min(codes, 8)):
+                if index and len(self._table) > self._maxcode:
+                    # The rest of the group is padding.
+                    self._widen()
+                    break
+                code = (value >> (index * bits)) & mask
+                if code == self.CLEAR and self._block_mode:
+                    self._reset()
+                    break
+                output.append(self._code(code))
+            position += bits
+
+        del buffer[:position]
+        return b"".join(output)
+
+    def decompress(self, data: bytes) -> bytes:
+        self._buffer.extend(data)
+        if not self._header and not self._read_header():
+            return b""
+        return self._decode()
+
+    def flush(self) -> bytes:
+        if not self._header:
+            if self._buffer:
+                raise ValueError("Compressed (.Z) data ended in the header ...")
+            return b""
+        return self._decode(final=True)
+
+
+type Decompressor = GzipDecompressor | LZWDecompressor
+
+DECOMPRESSORS: Final[dict[str, type[Decompressor]]] = {
+    ".gz": GzipDecompressor,
+    ".z": LZWDecompressor,
+}
+"Decompressor for each (lower-case) filename suffix"
+
+
+def decompressor(fname: str | Path) -> Decompressor | None:
+    """
+    Return a new decompressor for given compressed file, or None, if the file is
+    not compressed in a supported format.
+
+    """
+    factory = DECOMPRESSORS.get(Path(fname).suffix.lower())
+    return factory() if factory is not None else None
+
+
+def decompressed(fname: str) -> str:
+    """
+    Return given filename without the suffix of a supported compression format.
+
+    """
+    suffix = Path(fname).suffix
+    if suffix.lower() in DECOMPRESSORS:
+        return fname[: -len(suffix)]
+    return fname
@@ -3,61 +3,278 @@ Copy local files
 
 """
 
+import os
+import sys
+import stat as _stat
+import time
+import errno
 from pathlib import Path
 import shutil
 import logging
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    BinaryIO,
+    Final,
+)
 import re
 
-RINEX2_PATTERN = r"\w{4}\d{3}\w\.\d{1,2}[oOdDnNgG]\.[zZ]"
+RINEX2_PATTERN = re.compile(r"\w{4}\d{3}\w\.\d{1,2}[oOdDnNgG]\.[zZ]")
 
 from ab import configuration
 from ab.paths import resolve_wildcards
-from ab.data import TransferStatus
+from ab.data import (
+    TransferStatus,
+    Pending,
+)
+from ab.data import compress as _compress
 from ab.data.source import Source
-from ab.data.stats import already_updated
+from ab.data.stats import (
+    RemoteStat,
+    comparable,
+)
+from ab.data.partial import part_of
+from ab.data.journal import (
+    get_journal,
+    is_current,
+)
 
 log = logging.getLogger(__name__)
 
+FICLONE: Final = 0x40049409
+"Linux ioctl request for sharing the data blocks of a file with another file"
+
+CHUNK_SIZE: Final = 8 * 1024 * 1024
+"Number of bytes copied at a time, when the kernel copies the data"
+
+_UNSUPPORTED: Final = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ETXTBSY,
+    errno.EBADF,
+}
+"Errors telling that a file can not be copied this way between given files"
+
+LOCALHOST = "localhost"
+"Host name for the transfer status of local files"
+
+
+def decompress(ifname: Path, ofname: Path, unpack: _compress.Decompressor) -> None:
+    """
+    Decompress file to destination in chunks, preserving its metadata.
+
+    The destination is written to a partial file that is only renamed, when it
+    is complete.
 
-def download(source: Source) -> TransferStatus:
+    """
+    part = part_of(ofname)
+    try:
+        with open(ifname, "rb") as f_in, open(part, "wb") as f_out:
+            while chunk := f_in.read(_compress.CHUNK_SIZE):
+                f_out.write(unpack.decompress(chunk))
+            f_out.write(unpack.flush())
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    shutil.copystat(ifname, part)
+    os.replace(part, ofname)
+
+
+def _clone(f_in: BinaryIO, f_out: BinaryIO) -> bool:
+    """
+    Let the file system share the data blocks of the source file with the
+    destination file (a reflink), if supported (e.g. Btrfs and XFS).
+
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        fcntl.ioctl(f_out.fileno(), FICLONE, f_in.fileno())
+    except OSError:
+        return False
+    return True
+
+
+def _copy_range(f_in: BinaryIO, f_out: BinaryIO) -> None:
+    """
+    Copy the data in the kernel, which lets network file systems copy on the
+    server, and fall back on copying through user space.
+
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while copy_file_range(f_in.fileno(), f_out.fileno(), CHUNK_SIZE):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            # The file positions tell how far the kernel got.
+            log.debug(f"Copy file range not supported ({e}). Copy data ...")
+    shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+
+
+def copy(ifname: Path, ofname: Path) -> None:
+    """
+    Copy file to destination, preserving its metadata, with as little copying of
+    data as the file systems allow.
+
+    The destination is written to a partial file that is only renamed, when it
+    is complete.
+
+    """
+    part = part_of(ofname)
+    try:
+        with open(ifname, "rb") as f_in, open(part, "wb") as f_out:
+            if not _clone(f_in, f_out):
+                _copy_range(f_in, f_out)
+        shutil.copystat(ifname, part)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    os.replace(part, ofname)
+
+
+def link(ifname: Path, ofname: Path) -> None:
+    """
+    Hard-link file to destination, or copy it, if that is not possible, e.g.
+    across file systems.
+
+    """
+    part = part_of(ofname)
+    part.unlink(missing_ok=True)
+    try:
+        os.link(ifname, part)
+    except OSError as e:
+        log.debug(f"Could not link {ifname} ({e}). Copy it ...")
+        copy(ifname, ofname)
+        return
+    os.replace(part, ofname)
+    # Nothing is renamed, if the destination already was a link to the file.
+    part.unlink(missing_ok=True)
+
+
+def transfer(
+    ifname: Path,
+    ofname: Path,
+    *,
+    host: str,
+    size: int,
+    mtime: float,
+    unpack: _compress.Decompressor | None = None,
+    hardlink: bool = False,
+) -> TransferStatus:
+    """
+    Copy, link or decompress a single local file and record it in the journal.
+
+    """
+    started = time.monotonic()
+    try:
+        if unpack is not None:
+            log.info(f"Decompress {ifname} to {ofname} ...")
+            decompress(ifname, ofname, unpack)
+        elif hardlink:
+            log.info(f"Link {ifname} to {ofname} ...")
+            link(ifname, ofname)
+        else:
+            log.info(f"Copy {ifname} to {ofname} ...")
+            copy(ifname, ofname)
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not copy {ifname} to {ofname} ...")
+        log.debug(f"{e}")
+        return TransferStatus(failed=1, exceptions=[e])
+
+    status = TransferStatus(success=1)
+    status.transferred(host, size, time.monotonic() - started)
+    get_journal().record(
+        str(ifname), ofname, size=ofname.stat().st_size, remote_mtime=mtime
+    )
+    return status
+
+
+def download(
+    source: Source, *, listings: dict[str, list[str]] | None = None
+) -> TransferStatus:
     """
     Download local paths resolved from a Source instance.
 
+    If `source.sync` is set, files are compared with the size and modification
+    time of the source file instead of using `source.max_age`. The latter is
+    preserved, when the file is copied.
+
+    If `source.decompress` is set, files compressed with gzip or UNIX compress
+    are decompressed, while they are copied.
+
+    Files are copied by `source.workers` threads at the same time. If
+    `source.hardlink` is set, files are hard-linked instead of copied, where the
+    source and destination are on the same file system.
+
+    Local directories are always searched, so `listings` is not used.
+
     """
     status = TransferStatus()
+    host = source.host or LOCALHOST
+    executor = ThreadPoolExecutor(max_workers=source.workers, thread_name_prefix="file")
 
-    for pair in source.resolve():
-        destination = Path(pair.path_local)
-        destination.mkdir(parents=True, exist_ok=True)
-
-        # Loop over each file resolved
-        for ifname in resolve_wildcards(pair.uri):
-            # dirty workaround to fix naming of RINEX2 files (Bernese stumbles
-            # a bit when station names are lower case).
-            if re.match(RINEX2_PATTERN, ifname.name):
-                ofname = destination / ifname.name.upper()
-            else:
-                ofname = destination / ifname.name
-
-            if not ifname.is_file():
-                log.warning(f"File {ifname!r} not found ...")
-                status.not_found += 1
-                continue
-
-            if already_updated(ofname, max_age=source.max_age):
-                log.debug(f"{ofname.name!r} already downloaded ...")
-                status.existing += 1
-                continue
+    with Pending(executor, limit=2 * source.workers, name="local copies") as pending:
+        for pair in source.pairs():
+            destination = Path(pair.path_local)
+            destination.mkdir(parents=True, exist_ok=True)
 
-            log.info(f"Copy {ifname} to {ofname} ...")
-            shutil.copy2(ifname, ofname)
+            # Loop over each file resolved
+            for ifname in resolve_wildcards(pair.uri):
+                # dirty workaround to fix naming of RINEX2 files (Bernese
+                # stumbles a bit when station names are lower case).
+                if RINEX2_PATTERN.match(ifname.name):
+                    ofname = destination / ifname.name.upper()
+                else:
+                    ofname = destination / ifname.name
+
+                unpack = _compress.decompressor(ifname) if source.decompress else None
+                if unpack is not None:
+                    ofname = ofname.with_name(_compress.decompressed(ofname.name))
+
+                try:
+                    stat = ifname.stat()
+                except OSError:
+                    stat = None
+                if stat is None or not _stat.S_ISREG(stat.st_mode):
+                    log.warning(f"File {ifname!r} not found ...")
+                    status.not_found += 1
+                    continue
+
+                remote = comparable(
+                    (
+                        RemoteStat(size=stat.st_size, mtime=stat.st_mtime)
+                        if source.sync
+                        else None
+                    ),
+                    decompressed=unpack is not None,
+                )
+
+                if is_current(
+                    str(ifname), ofname, max_age=source.max_age, remote=remote
+                ):
+                    log.debug(f"{ofname.name!r} already downloaded ...")
+                    status.existing += 1
+                    continue
 
-            if not ofname.is_file():
-                log.warning(f"File {ofname.name!r} not copied ...")
-                status.failed += 1
-                continue
+                pending.submit(
+                    transfer,
+                    ifname,
+                    ofname,
+                    host=host,
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                    unpack=unpack,
+                    hardlink=source.hardlink,
+                )
 
-            status.success += 1
+        status += pending.result()
 
     return status
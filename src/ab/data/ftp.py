@@ -3,34 +3,220 @@ Transfer files over FTP
 
 """
 
+import io
+import time
 import datetime as dt
 from os.path import join
 from pathlib import Path
-from ftplib import FTP
-from urllib.parse import ParseResult
+from urllib.parse import (
+    ParseResult,
+    urlsplit,
+)
 from fnmatch import fnmatch
 from ftplib import (
     FTP,
+    all_errors,
     error_perm,
 )
-from typing import Any
+from typing import (
+    Any,
+    Final,
+)
 from collections.abc import (
     Iterable,
     Iterator,
 )
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-import functools
+import threading
 import logging
 
 from ab import configuration
-from ab.data import TransferStatus
+from ab.data import (
+    TransferStatus,
+    Pending,
+    limits,
+    pairs_to_try,
+    unlisted,
+)
+from ab.data import compress as _compress
+from ab.data.cache import get_cache
+from ab.data.claims import get_claims
+from ab.data.checksum import (
+    Checksum,
+    Checksums,
+)
 from ab.data.source import Source
-from ab.data.stats import already_updated
+from ab.data.progress import Progress
+from ab.data.partial import (
+    part_of,
+    offset,
+    complete,
+    discard_empty,
+)
+from ab.data.stats import (
+    RemoteStat,
+    comparable,
+    set_mtime,
+)
+from ab.data.journal import (
+    get_journal,
+    is_current,
+)
 
 log = logging.getLogger(__name__)
 
 
-@functools.cache
+CONGESTED: Final = ("421",)
+"Reply codes of a server, which is too busy to serve another connection"
+
+
+class ConnectionPool:
+    """
+    A pool of logged-in FTP connections to a single host.
+
+    Connections are opened lazily, when needed, and kept open for re-use until
+    the pool is closed. At most `size` connections are open at the same time.
+    A thread asking for a connection, when all of them are in use, waits until
+    one is given back to the pool.
+
+    """
+
+    def __init__(self, host: str, size: int = 1) -> None:
+        self.host = host
+        self.size = size
+        self._idle: list[FTP] = []
+        self._open: int = 0
+        self._condition = threading.Condition()
+
+    def resize(self, size: int) -> None:
+        """
+        Allow more connections in the pool. The pool is never shrunk.
+
+        """
+        with self._condition:
+            self.size = max(self.size, size)
+            self._condition.notify_all()
+
+    def _connect(self) -> FTP:
+        log.debug(f"Open new connection to {self.host} ...")
+        # The host may be given with user name, password and port as in a URL.
+        parsed = urlsplit(f"//{self.host}")
+        ftp = FTP()
+        ftp.connect(parsed.hostname or "", parsed.port or 0)
+        if parsed.username:
+            ftp.login(parsed.username, parsed.password or "")
+        else:
+            ftp.login()
+        return ftp
+
+    @staticmethod
+    def _alive(ftp: FTP) -> bool:
+        try:
+            ftp.voidcmd("NOOP")
+            return True
+        except all_errors:
+            return False
+
+    @staticmethod
+    def _close(ftp: FTP) -> None:
+        try:
+            ftp.quit()
+        except all_errors:
+            ftp.close()
+
+    def _acquire(self) -> FTP:
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                self._condition.wait()
+            ftp = self._idle.pop() if self._idle else None
+            if ftp is None:
+                self._open += 1
+
+        # Idle connections may have been closed by the server in the meantime.
+        if ftp is not None:
+            if self._alive(ftp):
+                return ftp
+            log.debug(f"Idle connection to {self.host} was closed. Reconnecting ...")
+            self._close(ftp)
+
+        try:
+            return self._connect()
+        except:
+            self._discard()
+            raise
+
+    def _release(self, ftp: FTP) -> None:
+        with self._condition:
+            self._idle.append(ftp)
+            self._condition.notify()
+
+    def _discard(self) -> None:
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[FTP]:
+        """
+        Borrow a connection from the pool.
+
+        A connection that fails with anything but a permanent (file-level)
+        error is closed and not given back to the pool.
+
+        """
+        ftp = self._acquire()
+        try:
+            yield ftp
+        except error_perm:
+            self._release(ftp)
+            raise
+        except BaseException:
+            self._close(ftp)
+            self._discard()
+            raise
+        else:
+            self._release(ftp)
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for ftp in idle:
+            self._close(ftp)
+
+
+_POOLS: dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(host: str, size: int = 1) -> ConnectionPool:
+    """
+    Return the connection pool for given host, shared by all sources on it.
+
+    """
+    with _POOLS_LOCK:
+        pool = _POOLS.get(host)
+        if pool is None:
+            pool = _POOLS[host] = ConnectionPool(host, size)
+        else:
+            pool.resize(size)
+        return pool
+
+
+def close_pools() -> None:
+    """
+    Log out of all open connections.
+
+    """
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        log.debug(f"Close connections to {pool.host} ...")
+        pool.close()
+
+
 def is_file(ftp: FTP, candidate: str) -> bool:
     return ftp.nlst(candidate) == [candidate]
 
@@ -63,7 +249,257 @@ def list_files(ftp: FTP, path: str, *, ix_column: int = 8) -> list[str]:
         return [line.split()[ix_column] for line in lines if not line.startswith("d")]
 
 
-def download(source: Source) -> TransferStatus:
+def _timestamp(value: str) -> float:
+    """
+    Convert FTP time value `YYYYMMDDHHMMSS[.sss]` in UTC to a POSIX timestamp.
+
+    """
+    return (
+        dt.datetime.strptime(value[:14], "%Y%m%d%H%M%S")
+        .replace(tzinfo=dt.UTC)
+        .timestamp()
+    )
+
+
+def list_stats(ftp: FTP, path: str) -> dict[str, RemoteStat]:
+    """
+    Return size and modification time of files in remote directory.
+
+    Raises `error_perm`, if the server does not support the MLSD command.
+
+    """
+    stats = {}
+    for name, facts in ftp.mlsd(path, facts=["type", "size", "modify"]):
+        if facts.get("type", "file") != "file":
+            continue
+        stats[name] = RemoteStat(
+            size=int(facts["size"]) if "size" in facts else None,
+            mtime=_timestamp(facts["modify"]) if "modify" in facts else None,
+        )
+    return stats
+
+
+def remote_stat(ftp: FTP, path: str, fname: str) -> RemoteStat:
+    """
+    Return size and modification time of a single remote file using the SIZE
+    and MDTM commands for servers that do not support MLSD.
+
+    """
+    stat = RemoteStat()
+    with specific_path(ftp, path):
+        try:
+            ftp.voidcmd("TYPE I")
+            stat.size = ftp.size(fname)
+        except error_perm:
+            log.debug(f"Could not get size of {fname} ...")
+        try:
+            stat.mtime = _timestamp(ftp.voidcmd(f"MDTM {fname}").split()[-1])
+        except error_perm:
+            log.debug(f"Could not get modification time of {fname} ...")
+    return stat
+
+
+class _RemoteStats:
+    """
+    Look up remote file stats, listing each directory only once per source.
+
+    """
+
+    def __init__(self, pool: ConnectionPool) -> None:
+        self.pool = pool
+        self._listings: dict[str, dict[str, RemoteStat] | None] = {}
+
+    def get(self, path: str, fname: str) -> RemoteStat:
+        if path not in self._listings:
+            try:
+                with self.pool.connection() as ftp:
+                    self._listings[path] = list_stats(ftp, path)
+            except error_perm:
+                log.debug(f"MLSD not available for {path}. Using SIZE and MDTM ...")
+                self._listings[path] = None
+
+        listing = self._listings[path]
+        if listing is not None:
+            return listing.get(fname, RemoteStat())
+
+        with self.pool.connection() as ftp:
+            return remote_stat(ftp, path, fname)
+
+
+def _size(ftp: FTP, fname: str) -> int | None:
+    try:
+        ftp.voidcmd("TYPE I")
+        return ftp.size(fname)
+    except error_perm:
+        return None
+
+
+def retrieve(
+    pool: ConnectionPool,
+    path: str,
+    fname: str,
+    ofname: Path,
+    *,
+    mtime: float | None = None,
+    progress: bool = False,
+    uri: str,
+    checksum: Checksum | None = None,
+    decompress: bool = False,
+) -> TransferStatus:
+    """
+    Download a single file in given remote directory using a pooled connection.
+
+    The file is downloaded to a partial file, resuming from its current size
+    with the REST command, and renamed, when its size matches the remote size.
+
+    If `progress` is set, progress and throughput are logged while downloading.
+
+    If `checksum` is given, the file is hashed, while it is written, and deleted,
+    if it does not match the published checksum.
+
+    If `decompress` is set, and the file is compressed with gzip or UNIX
+    compress, it is decompressed, while it is written, to the given destination
+    file. Such a download can not be resumed.
+
+    The transfer is recorded in the journal under given URI. If the file does
+    not exist, the miss is recorded for the URI instead, so that it can be
+    skipped in later runs.
+
+    """
+    status = TransferStatus()
+    part = part_of(ofname)
+    digest = checksum.digest() if checksum is not None else None
+    unpack = _compress.decompressor(fname) if decompress else None
+    log.info(f"Downloading {fname} ...")
+    try:
+        with limits.slot(pool.host), pool.connection() as ftp:
+            # The time of a single command is the latency of the host.
+            started = time.monotonic()
+            ftp.cwd(path)
+            latency = time.monotonic() - started
+            size = _size(ftp, fname)
+            rest = offset(part, size=size, mtime=mtime) if unpack is None else 0
+            if digest is not None and rest:
+                digest.update_from(part)
+
+            # NOTE: `pathlib.Path.write_text` can not be used as a callback
+            # function in `retrbinary`, because it is called for each chunk of
+            # data, which means that the file is overwritten with each new
+            # chunk, thus only preserving the last chunk in the 'downloaded'
+            # file.
+
+            # Therefore, we use the write on the context manager
+            if size is None or rest < size:
+                tracker = Progress(fname, size, offset=rest, report=progress)
+                with open(part, "ab" if rest else "wb") as f:
+
+                    def write(chunk: bytes) -> None:
+                        f.write(chunk if unpack is None else unpack.decompress(chunk))
+                        tracker(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+
+                    ftp.retrbinary(f"RETR {fname}", write, rest=rest or None)
+                    if unpack is not None:
+                        f.write(unpack.flush())
+                tracker.finish()
+                status.transferred(pool.host, tracker.bytes, tracker.seconds)
+                limits.completed(pool.host, tracker.bytes, tracker.seconds, latency)
+
+                if unpack is not None and size is not None and tracker.bytes != size:
+                    log.warning(f"Received {tracker.bytes} of {size} B of {fname} ...")
+                    part.unlink()
+                    status.failed += 1
+                    return status
+
+    except error_perm as e:
+        log.warn(f"Filename {fname} could not be downloaded ...")
+        log.debug(f"{e}")
+        discard_empty(part)
+        if str(e).startswith("550"):
+            get_cache().store_miss(uri)
+            status.not_found += 1
+        else:
+            status.failed += 1
+        return status
+
+    except all_errors as e:
+        log.warn(f"Download of {fname} was interrupted. Keeping {part.name} ...")
+        log.debug(f"{e}")
+        if str(e).startswith(CONGESTED):
+            limits.congested(pool.host)
+        discard_empty(part)
+        status.failed += 1
+        status.exceptions.append(e)
+        return status
+
+    except ValueError as e:
+        log.warning(f"Could not decompress {fname} ...")
+        log.debug(f"{e}")
+        part.unlink(missing_ok=True)
+        status.failed += 1
+        status.exceptions.append(e)
+        return status
+
+    if not complete(part, ofname, size=size if unpack is None else None):
+        status.failed += 1
+        return status
+
+    if checksum is not None and digest is not None:
+        if not checksum.verify(digest, ofname):
+            status.mismatch += 1
+            return status
+
+    set_mtime(ofname, mtime)
+    get_journal().record(
+        uri,
+        ofname,
+        size=ofname.stat().st_size,
+        checksum=str(digest) if digest is not None else None,
+        remote_mtime=mtime,
+    )
+    status.success += 1
+    return status
+
+
+def read(pool: ConnectionPool, path: str, fname: str) -> bytes | None:
+    """
+    Return content of a small remote file, e.g. a checksum file, or None, if it
+    could not be read.
+
+    """
+    buffer = io.BytesIO()
+    try:
+        with limits.slot(pool.host), pool.connection() as ftp:
+            ftp.cwd(path)
+            ftp.retrbinary(f"RETR {fname}", buffer.write)
+    except all_errors as e:
+        log.debug(f"Could not read {path}/{fname}: {e}")
+        return None
+    return buffer.getvalue()
+
+
+def cached_list_files(
+    pool: ConnectionPool, path: str, *, max_age: int | float = 0
+) -> list[str]:
+    """
+    List files in remote directory, using the cached listing, if it is not
+    older than `max_age` seconds, or if the directory has already been listed
+    in this run.
+
+    """
+    cache = get_cache()
+    listing = cache.listing(pool.host, path, max_age=max_age)
+    if listing is None:
+        with pool.connection() as ftp:
+            listing = list_files(ftp, path)
+        cache.store_listing(pool.host, path, listing)
+    return listing
+
+
+def download(
+    source: Source, *, listings: dict[str, list[str]] | None = None
+) -> TransferStatus:
     """
     Download paths resolved from a Source instance.
 
@@ -76,6 +512,20 @@ def download(source: Source) -> TransferStatus:
         matched against the list of files inside the remote parent directory to
         get all possible files to download based on the given pattern.
 
+    *   Directory listings are cached and re-used within the same run and for
+        up to `source.listing_ttl` seconds across runs.
+
+    *   If `source.sync` is set, files are compared with the size and
+        modification time of the remote file instead of using `source.max_age`.
+
+    *   Connections are borrowed from a pool shared by all sources on the same
+        host, and the files to download are spread over `source.workers`
+        connections, transferring concurrently.
+
+    *   If `listings` is given, the listing of each remote directory is stored
+        in it, and files in a directory listed there already are counted as
+        existing, so that only files that appeared since are downloaded.
+
     Note:
 
     *   The assumption for a RemoteLocalPair instance is that the remote path in
@@ -86,88 +536,109 @@ def download(source: Source) -> TransferStatus:
     """
     status = TransferStatus()
 
-    # Log on to the host first, since we need to probe for files directories
-    with FTP(source.host) as ftp:
-        ftp.login()
-
-        try:
-            for pair in source.resolve():
-
-                # Prepare local destination directory
-                destination = Path(pair.path_local)
-                destination.mkdir(parents=True, exist_ok=True)
-
-                if "*" not in pair.fname:
-                    log.debug(
-                        f"Filename {pair.fname!r} has no wildcard and is added to the download list."
-                    )
-                    # If the filename has no wildcard, just download the file
-                    candidates = [pair.fname]
-
-                    # NOTE: At this point, we do not know if the filename in
-                    # `candidates` exists on the server.
-
+    cache = get_cache()
+    claims = get_claims()
+    pool = get_pool(source.host, max(source.workers, limits.per_host() or 1))
+    checksums = Checksums(
+        source.checksum, read=lambda path, fname: read(pool, path, fname)
+    )
+    stats = _RemoteStats(pool)
+    executor = ThreadPoolExecutor(
+        max_workers=source.workers, thread_name_prefix=f"ftp-{source.host}"
+    )
+    previous = dict(listings) if listings is not None else {}
+
+    with Pending(executor, limit=2 * source.workers, name="FTP transfers") as pending:
+        for pair in pairs_to_try(source, status):
+
+            # Prepare local destination directory
+            destination = Path(pair.path_local)
+            destination.mkdir(parents=True, exist_ok=True)
+
+            if "*" not in pair.fname:
+                log.debug(
+                    f"Filename {pair.fname!r} has no wildcard and is added to the download list."
+                )
+                # If the filename has no wildcard, just download the file
+                candidates = [pair.fname]
+
+                # NOTE: At this point, we do not know if the filename in
+                # `candidates` exists on the server.
+
+            else:
+                # Get files that match the current source filename
+                log.debug("Searching for wildcard results")
+                listing = cached_list_files(
+                    pool, pair.path_remote, max_age=source.listing_ttl
+                )
+                if listings is not None:
+                    listings[pair.path_remote] = listing
+                candidates = [
+                    candidate
+                    for candidate in listing
+                    # This, effectively, resolves the actual filename of the
+                    # remote file to download, since the wildcard notation in
+                    # the filename specified in the source instance is expanded
+                    # using `fnmatch`.
+                    if fnmatch(candidate, pair.fname)
+                ]
+
+                # NOTE: At this point, we do know that the filenames in
+                # `candidates` actually exist on the server.
+
+            if not candidates:
+                log.info(f"Found no files matching {pair.path_remote}/{pair.fname} ...")
+                cache.store_miss(pair.uri)
+                status.not_found += 1
+                continue
+
+            candidates = unlisted(previous, pair, candidates, status)
+
+            for fname in candidates:
+                # Get resolved destination filename
+                ofname = destination / (
+                    _compress.decompressed(fname) if source.decompress else fname
+                )
+                if fname == pair.fname:
+                    uri = pair.uri
                 else:
-                    # Get files that match the current source filename
-                    log.debug("Searching for wildcard results")
-                    candidates = [
-                        candidate
-                        for candidate in list_files(ftp, pair.path_remote)
-                        # This, effectively, resolves the actual filename of the
-                        # remote file to download, since the wildcard notation in
-                        # the filename specified in the source instance is expanded
-                        # using `fnmatch`.
-                        if fnmatch(candidate, pair.fname)
-                    ]
-
-                    # NOTE: At this point, we do know that the filenames in
-                    # `candidates` actually exist on the server.
-
-                if not candidates:
-                    log.info(
-                        f"Found no files matching {pair.path_remote}/{pair.fname} ..."
-                    )
-                    status.not_found += 1
-                    continue
+                    uri = f"{source.protocol}://{source.host}{join(pair.path_remote, fname)}"
 
                 # Filter out files already available
-                to_download = []
-                for fname in candidates:
-                    # Get resolved destination filename
-                    ofname = destination / fname
-                    if already_updated(ofname, max_age=source.max_age):
-                        log.debug(f"{ofname.name} already downloaded ...")
-                        status.existing += 1
-                        continue
-                    to_download.append((fname, ofname))
+                remote = comparable(
+                    stats.get(pair.path_remote, fname) if source.sync else None,
+                    decompressed=ofname.name != fname,
+                )
+                if is_current(uri, ofname, max_age=source.max_age, remote=remote):
+                    log.debug(f"{ofname.name} already downloaded ...")
+                    status.existing += 1
+                    continue
+
+                # Fetch each remote file only once per run
+                claimed = claims.claim(uri, ofname)
+                if claimed is not None:
+                    status += claimed
+                    continue
 
                 # Finally, download each of the filenames resolved
-                ftp.cwd(pair.path_remote)
-                for fname, ofname in to_download:
-                    log.info(f"Downloading {fname} ...")
-                    try:
-                        # NOTE: `pathlib.Path.write_text` can not be used as a
-                        # callback function in `retrbinary`, because it is
-                        # called for each chunk of data, which means that the
-                        # file is overwritten with each new chunk, thus only
-                        # preserving the last chunk in the 'downloaded' file.
-
-                        # Therefore, we use the write on the context manager
-                        with open(ofname, "wb") as f:
-                            ftp.retrbinary(f"RETR {fname}", f.write)
-
-                    except error_perm as e:
-                        log.warn(f"Filename {fname} could not be downloaded ...")
-                        log.debug(f"{e}")
-                        log.info(f"Deleting empty or incomplete {ofname} ...")
-                        ofname.unlink()
-                        status.failed += 1
-                        continue
-
-                    status.success += 1
-
-        except KeyboardInterrupt:
-            log.info(f"Interrupted by user. Closing FTP connection ...")
-            raise
+                pending.submit(
+                    claims.run,
+                    uri,
+                    ofname,
+                    checksums.run,
+                    pair.path_remote,
+                    fname,
+                    retrieve,
+                    pool,
+                    pair.path_remote,
+                    fname,
+                    ofname,
+                    mtime=remote.mtime if remote is not None else None,
+                    progress=source.progress,
+                    uri=uri,
+                    decompress=source.decompress,
+                )
+
+        status += pending.result()
 
     return status
@@ -3,53 +3,825 @@ Transfer files over HTTP
 
 """
 
+import os
+import time
+from typing import Final
 from pathlib import Path
+from fnmatch import fnmatch
+from html.parser import HTMLParser
+from urllib.parse import (
+    unquote,
+    urljoin,
+    urlparse,
+)
+from email.utils import parsedate_to_datetime
+from collections.abc import (
+    Callable,
+    Mapping,
+)
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import logging
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from ab.data import TransferStatus
-from ab.data.source import Source
-from ab.data.stats import already_updated
+from ab.data import (
+    TransferStatus,
+    Pending,
+    limits,
+    pairs_to_try,
+    unlisted,
+)
+from ab.data import compress as _compress
+from ab.data.cache import get_cache
+from ab.data.claims import get_claims
+from ab.data.checksum import (
+    Checksum,
+    Checksums,
+)
+from ab.data.source import (
+    Source,
+    RemoteLocalPair,
+)
+from ab.data.progress import Progress
+from ab.data.partial import (
+    SUFFIX,
+    part_of,
+    offset,
+    complete,
+    discard_empty,
+    store_validator,
+    stored_validator,
+)
+from ab.data.stats import (
+    RemoteStat,
+    comparable,
+    set_mtime,
+)
+from ab.data.journal import (
+    get_journal,
+    is_current,
+)
 
 log = logging.getLogger(__name__)
 
+CHUNK_SIZE: Final = 1024 * 1024
+"Number of bytes to read from the response at a time"
+
+CONGESTED: Final = (
+    requests.codes.too_many_requests,
+    requests.codes.service_unavailable,
+)
+"Status codes of a server, which is too busy to respond"
+
 
 _SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
+_POOL_SIZES: dict[str, int] = {}
 
 
 def get_session() -> requests.Session:
     global _SESSION
-    if _SESSION is None:
-        _SESSION = requests.Session()
-    return _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+        return _SESSION
 
 
-def download(source: Source) -> TransferStatus:
+def size_pool(scheme: str, host: str, size: int) -> None:
     """
-    Download a file over HTTP (TLS or not)
+    Make the session keep at least `size` connections to given host, so that
+    concurrent downloads from the host do not open and close connections.
+
+    """
+    session = get_session()
+    prefix = f"{scheme}://{host}/"
+    with _SESSION_LOCK:
+        if _POOL_SIZES.get(prefix, 0) >= size:
+            return
+        log.debug(f"Keep up to {size} connections to {prefix} ...")
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
+        session.mount(prefix, adapter)
+        _POOL_SIZES[prefix] = size
+
+
+def _remote_stat(headers: Mapping[str, str]) -> RemoteStat:
+    """
+    Get size and modification time of the remote file from response headers.
+
+    The content length is ignored for encoded content, since the body is
+    decoded, when it is read.
+
+    """
+    stat = RemoteStat()
+    size = headers.get("Content-Length")
+    if size is not None and "Content-Encoding" not in headers:
+        stat.size = int(size)
+    modified = headers.get("Last-Modified")
+    if modified is not None:
+        try:
+            stat.mtime = parsedate_to_datetime(modified).timestamp()
+        except (TypeError, ValueError):
+            log.debug(f"Could not parse Last-Modified header {modified!r} ...")
+    return stat
+
+
+def head(uri: str) -> Mapping[str, str] | None:
+    """
+    Return the response headers of a HEAD request for given URI, or no headers,
+    if the server responded with an error.
+
+    Returns None, if the request could not be made, e.g. if it timed out.
+
+    """
+    try:
+        response = get_session().head(uri, allow_redirects=True, timeout=30)
+    except requests.RequestException as e:
+        log.warning(f"Could not get details of {uri} ...")
+        log.debug(f"{e}")
+        return None
+    if not response.ok:
+        return {}
+    return response.headers
+
+
+def remote_stat(uri: str) -> RemoteStat:
+    """
+    Return size and modification time of the remote file using a HEAD request.
+
+    """
+    return _remote_stat(head(uri) or {})
+
+
+class _IndexParser(HTMLParser):
+    """
+    Collect the link targets in an HTML page.
+
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.hrefs: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag != "a":
+            return
+        for name, value in attrs:
+            if name == "href" and value:
+                self.hrefs.append(value)
+
+
+def parse_index(directory: str, html: str) -> list[str]:
+    """
+    Return names of the files linked to directly under the given directory URL
+    in a directory-index page such as those generated by Apache or nginx.
+
+    Links to other directories, sorting links and links to other locations are
+    ignored.
+
+    """
+    parser = _IndexParser()
+    parser.feed(html)
+    parent = urlparse(directory).path
+    names = []
+    for href in parser.hrefs:
+        path = urlparse(urljoin(directory, href)).path
+        if path.endswith("/") or path.rpartition("/")[0] + "/" != parent:
+            continue
+        name = unquote(path.rpartition("/")[2])
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def list_files(directory: str) -> list[str]:
+    """
+    List files in remote directory using its directory-index page.
+
+    """
+    log.debug(f"Get directory index {directory} ...")
+    response = get_session().get(directory, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    return parse_index(directory, response.text)
+
+
+def cached_list_files(
+    host: str, directory: str, *, max_age: int | float = 0
+) -> list[str]:
+    """
+    List files in remote directory, using the cached listing, if it is not
+    older than `max_age` seconds, or if the directory has already been listed
+    in this run.
+
+    """
+    cache = get_cache()
+    path = urlparse(directory).path
+    listing = cache.listing(host, path, max_age=max_age)
+    if listing is None:
+        listing = list_files(directory)
+        cache.store_listing(host, path, listing)
+    return listing
+
+
+def expand(
+    source: Source,
+    pair: RemoteLocalPair,
+    listings: dict[str, list[str]] | None = None,
+) -> list[RemoteLocalPair] | None:
+    """
+    Return pairs for each file in the remote directory matching the wildcard
+    filename of given pair, or None, if the directory could not be listed.
+
+    Pairs without wildcards are returned as they are.
+
+    If `listings` is given, the listing of the remote directory is stored in it.
+
+    """
+    if "*" not in pair.fname:
+        return [pair]
+
+    directory = pair.uri[: pair.uri.rindex("/") + 1]
+    try:
+        listing = cached_list_files(source.host, directory, max_age=source.listing_ttl)
+    except requests.RequestException as e:
+        log.warning(f"Could not list {directory} ...")
+        log.debug(f"{e}")
+        return None
+
+    if listings is not None:
+        listings[pair.path_remote] = listing
+    return [
+        RemoteLocalPair(f"{directory}{fname}", pair.path_local)
+        for fname in listing
+        if fnmatch(fname, pair.fname)
+    ]
+
+
+def _total_size(response: requests.Response) -> int | None:
+    """
+    Return size of the complete remote file, also for a partial response.
+
+    """
+    content_range = response.headers.get("Content-Range")
+    if content_range is not None:
+        total = content_range.rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    return _remote_stat(response.headers).size
+
+
+def _range_validator(headers: Mapping[str, str]) -> str | None:
+    """
+    Return the validator for an If-Range header from given response headers.
+
+    Weak ETags can not be used in the If-Range header.
+
+    """
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def _validators(uri: str, ofname: Path, *, force: bool = False) -> dict[str, str]:
+    """
+    Return the validators stored for given URI, when the local file was last
+    downloaded, for making a request conditional.
+
+    No validators are returned, if `force` is set, or if the local file is
+    missing or has another size than the file downloaded.
+
+    """
+    if force or not ofname.is_file():
+        return {}
+    entry = get_journal().entry(ofname)
+    if entry is not None and entry.size not in (None, ofname.stat().st_size):
+        log.debug(f"{ofname.name} changed since it was downloaded ...")
+        return {}
+    return get_cache().validators(uri)
+
+
+def retrieve(
+    uri: str,
+    ofname: Path,
+    *,
+    mtime: float | None = None,
+    progress: bool = False,
+    checksum: Checksum | None = None,
+    decompress: bool = False,
+    force: bool = False,
+) -> TransferStatus:
+    """
+    Download a single file.
+
+    The response body is streamed to a partial file in chunks of `CHUNK_SIZE`
+    bytes, so that memory use does not depend on the size of the file. The
+    download resumes from the current size of the partial file with a Range
+    request, and the partial file is renamed, when its size matches the remote
+    size. The request is made with the validator of the remote file, whose bytes
+    the partial file holds, in an If-Range header, so that the server sends the
+    whole file, if it changed meanwhile. A partial file without a validator is
+    not resumed.
+
+    If `progress` is set, progress and throughput are logged while downloading.
+
+    If `checksum` is given, the file is hashed, while it is written, and deleted,
+    if it does not match the published checksum.
+
+    If `decompress` is set, and the file is compressed with gzip or UNIX
+    compress, it is decompressed, while it is written, to the given destination
+    file. Such a download can not be resumed.
+
+    If the file already exists, the request is made conditional on the ETag and
+    Last-Modified validators stored, when the file was last downloaded. If the
+    server responds that the file is not modified, the body is not transferred.
+    If `force` is set, or the file changed locally, the request is not
+    conditional.
 
     """
     status = TransferStatus()
-    for pair in source.resolve():
-        destination = Path(pair.path_local)
-        destination.mkdir(parents=True, exist_ok=True)
-        ofname = destination / pair.fname
+    host = urlparse(uri).netloc
+    part = part_of(ofname)
+    unpack = _compress.decompressor(urlparse(uri).path) if decompress else None
+    rest = offset(part, mtime=mtime) if unpack is None else 0
+    validator = stored_validator(part) if rest else None
+    if rest and validator is None:
+        log.info(f"Remote version of {part.name} is not known. Starting over ...")
+        rest = 0
+    digest = checksum.digest() if checksum is not None else None
+    cache = get_cache()
+    if rest and validator is not None:
+        headers = {"Range": f"bytes={rest}-", "If-Range": validator}
+    else:
+        headers = _validators(uri, ofname, force=force)
 
-        if already_updated(ofname, max_age=source.max_age):
-            log.debug(f"{ofname.name} already downloaded ...")
+    log.info(f"Download {uri} to {ofname} ...")
+    try:
+        with (
+            limits.slot(host),
+            get_session().get(
+                uri, headers=headers, allow_redirects=True, timeout=30, stream=True
+            ) as response,
+        ):
+
+            if response.status_code == requests.codes.not_modified:
+                log.debug(f"{ofname.name} not modified ...")
+                # Re-setting the modification time changes the status-change
+                # time (ctime) used by `max_age`, so that the file is not
+                # checked again, until it has expired again.
+                set_mtime(ofname, ofname.stat().st_mtime)
+                get_journal().record(
+                    uri, ofname, size=ofname.stat().st_size, remote_mtime=mtime
+                )
+                # A response without a body is no measure of the host latency.
+                limits.completed(host, 0, 0.0)
+                status.existing += 1
+                return status
+
+            if response.status_code == requests.codes.range_not_satisfiable:
+                # The partial file is already complete (or too large).
+                size = _total_size(response)
+                if digest is not None:
+                    digest.update_from(part)
+
+            elif response.status_code in (
+                requests.codes.not_found,
+                requests.codes.gone,
+            ):
+                log.info(f"{uri} not found ...")
+                cache.store_miss(uri)
+                discard_empty(part)
+                status.not_found += 1
+                return status
+
+            elif not response.ok:
+                # Calling it a failure, without knowing the cause of the error.
+                if response.status_code in CONGESTED:
+                    limits.congested(host)
+                discard_empty(part)
+                status.failed += 1
+                return status
+
+            else:
+                # The server may ignore the Range header and send everything.
+                resumed = response.status_code == requests.codes.partial_content
+                size = _total_size(response)
+                tracker = Progress(
+                    ofname.name, size, offset=rest if resumed else 0, report=progress
+                )
+                if digest is not None and resumed:
+                    digest.update_from(part)
+                if not resumed:
+                    store_validator(part, _range_validator(response.headers))
+                with open(part, "ab" if resumed else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk if unpack is None else unpack.decompress(chunk))
+                        tracker(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                    if unpack is not None:
+                        f.write(unpack.flush())
+                tracker.finish()
+                status.transferred(host, tracker.bytes, tracker.seconds)
+                limits.completed(
+                    host,
+                    tracker.bytes,
+                    tracker.seconds,
+                    response.elapsed.total_seconds(),
+                )
+
+                if unpack is not None and size is not None and tracker.bytes != size:
+                    log.warning(f"Received {tracker.bytes} of {size} B of {uri} ...")
+                    part.unlink()
+                    status.failed += 1
+                    return status
+
+            modified = _remote_stat(response.headers).mtime
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+    except requests.RequestException as e:
+        log.warning(f"Download of {uri} was interrupted. Keeping {part.name} ...")
+        log.debug(f"{e}")
+        discard_empty(part)
+        status.failed += 1
+        status.exceptions.append(e)
+        return status
+
+    except ValueError as e:
+        log.warning(f"Could not decompress {uri} ...")
+        log.debug(f"{e}")
+        part.unlink(missing_ok=True)
+        status.failed += 1
+        status.exceptions.append(e)
+        return status
+
+    if not complete(part, ofname, size=size if unpack is None else None):
+        status.failed += 1
+        return status
+
+    if checksum is not None and digest is not None:
+        if not checksum.verify(digest, ofname):
+            status.mismatch += 1
+            return status
+
+    set_mtime(ofname, modified or mtime)
+    cache.store_validators(uri, etag, last_modified)
+    get_journal().record(
+        uri,
+        ofname,
+        size=ofname.stat().st_size,
+        checksum=str(digest) if digest is not None else None,
+        remote_mtime=modified or mtime,
+    )
+    status.success += 1
+    return status
+
+
+def byte_ranges(size: int, n: int) -> list[tuple[int, int]]:
+    """
+    Split given number of bytes into `n` byte ranges (first and last byte
+    included) of nearly the same size.
+
+    """
+    n = max(min(n, size), 1)
+    bounds = [size * ix // n for ix in range(n + 1)]
+    return [(beg, end - 1) for (beg, end) in zip(bounds, bounds[1:])]
+
+
+def _retrieve_range(
+    uri: str,
+    part: Path,
+    first: int,
+    last: int,
+    validator: str | None,
+    tracker: Callable[[bytes], None],
+) -> int:
+    """
+    Download given byte range of the remote file into its place in the partial
+    file, and return the number of bytes received.
+
+    """
+    headers = {"Range": f"bytes={first}-{last}"}
+    if validator is not None:
+        # The server sends the whole file instead, if it changed meanwhile.
+        headers["If-Range"] = validator
+
+    host = urlparse(uri).netloc
+    received = 0
+    with (
+        limits.slot(host),
+        get_session().get(
+            uri, headers=headers, allow_redirects=True, timeout=30, stream=True
+        ) as response,
+    ):
+        started = time.monotonic()
+        if response.status_code in CONGESTED:
+            limits.congested(host)
+        if response.status_code != requests.codes.partial_content:
+            raise requests.HTTPError(
+                f"Expected bytes {first}-{last} of {uri}. Got {response.status_code} ...",
+                response=response,
+            )
+        with open(part, "r+b") as f:
+            f.seek(first)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                received += len(chunk)
+                tracker(chunk)
+        limits.completed(
+            host, received, time.monotonic() - started, response.elapsed.total_seconds()
+        )
+    return received
+
+
+def retrieve_segmented(
+    uri: str,
+    ofname: Path,
+    *,
+    headers: Mapping[str, str],
+    segments: int,
+    mtime: float | None = None,
+    progress: bool = False,
+    checksum: Checksum | None = None,
+    force: bool = False,
+) -> TransferStatus:
+    """
+    Download a single large file in `segments` byte ranges at the same time,
+    each over its own connection.
+
+    The size of the file is taken from the headers of a HEAD request for it. The
+    ranges are written into their place in a partial file of the full size,
+    which is only renamed, when all bytes of the file are received. A
+    segmented download is not resumed, and its partial file is not that of a
+    download in one stream.
+
+    If the file already exists, and the ETag or Last-Modified validators in the
+    headers match those stored, when the file was last downloaded, the file is
+    not transferred, unless `force` is set, or the file changed locally.
+
+    If `checksum` is given, the complete file is hashed, and deleted, if it does
+    not match the published checksum.
+
+    """
+    status = TransferStatus()
+    host = urlparse(uri).netloc
+    cache = get_cache()
+    size = _remote_stat(headers).size
+    assert size is not None
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    modified = _remote_stat(headers).mtime
+
+    stored = _validators(uri, ofname, force=force)
+    if stored:
+        if (etag is not None and stored.get("If-None-Match") == etag) or (
+            last_modified is not None
+            and stored.get("If-Modified-Since") == last_modified
+        ):
+            log.debug(f"{ofname.name} not modified ...")
+            set_mtime(ofname, ofname.stat().st_mtime)
+            get_journal().record(
+                uri, ofname, size=ofname.stat().st_size, remote_mtime=mtime
+            )
             status.existing += 1
-            continue
+            return status
 
-        log.info(f"Download {pair.uri} to {ofname} ...")
-        response = get_session().get(pair.uri, allow_redirects=True, timeout=30)
+    part = ofname.with_name(f"{ofname.name}.segments{SUFFIX}")
+    ranges = byte_ranges(size, segments)
+    tracker = Progress(ofname.name, size, report=progress)
+    lock = threading.Lock()
+    validator = _range_validator(headers)
 
-        if not response.ok:
-            # Calling it a failure, without knowing the cause of the error.
-            status.failed += 1
-            continue
+    def track(chunk: bytes) -> None:
+        with lock:
+            tracker(chunk)
+
+    log.info(f"Download {uri} to {ofname} in {len(ranges)} segments ...")
+    try:
+        # Reserve the full size without writing it, i.e. a sparse file.
+        with open(part, "wb") as f:
+            f.truncate(size)
+        with ThreadPoolExecutor(
+            max_workers=len(ranges), thread_name_prefix=f"http-{host}-segment"
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _retrieve_range,
+                    uri,
+                    part,
+                    first,
+                    last,
+                    validator,
+                    track,
+                )
+                for (first, last) in ranges
+            ]
+            received = sum(future.result() for future in futures)
+        tracker.finish()
+        status.transferred(host, tracker.bytes, tracker.seconds)
+
+    except (requests.RequestException, OSError) as e:
+        log.warning(f"Segmented download of {uri} failed ...")
+        log.debug(f"{e}")
+        part.unlink(missing_ok=True)
+        status.failed += 1
+        status.exceptions.append(e)
+        return status
+
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+    if received != size:
+        log.warning(f"Received {received} of {size} B of {uri} ...")
+        part.unlink()
+        status.failed += 1
+        return status
+
+    os.replace(part, ofname)
+
+    digest = checksum.digest() if checksum is not None else None
+    if checksum is not None and digest is not None:
+        digest.update_from(ofname)
+        if not checksum.verify(digest, ofname):
+            status.mismatch += 1
+            return status
+
+    set_mtime(ofname, modified or mtime)
+    cache.store_validators(uri, etag, last_modified)
+    get_journal().record(
+        uri,
+        ofname,
+        size=ofname.stat().st_size,
+        checksum=str(digest) if digest is not None else None,
+        remote_mtime=modified or mtime,
+    )
+    status.success += 1
+    return status
+
+
+def _segmentable(headers: Mapping[str, str], threshold: int) -> bool:
+    """
+    Return True, if the server accepts byte ranges for a file of known size at
+    or above the threshold.
+
+    """
+    size = _remote_stat(headers).size
+    return (
+        headers.get("Accept-Ranges", "").lower() == "bytes"
+        and size is not None
+        and size >= threshold
+    )
+
+
+def read(directory: str, fname: str) -> bytes | None:
+    """
+    Return content of a small remote file, e.g. a checksum file, or None, if it
+    could not be read.
+
+    """
+    uri = f"{directory}/{fname}"
+    try:
+        with limits.slot(urlparse(uri).netloc):
+            response = get_session().get(uri, allow_redirects=True, timeout=30)
+    except requests.RequestException as e:
+        log.debug(f"Could not read {uri}: {e}")
+        return None
+    if not response.ok:
+        log.debug(f"Could not read {uri}: {response.status_code}")
+        return None
+    return response.content
+
+
+def fetch(
+    source: Source, pair: RemoteLocalPair, checksums: Checksums | None = None
+) -> TransferStatus:
+    """
+    Download a single resolved pair, unless the local file is current.
+
+    If checksums are given, the file is verified against them.
+
+    A source with a maximum age of zero, as with `ab download --force`, downloads
+    the file, even if the server has it unchanged.
+
+    """
+    destination = Path(pair.path_local)
+    destination.mkdir(parents=True, exist_ok=True)
+    ofname = destination / (
+        _compress.decompressed(pair.fname) if source.decompress else pair.fname
+    )
+
+    headers = head(pair.uri) if source.sync else None
+    if source.sync and headers is None:
+        return TransferStatus(failed=1)
+    remote = comparable(
+        _remote_stat(headers) if headers is not None else None,
+        decompressed=ofname.name != pair.fname,
+    )
+    if is_current(pair.uri, ofname, max_age=source.max_age, remote=remote):
+        log.debug(f"{ofname.name} already downloaded ...")
+        return TransferStatus(existing=1)
+
+    # Fetch each remote file only once per run
+    claims = get_claims()
+    claimed = claims.claim(pair.uri, ofname)
+    if claimed is not None:
+        return claimed
+
+    checksums = checksums or Checksums()
+    mtime = remote.mtime if remote is not None else None
+    force = source.max_age == 0
+
+    # Large files are downloaded in segments, unless decompressed on the way,
+    # and in one stream, if the size of the file could not be requested.
+    if source.segments > 1 and not source.decompress:
+        headers = headers if headers is not None else head(pair.uri)
+        if headers is not None and _segmentable(headers, source.segment_threshold):
+            return claims.run(
+                pair.uri,
+                ofname,
+                checksums.run,
+                pair.uri.rpartition("/")[0],
+                pair.fname,
+                retrieve_segmented,
+                pair.uri,
+                ofname,
+                headers=headers,
+                segments=source.segments,
+                mtime=mtime,
+                progress=source.progress,
+                force=force,
+            )
+
+    return claims.run(
+        pair.uri,
+        ofname,
+        checksums.run,
+        pair.uri.rpartition("/")[0],
+        pair.fname,
+        retrieve,
+        pair.uri,
+        ofname,
+        mtime=mtime,
+        progress=source.progress,
+        decompress=source.decompress,
+        force=force,
+    )
+
+
+def download(
+    source: Source, *, listings: dict[str, list[str]] | None = None
+) -> TransferStatus:
+    """
+    Download a file over HTTP (TLS or not)
+
+    If `source.sync` is set, files are compared with the size and modification
+    time of the remote file instead of using `source.max_age`.
+
+    Filenames with wildcards are matched against the directory-index page of
+    the remote directory, which is cached like FTP-directory listings.
+
+    Files are downloaded concurrently by `source.workers` threads sharing a pool
+    of as many connections to the host.
+
+    If `listings` is given, the listing of each remote directory is stored in
+    it, and files in a directory listed there already are counted as existing,
+    so that only files that appeared since are downloaded.
+
+    """
+    status = TransferStatus()
+    cache = get_cache()
+    previous = dict(listings) if listings is not None else {}
+    # Each worker may download a large file over several connections.
+    size_pool(
+        source.protocol,
+        source.host,
+        max(source.workers * source.segments, limits.per_host() or 1),
+    )
+
+    executor = ThreadPoolExecutor(
+        max_workers=source.workers, thread_name_prefix=f"http-{source.host}"
+    )
+    checksums = Checksums(source.checksum, read=read)
+    with Pending(executor, limit=2 * source.workers, name="HTTP transfers") as pending:
+        for pair in pairs_to_try(source, status):
+            expanded = expand(source, pair, listings)
+            if expanded is None:
+                status.failed += 1
+                continue
+            if not expanded:
+                log.info(f"Found no files matching {pair.uri} ...")
+                cache.store_miss(pair.uri)
+                status.not_found += 1
+                continue
+
+            expanded = unlisted(
+                previous, pair, expanded, status, key=lambda each: each.fname
+            )
+            for each in expanded:
+                pending.submit(fetch, source, each, checksums)
 
-        ofname.write_bytes(response.content)
-        status.success += 1
+        status += pending.result()
 
     return status
@@ -0,0 +1,202 @@
+"""
+Journal of transferred files
+
+Every file transferred by `ab download` is recorded in an SQLite database in the
+AutoBernese runtime directory with its remote URI, local path, size, checksum,
+remote modification time and the time of the transfer.
+
+Checking if a local file is already downloaded is then an indexed lookup in the
+journal instead of probing the file system, which is slow for network-mounted
+data directories with many files. Files not yet in the journal are checked on
+disk and added to it.
+
+Since the journal is not updated, when files are deleted or changed by other
+means, it should be reconciled with the disk from time to time.
+
+"""
+
+import time
+import math
+import sqlite3
+import threading
+import datetime as dt
+from dataclasses import dataclass
+from collections.abc import Iterator
+from pathlib import Path
+import logging
+
+from ab import configuration
+from ab.data.stats import (
+    RemoteStat,
+    is_current as _is_current_on_disk,
+)
+
+log = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    path TEXT PRIMARY KEY,
+    uri TEXT NOT NULL,
+    size INTEGER,
+    checksum TEXT,
+    remote_mtime REAL,
+    transferred REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transfers_uri ON transfers (uri);
+"""
+
+
+@dataclass
+class Entry:
+    path: str
+    uri: str
+    size: int | None
+    checksum: str | None
+    remote_mtime: float | None
+    transferred: float
+
+    def age(self) -> int:
+        """
+        Return age of the transfer in whole days since today.
+
+        """
+        return (dt.date.today() - dt.date.fromtimestamp(self.transferred)).days
+
+
+class Journal:
+    """
+    Thread-safe access to the journal database.
+
+    """
+
+    def __init__(self, filename: Path | str) -> None:
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+
+    def record(
+        self,
+        uri: str,
+        path: Path | str,
+        *,
+        size: int | None = None,
+        checksum: str | None = None,
+        remote_mtime: float | None = None,
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO transfers VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path), uri, size, checksum, remote_mtime, time.time()),
+            )
+
+    def entry(self, path: Path | str) -> Entry | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM transfers WHERE path = ?", (str(path),)
+            ).fetchone()
+        return Entry(*row) if row is not None else None
+
+    def entries(self) -> Iterator[Entry]:
+        with self._lock:
+            rows = self._connection.execute("SELECT * FROM transfers").fetchall()
+        return (Entry(*row) for row in rows)
+
+    def remove(self, paths: list[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM transfers WHERE path = ?", ((path,) for path in paths)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+_JOURNAL: Journal | None = None
+_JOURNAL_LOCK = threading.Lock()
+
+
+def get_journal() -> Journal:
+    global _JOURNAL
+    with _JOURNAL_LOCK:
+        if _JOURNAL is None:
+            _JOURNAL = Journal(configuration._journal())
+        return _JOURNAL
+
+
+def is_current(
+    uri: str,
+    fname: Path,
+    *,
+    max_age: int | float = math.inf,
+    remote: RemoteStat | None = None,
+) -> bool:
+    """
+    Check if the local file is current using the journal.
+
+    With details known about the remote file, they are compared with those
+    recorded, when the file was transferred. Otherwise, the time of the transfer
+    is compared with the maximum age in days.
+
+    Files not in the journal are checked on disk, and, if they are current, they
+    are added to the journal. A file, which is no longer on disk, is never
+    current, whatever its entry says.
+
+    """
+    journal = get_journal()
+    entry = journal.entry(fname)
+
+    if entry is None:
+        if not _is_current_on_disk(fname, max_age=max_age, remote=remote):
+            return False
+        stat = fname.stat()
+        journal.record(
+            uri,
+            fname,
+            size=stat.st_size,
+            remote_mtime=remote.mtime if remote is not None else None,
+        )
+        return True
+
+    if not fname.is_file():
+        log.debug(f"{fname} is in the journal, but no longer exists ...")
+        return False
+
+    if remote is not None and remote.known:
+        if remote.size is not None and entry.size != remote.size:
+            return False
+        if remote.mtime is not None:
+            if (
+                entry.remote_mtime is None
+                or abs(entry.remote_mtime - remote.mtime) >= 1
+            ):
+                return False
+        return True
+
+    return entry.age() < max_age
+
+
+def reconcile(journal: Journal) -> tuple[int, int]:
+    """
+    Remove entries for files that no longer exist or whose size has changed
+    since they were transferred.
+
+    Returns the number of entries checked and removed, respectively.
+
+    """
+    checked = 0
+    stale = []
+    for entry in journal.entries():
+        checked += 1
+        path = Path(entry.path)
+        if not path.is_file():
+            log.debug(f"{path} no longer exists ...")
+            stale.append(entry.path)
+        elif entry.size is not None and path.stat().st_size != entry.size:
+            log.debug(f"{path} changed since it was transferred ...")
+            stale.append(entry.path)
+    journal.remove(stale)
+    return checked, len(stale)
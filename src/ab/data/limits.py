@@ -0,0 +1,280 @@
+"""
+Limit the number of concurrent transfers per host and overall
+
+Transfer functions take a slot for the remote host, before they transfer a file,
+and give it back, when the transfer is done. When all slots for the host, or all
+slots overall, are taken, the transfer waits for one to be given back.
+
+By default, there are no limits.
+
+Limits may be adaptive, in which case the number of slots for each host starts
+at the limit per host and is adjusted by the transfers from the host, additively
+increasing and multiplicatively decreasing like the congestion window of TCP:
+
+*   A completed transfer adds a fraction of a slot, so that the number of slots
+    grows by one, when each slot has completed a transfer. The number of slots
+    never exceeds the overall limit.
+
+*   A transfer rejected by the host, because it is busy, e.g. with FTP reply 421
+    or HTTP status 503, halves the number of slots, but never below one.
+
+*   A transfer whose response took much longer than the smoothed response time
+    of the host, or whose throughput, multiplied by the number of active
+    transfers, is much less than the best seen from the host, means that more
+    transfers do not make the host any faster. The number of slots is then
+    reduced by a quarter.
+
+The number of slots is reduced at most once for each round of transfers, since
+the transfers active at the same time are likely to see the same congestion.
+
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Final
+import threading
+import logging
+
+log = logging.getLogger(__name__)
+
+
+BACKOFF: Final = 0.5
+"Factor the slots of a host are multiplied by, when the host rejects a transfer"
+
+EASE: Final = 0.75
+"Factor the slots of a host are multiplied by, when transfers slow down"
+
+LATENCY_FACTOR: Final = 4.0
+"Number of times the smoothed response time, above which a response is slow"
+
+SMOOTHING: Final = 0.125
+"Weight of the latest response in the smoothed response time of a host"
+
+THROUGHPUT_FACTOR: Final = 0.5
+"Fraction of the best throughput of a host, below which transfers are slow"
+
+MIN_SIZE: Final = 1024 * 1024
+"Size in bytes of the smallest transfer, whose throughput is considered"
+
+DECAY: Final = 0.99
+"Factor the best throughput of a host is multiplied by after each transfer"
+
+
+class Window:
+    """
+    Adaptive number of slots for transfers from a single host.
+
+    """
+
+    def __init__(self, host: str, limit: int, ceiling: int | None = None) -> None:
+        self.host = host
+        self.limit = float(limit)
+        self.ceiling = ceiling
+        self.active = 0
+        self.latency: float | None = None
+        "Smoothed response time of the host in seconds"
+        self.throughput = 0.0
+        "Best total throughput from the host in bytes per second, slowly decaying"
+        self._rounds = limit
+        self._condition = threading.Condition()
+
+    @property
+    def slots(self) -> int:
+        return max(int(self.limit), 1)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.active >= self.slots:
+                self._condition.wait()
+            self.active += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def _decrease(self, factor: float, reason: str) -> None:
+        # Transfers active since the last decrease may report the same
+        # congestion.
+        if self._rounds < self.slots:
+            return
+        self._rounds = 0
+        self.limit = max(self.limit * factor, 1.0)
+        log.debug(f"{reason}. Limit transfers from {self.host} to {self.slots} ...")
+
+    def congested(self) -> None:
+        with self._condition:
+            self._rounds += 1
+            self._decrease(BACKOFF, f"{self.host} is busy")
+
+    def completed(self, size: int, seconds: float, latency: float | None) -> None:
+        with self._condition:
+            self._rounds += 1
+
+            if latency is not None:
+                # A moving average, like the smoothed round-trip time of TCP,
+                # so that a single fast response is not taken as the norm.
+                if self.latency is None:
+                    self.latency = latency
+                slow = latency > LATENCY_FACTOR * self.latency
+                self.latency += SMOOTHING * (latency - self.latency)
+                if slow:
+                    self._decrease(EASE, f"Responses from {self.host} slow down")
+                    return
+
+            if size >= MIN_SIZE and seconds > 0:
+                throughput = size / seconds * max(self.active, 1)
+                self.throughput = max(self.throughput * DECAY, throughput)
+                if throughput < THROUGHPUT_FACTOR * self.throughput:
+                    self._decrease(EASE, f"Transfers from {self.host} slow down")
+                    return
+
+            limit = self.limit + 1 / self.slots
+            if self.ceiling:
+                limit = min(limit, self.ceiling)
+            if int(limit) > int(self.limit):
+                log.debug(f"Allow {int(limit)} transfers from {self.host} ...")
+                self._condition.notify()
+            self.limit = limit
+
+
+class Limits:
+    """
+    Semaphores for each host and for all hosts together.
+
+    If `adaptive` is set, the slots for each host start at `per_host` (or one)
+    and are adjusted by the feedback from the transfers, up to `total`.
+
+    """
+
+    def __init__(
+        self,
+        total: int | None = None,
+        per_host: int | None = None,
+        adaptive: bool = False,
+    ) -> None:
+        self.total = total
+        self.per_host = per_host
+        self.adaptive = adaptive
+        self._total = threading.BoundedSemaphore(total) if total else None
+        self._hosts: dict[str, threading.BoundedSemaphore] = {}
+        self._windows: dict[str, Window] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> threading.BoundedSemaphore | None:
+        if not self.per_host:
+            return None
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def window(self, host: str) -> Window | None:
+        """
+        Return the adaptive slots for given host, if limits are adaptive.
+
+        """
+        if not self.adaptive:
+            return None
+        with self._lock:
+            if host not in self._windows:
+                self._windows[host] = Window(host, self.per_host or 1, self.total)
+            return self._windows[host]
+
+    @contextmanager
+    def slot(self, host: str) -> Iterator[None]:
+        """
+        Take a slot for a transfer from given host.
+
+        The host slot is always taken before the overall slot, so that a
+        transfer waiting for a busy host does not keep other hosts waiting.
+
+        """
+        window = self.window(host)
+        host_semaphore = self._host(host) if window is None else None
+        if window is not None:
+            window.acquire()
+        if host_semaphore is not None:
+            host_semaphore.acquire()
+        try:
+            if self._total is not None:
+                self._total.acquire()
+            try:
+                yield
+            finally:
+                if self._total is not None:
+                    self._total.release()
+        finally:
+            if host_semaphore is not None:
+                host_semaphore.release()
+            if window is not None:
+                window.release()
+
+    def congested(self, host: str) -> None:
+        """
+        Report that given host rejected a transfer, because it is busy.
+
+        """
+        window = self.window(host)
+        if window is not None:
+            window.congested()
+
+    def completed(
+        self, host: str, size: int, seconds: float, latency: float | None = None
+    ) -> None:
+        """
+        Report a transfer of `size` bytes from given host, which took `seconds`
+        and whose response took `latency` seconds, if known.
+
+        """
+        window = self.window(host)
+        if window is not None:
+            window.completed(size, seconds, latency)
+
+
+_LIMITS = Limits()
+
+
+def configure(
+    total: int | None = None, per_host: int | None = None, adaptive: bool = False
+) -> None:
+    """
+    Set the maximum number of concurrent transfers overall and per host. A value
+    of None or zero means no limit.
+
+    If `adaptive` is set, the limit per host is where the number of concurrent
+    transfers from each host starts.
+
+    """
+    global _LIMITS
+    log.debug(
+        f"Limit concurrent transfers to {total=} and {per_host=} ({adaptive=}) ..."
+    )
+    _LIMITS = Limits(total, per_host, adaptive)
+
+
+def per_host() -> int | None:
+    """
+    Return the largest number of concurrent transfers from a single host, if
+    limited.
+
+    """
+    if _LIMITS.adaptive:
+        return _LIMITS.total or None
+    return _LIMITS.per_host
+
+
+@contextmanager
+def slot(host: str) -> Iterator[None]:
+    with _LIMITS.slot(host):
+        yield
+
+
+def congested(host: str) -> None:
+    _LIMITS.congested(host)
+
+
+def completed(
+    host: str, size: int, seconds: float, latency: float | None = None
+) -> None:
+    _LIMITS.completed(host, size, seconds, latency)
@@ -0,0 +1,319 @@
+"""
+Choose between mirrors of a source
+
+Many products are published at more than one archive, e.g. the IGS products at
+CDDIS, BKG and IGN. A source may list such mirrors as URLs with the same
+parameters and filenames as its own URL.
+
+Before the source is downloaded, the host of each URL is probed with a cheap
+request, and the URLs are ranked by the latency of the probe and the
+throughput of earlier downloads from the host. The source is then downloaded
+from the best URL, and the paths, whose files could not be downloaded from it,
+are tried again from the next URL, and so on. A path is done, when each of its
+files is in the journal as transferred during the download, or as current.
+The files matching a wildcard are those in the listing of the remote directory
+made by the download, and a wildcard without a listing is always tried again.
+
+The latency and throughput of each host are stored in the cache, so that
+they are remembered across runs.
+
+"""
+
+import time
+import math
+import dataclasses
+from dataclasses import dataclass
+from typing import Final
+from types import ModuleType
+from fnmatch import fnmatch
+from pathlib import Path
+from collections.abc import Iterator
+from ftplib import all_errors
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import requests
+
+from ab.data import TransferStatus
+from ab.data import (
+    ftp as _ftp,
+    http as _http,
+)
+from ab.data import compress as _compress
+from ab.data.cache import get_cache
+from ab.data.journal import get_journal
+from ab.data.source import (
+    Source,
+    RemoteLocalPair,
+)
+
+log = logging.getLogger(__name__)
+
+
+PROBE_TIMEOUT: Final = 10
+"Seconds to wait for the response to a probe"
+
+REFERENCE_SIZE: Final = 10 * 1024 * 1024
+"Size in bytes of the file, whose download time the mirrors are ranked by"
+
+DEFAULT_THROUGHPUT: Final = 1024 * 1024
+"Throughput in bytes per second assumed for a host not downloaded from before"
+
+WEIGHT: Final = 0.3
+"Weight of a new measurement in the stored average of a host"
+
+
+@dataclass
+class Mirror:
+    url: str
+    host: str
+    latency: float | None = None
+    "Seconds the probe took, or None, if the host did not respond"
+    throughput: float | None = None
+    "Average bytes per second of earlier downloads from the host"
+
+    @property
+    def score(self) -> float:
+        """
+        Expected seconds to download a file of `REFERENCE_SIZE` bytes from the
+        host, or infinity, if the host is down.
+
+        """
+        if self.latency is None:
+            return math.inf
+        return self.latency + REFERENCE_SIZE / (self.throughput or DEFAULT_THROUGHPUT)
+
+
+def _average(old: float | None, new: float) -> float:
+    return new if old is None else (1 - WEIGHT) * old + WEIGHT * new
+
+
+def root(url: str) -> str:
+    """
+    Return the directory of the URL up to its first parameter, which exists
+    regardless of the parameter values.
+
+    """
+    return url.split("{", 1)[0].rpartition("/")[0] + "/"
+
+
+def probe(url: str) -> float | None:
+    """
+    Return the seconds a cheap request to the host of the URL takes, or None, if
+    the host does not respond or responds with a server error.
+
+    Hosts of other protocols than FTP and HTTP are not probed.
+
+    """
+    parsed = urlparse(url)
+    started = time.monotonic()
+    try:
+        if parsed.scheme == "ftp":
+            with _ftp.get_pool(parsed.netloc).connection() as ftp:
+                ftp.voidcmd("NOOP")
+        elif parsed.scheme in ("http", "https"):
+            response = _http.get_session().head(
+                root(url), allow_redirects=True, timeout=PROBE_TIMEOUT
+            )
+            if response.status_code >= 500:
+                log.info(f"{parsed.netloc} responded {response.status_code} ...")
+                return None
+        else:
+            return 0.0
+    except all_errors + (requests.RequestException,) as e:
+        log.info(f"{parsed.netloc} did not respond ...")
+        log.debug(f"{e}")
+        return None
+    return time.monotonic() - started
+
+
+def rank(source: Source) -> list[Mirror]:
+    """
+    Return the URL and mirrors of the source, the fastest first, and those,
+    whose host is down, last. Otherwise, the given order is kept.
+
+    """
+    cache = get_cache()
+    mirrors = [
+        Mirror(str(url), urlparse(str(url)).netloc)
+        for url in [source.url, *(source.mirrors or [])]
+    ]
+    with ThreadPoolExecutor(
+        max_workers=len(mirrors), thread_name_prefix="probe"
+    ) as executor:
+        latencies = list(executor.map(probe, [mirror.url for mirror in mirrors]))
+
+    for mirror, latency in zip(mirrors, latencies):
+        stored, mirror.throughput = cache.performance(mirror.host)
+        mirror.latency = latency
+        # The history of a host, which is down now, is kept.
+        if latency is not None:
+            stored = _average(stored, latency)
+        cache.store_performance(mirror.host, stored, mirror.throughput)
+
+    ranked = sorted(mirrors, key=lambda mirror: mirror.score)
+    log.debug(f"Mirrors of {source.identifier}: {ranked} ...")
+    return ranked
+
+
+def remember(status: TransferStatus) -> None:
+    """
+    Update the stored throughput of each host downloaded from.
+
+    """
+    cache = get_cache()
+    for host, transferred in status.hosts.items():
+        if not transferred.bytes or transferred.seconds <= 0:
+            continue
+        latency, throughput = cache.performance(host)
+        cache.store_performance(
+            host, latency, _average(throughput, transferred.throughput)
+        )
+
+
+@dataclass
+class Retry(Source):
+    """
+    A source yielding only the pairs with given indices, e.g. those not
+    downloaded from the mirrors tried before.
+
+    """
+
+    indices: frozenset[int] = frozenset()
+
+    def pairs(self) -> Iterator[RemoteLocalPair]:
+        for index, pair in enumerate(super().pairs()):
+            if index in self.indices:
+                yield pair
+
+
+def retry(source: Source, indices: frozenset[int]) -> Retry:
+    """
+    Return given source restricted to the pairs with given indices.
+
+    """
+    values = {f.name: getattr(source, f.name) for f in dataclasses.fields(source)}
+    return Retry(**values, indices=indices)
+
+
+def _done(fname: Path, started: float, max_age: int | float) -> bool:
+    # Transferred or linked during the download, or found current by it
+    entry = get_journal().entry(fname)
+    if entry is None or not fname.is_file():
+        return False
+    return entry.transferred >= started or entry.age() < max_age
+
+
+def unfinished(
+    source: Source,
+    listings: dict[str, list[str]],
+    started: float,
+    indices: frozenset[int] | None = None,
+) -> frozenset[int]:
+    """
+    Return the indices of the pairs of a source, or of those with given indices,
+    whose files were not all downloaded by the download started at given POSIX
+    time, which stored the listings of the remote directories in `listings`.
+
+    """
+    remaining = set()
+    for index, pair in enumerate(source.pairs()):
+        if indices is not None and index not in indices:
+            continue
+
+        if "*" not in pair.fname:
+            fnames = [pair.fname]
+        elif pair.path_remote in listings:
+            fnames = [
+                fname
+                for fname in listings[pair.path_remote]
+                if fnmatch(fname, pair.fname)
+            ]
+        else:
+            fnames = []
+
+        destination = Path(pair.path_local)
+        if not fnames or not all(
+            _done(
+                destination
+                / (_compress.decompressed(fname) if source.decompress else fname),
+                started,
+                source.max_age,
+            )
+            for fname in fnames
+        ):
+            remaining.add(index)
+    return frozenset(remaining)
+
+
+def failover(status: TransferStatus, retried: TransferStatus) -> TransferStatus:
+    """
+    Return the status of a source after trying the paths that failed or were
+    not found again from another mirror.
+
+    The paths done the first time are not tried again, so the files that failed
+    or were not found are counted by the second try, and the rest are summed.
+
+    """
+    merged = TransferStatus(
+        existing=status.existing + retried.existing,
+        success=status.success + retried.success,
+        failed=retried.failed,
+        not_found=retried.not_found,
+        skipped=retried.skipped,
+        linked=status.linked + retried.linked,
+        mismatch=status.mismatch + retried.mismatch,
+        retries=status.retries + retried.retries,
+        bytes=status.bytes + retried.bytes,
+        seconds=status.seconds + retried.seconds,
+        exceptions=retried.exceptions,
+    )
+    for host, transferred in [*status.hosts.items(), *retried.hosts.items()]:
+        merged.hosts.setdefault(host, type(transferred)())
+        merged.hosts[host] += transferred
+    return merged
+
+
+def download(
+    source: Source,
+    protocols: dict[str, ModuleType],
+    *,
+    listings: dict[str, list[str]] | None = None,
+) -> TransferStatus:
+    """
+    Download a source from the fastest of its URL and mirrors, and try the paths
+    that could not be downloaded again from the next, until all are downloaded.
+
+    The `listings` of remote directories are only used for the first URL, since
+    another URL lists other directories.
+
+    """
+    status: TransferStatus | None = None
+    # Indices of the pairs still to download, once a mirror was tried
+    indices: frozenset[int] | None = None
+    for mirror in rank(source):
+        source_ = dataclasses.replace(source, url=mirror.url, mirrors=None)
+        if source_.protocol not in protocols:
+            log.warning(f"Protocol of mirror {mirror.url} is not supported ...")
+            continue
+
+        if status is not None:
+            log.info(f"Trying {source.identifier} from {mirror.host} ...")
+        listed = listings if listings is not None and status is None else {}
+        started = time.time()
+        result = protocols[source_.protocol].download(
+            source_ if indices is None else retry(source_, indices), listings=listed
+        )
+        remember(result)
+        status = result if status is None else failover(status, result)
+        indices = unfinished(source_, listed, started, indices)
+
+        if not (status.failed or status.not_found) or not indices:
+            break
+        log.info(
+            f"{status.failed + status.not_found} files of {source.identifier} "
+            f"could not be downloaded from {mirror.host} ..."
+        )
+
+    return status if status is not None else TransferStatus()
@@ -0,0 +1,129 @@
+"""
+Download to partial files that can be resumed
+
+A file is downloaded to a partial file next to the destination file, and it is
+only renamed to the destination filename, when the download is complete. If a
+download is interrupted, the partial file is kept, so that the next download of
+the same file can resume from where the previous one stopped.
+
+A download over HTTP keeps the validator (ETag or Last-Modified) of the remote
+file, whose bytes the partial file holds, in a file next to it, so that bytes of
+an older version of the remote file are not resumed with those of a newer one.
+
+"""
+
+import os
+from pathlib import Path
+from typing import Final
+import logging
+
+log = logging.getLogger(__name__)
+
+SUFFIX: Final = ".part"
+"Suffix added to the destination filename for the partial file"
+
+VALIDATOR_SUFFIX: Final = ".validator"
+"Suffix added to the partial filename for the validator of the remote file"
+
+
+def part_of(ofname: Path) -> Path:
+    """
+    Return path to the partial file for given destination file.
+
+    """
+    return ofname.with_name(f"{ofname.name}{SUFFIX}")
+
+
+def validator_of(part: Path) -> Path:
+    """
+    Return path to the file with the validator of given partial file.
+
+    """
+    return part.with_name(f"{part.name}{VALIDATOR_SUFFIX}")
+
+
+def store_validator(part: Path, validator: str | None) -> None:
+    """
+    Keep the validator of the remote file downloaded to given partial file, or
+    forget it, if the remote file has none.
+
+    """
+    fname = validator_of(part)
+    if validator is None:
+        fname.unlink(missing_ok=True)
+    else:
+        fname.write_text(validator)
+
+
+def stored_validator(part: Path) -> str | None:
+    """
+    Return the validator of the remote file downloaded to given partial file, or
+    None, if it is not known.
+
+    """
+    try:
+        return validator_of(part).read_text() or None
+    except OSError:
+        return None
+
+
+def _discard(part: Path) -> None:
+    part.unlink(missing_ok=True)
+    validator_of(part).unlink(missing_ok=True)
+
+
+def offset(part: Path, *, size: int | None = None, mtime: float | None = None) -> int:
+    """
+    Return the number of bytes already downloaded to the partial file.
+
+    The partial file is discarded, if it can not be resumed, i.e. if it is
+    larger than the remote file or older than the remote modification time,
+    when these are known.
+
+    """
+    if not part.is_file():
+        return 0
+    stat = part.stat()
+    if size is not None and stat.st_size > size:
+        log.info(f"Partial file {part.name} is larger than the remote file ...")
+        _discard(part)
+        return 0
+    if mtime is not None and stat.st_mtime < mtime:
+        log.info(f"Remote file changed since {part.name} was started ...")
+        _discard(part)
+        return 0
+    if stat.st_size:
+        log.info(f"Resuming {part.name} from byte {stat.st_size} ...")
+    return stat.st_size
+
+
+def complete(part: Path, ofname: Path, *, size: int | None = None) -> bool:
+    """
+    Rename partial file to the destination filename, if its size matches the
+    remote size, when this is known.
+
+    A partial file larger than the remote file is deleted, while a smaller one
+    is kept to be resumed.
+
+    """
+    actual = part.stat().st_size
+    if size is not None and actual != size:
+        log.warning(
+            f"Size of {part.name} ({actual} B) does not match remote size ({size} B) ..."
+        )
+        if actual > size:
+            _discard(part)
+        return False
+    os.replace(part, ofname)
+    validator_of(part).unlink(missing_ok=True)
+    return True
+
+
+def discard_empty(part: Path) -> None:
+    """
+    Delete partial file, if nothing was downloaded to it.
+
+    """
+    if part.is_file() and not part.stat().st_size:
+        log.info(f"Deleting empty {part} ...")
+        _discard(part)
@@ -0,0 +1,82 @@
+"""
+Report progress and throughput of file transfers
+
+"""
+
+import time
+import logging
+
+import humanize
+
+log = logging.getLogger(__name__)
+
+
+class Progress:
+    """
+    Count the bytes of a transfer as they are written, and, if asked to, log
+    the progress at given intervals in seconds.
+
+    Call the instance with each chunk of data written. For a resumed transfer,
+    `offset` is the number of bytes already transferred before.
+
+    """
+
+    def __init__(
+        self,
+        name: str,
+        total: int | None = None,
+        *,
+        offset: int = 0,
+        report: bool = False,
+        interval: float = 10.0,
+    ) -> None:
+        self.name = name
+        self.total = total
+        self.offset = offset
+        self.report = report
+        self.interval = interval
+        self.bytes: int = 0
+        self._start = time.monotonic()
+        self._last = self._start
+
+    def __call__(self, chunk: bytes) -> None:
+        self.bytes += len(chunk)
+        if not self.report:
+            return
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        log.info(f"{self.name}: {self._done()} at {self._rate()} ...")
+
+    @property
+    def seconds(self) -> float:
+        return time.monotonic() - self._start
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second
+
+        """
+        seconds = self.seconds
+        return self.bytes / seconds if seconds > 0 else 0.0
+
+    def _done(self) -> str:
+        done = humanize.naturalsize(self.offset + self.bytes, binary=True)
+        if not self.total:
+            return done
+        total = humanize.naturalsize(self.total, binary=True)
+        return f"{(self.offset + self.bytes) / self.total:.0%} ({done} of {total})"
+
+    def _rate(self) -> str:
+        return f"{humanize.naturalsize(self.throughput, binary=True)}/s"
+
+    def finish(self) -> None:
+        message = (
+            f"{self.name}: {self._done()} in {self.seconds:.1f} s at {self._rate()}"
+        )
+        if self.report:
+            log.info(message)
+        else:
+            log.debug(message)
@@ -0,0 +1,258 @@
+"""
+Mirror files with rsync
+
+Built-in command-line tool rsync is assumed to exist.
+
+Sources with an `rsync://` URL are transferred from an rsync daemon, and sources
+with an `rsync+ssh://` URL are transferred over SSH, i.e. `host:/path` in the
+syntax of rsync. Only the changed parts of changed files are transferred.
+
+"""
+
+import re
+import time
+import subprocess as sub
+from typing import Final
+from dataclasses import (
+    dataclass,
+    field,
+)
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from pathlib import Path
+import logging
+
+from ab.data import (
+    HostStatus,
+    TransferStatus,
+    Pending,
+    limits,
+    pairs_to_try,
+)
+from ab.data.source import (
+    Source,
+    RemoteLocalPair,
+)
+from ab.data.cache import get_cache
+from ab.data.journal import get_journal
+
+log = logging.getLogger(__name__)
+
+
+OPTIONS: Final = [
+    "--recursive",
+    "--links",
+    "--times",
+    "--stats",
+    "--out-format=%i %n",
+]
+"Options for mirroring files with their modification times"
+
+BATCH_SIZE: Final = 500
+"Maximum number of remote paths transferred with a single rsync command"
+
+PARTIAL: Final = 23
+"Return code of rsync, when some files could not be transferred"
+
+VANISHED: Final = 24
+"Return code of rsync, when some source files vanished during the transfer"
+
+_STATISTIC: Final = re.compile(r"^(?P<name>[A-Z][A-Za-z ]+): (?P<value>[\d,.]+)")
+_NOT_FOUND: Final = re.compile(r'link_stat "(?P<path>.+)" .*failed: No such file')
+
+
+@dataclass
+class Statistics:
+    """
+    Summary of an rsync transfer as given with `--stats`, and the files received.
+
+    """
+
+    files: int = 0
+    transferred: int = 0
+    received: int = 0
+    received_files: list[str] = field(default_factory=list)
+
+    @classmethod
+    def parse(cls, output: str) -> "Statistics":
+        """
+        Parse the output of rsync with `OPTIONS`.
+
+        The number of regular files is used, if given, as in rsync 3.1 and
+        later. Older versions count directories as files.
+
+        """
+        statistics = cls()
+        for line in output.splitlines():
+            # Itemised changes: received regular files start with `>f`.
+            if line.startswith(">f"):
+                _, _, name = line.partition(" ")
+                statistics.received_files.append(name)
+                continue
+
+            match = _STATISTIC.match(line)
+            if match is None:
+                continue
+            value = int(float(match["value"].replace(",", "")))
+            name = match["name"]
+            if name == "Number of files":
+                regular = re.search(r"reg: ([\d,]+)", line)
+                statistics.files = (
+                    int(regular[1].replace(",", "")) if regular else value
+                )
+            elif name == "Number of regular files transferred":
+                statistics.transferred = value
+            elif name == "Total bytes received":
+                statistics.received = value
+        return statistics
+
+
+def _target(uri: str) -> tuple[str, list[str]]:
+    """
+    Return the remote path as given to rsync and any options needed for it.
+
+    """
+    parsed = urlparse(uri)
+    if parsed.scheme == "rsync":
+        return uri, []
+
+    # Remote shell, e.g. `rsync+ssh://user@host:2222/path`
+    host = parsed.hostname or ""
+    if parsed.username:
+        host = f"{parsed.username}@{host}"
+    options = ["--rsh", f"ssh -p {parsed.port}"] if parsed.port else []
+    return f"{host}:{parsed.path}", options
+
+
+def _base(uri: str) -> str:
+    """
+    Return the remote directory, which rsync names files received from given URI
+    relative to, i.e. the directory of a remote path, or a remote directory
+    given with a trailing slash.
+
+    """
+    return uri.rstrip("/") if uri.endswith("/") else uri.rpartition("/")[0]
+
+
+def transfer(
+    host: str, pairs: list[RemoteLocalPair], destination: Path
+) -> TransferStatus:
+    """
+    Transfer the remote paths of given pairs to the destination directory with
+    one rsync command.
+
+    The remote paths must be in the same remote directory, as given by `_base`,
+    so that the received files can be recorded with their URIs.
+
+    """
+    status = TransferStatus()
+    targets = [_target(pair.uri) for pair in pairs]
+    paths = [path for (path, _) in targets]
+    options = targets[0][1]
+
+    command = ["rsync", *OPTIONS, *options, *paths, f"{destination}/"]
+    log.info(f"Rsync {len(paths)} paths from {host} to {destination} ...")
+    started = time.monotonic()
+    try:
+        with limits.slot(host):
+            result = sub.run(command, text=True, capture_output=True)
+    except OSError as e:
+        log.warning("Could not run rsync ...")
+        return TransferStatus(failed=len(pairs), exceptions=[e])
+    seconds = time.monotonic() - started
+
+    statistics = Statistics.parse(result.stdout)
+
+    if result.returncode not in (0, PARTIAL, VANISHED):
+        error = sub.CalledProcessError(
+            result.returncode, command, result.stdout, result.stderr
+        )
+        log.warning(f"Rsync failed with error {error}: {result.stderr.strip()}")
+        status.failed += len(pairs)
+        status.exceptions.append(error)
+
+    elif result.returncode == PARTIAL:
+        missing = _NOT_FOUND.findall(result.stderr)
+        for pair in pairs:
+            if any(path.endswith(pair.fname) for path in missing):
+                log.info(f"Found no files matching {pair.uri} ...")
+                get_cache().store_miss(pair.uri)
+                status.not_found += 1
+        if not missing:
+            log.warning(f"Rsync could not transfer all files: {result.stderr.strip()}")
+            status.failed += 1
+            status.exceptions.append(
+                sub.CalledProcessError(result.returncode, command, stderr=result.stderr)
+            )
+
+    status.success += statistics.transferred
+    status.existing += statistics.files - statistics.transferred
+    status.bytes += statistics.received
+    status.seconds += seconds
+    status.hosts[host] = HostStatus(
+        statistics.transferred, statistics.received, seconds
+    )
+
+    base = _base(pairs[0].uri)
+    journal = get_journal()
+    for name in statistics.received_files:
+        ofname = destination / name
+        try:
+            stat = ofname.stat()
+        except OSError:
+            continue
+        journal.record(
+            f"{base}/{name}",
+            ofname,
+            size=stat.st_size,
+            remote_mtime=stat.st_mtime,
+        )
+    return status
+
+
+def download(
+    source: Source, *, listings: dict[str, list[str]] | None = None
+) -> TransferStatus:
+    """
+    Mirror paths resolved from a Source instance with rsync.
+
+    *   Remote paths in the same remote directory and with the same destination
+        are transferred with one rsync command, in batches of up to `BATCH_SIZE` paths, and `source.workers`
+        commands run at the same time.
+
+    *   Filenames may contain wildcards, which are matched by rsync. A URL of a
+        directory ending with a slash, and no filenames, mirrors the contents
+        of the directory recursively.
+
+    *   Files are compared with the remote files by rsync, so `source.max_age`
+        and `source.sync` are not used, and only the differences of changed
+        files are transferred.
+
+    rsync lists the remote directories itself, so `listings` is not used.
+
+    """
+    status = TransferStatus()
+    executor = ThreadPoolExecutor(
+        max_workers=source.workers, thread_name_prefix=f"rsync-{source.host}"
+    )
+    # Pairs by their destination and remote directory
+    batches: dict[tuple[str, str], list[RemoteLocalPair]] = {}
+
+    def submit(key: tuple[str, str]) -> None:
+        destination = Path(key[0])
+        destination.mkdir(parents=True, exist_ok=True)
+        pending.submit(transfer, source.host, batches.pop(key), destination)
+
+    with Pending(executor, limit=2 * source.workers, name="rsync transfers") as pending:
+        for pair in pairs_to_try(source, status):
+            key = (pair.path_local, _base(pair.uri))
+            batches.setdefault(key, []).append(pair)
+            if len(batches[key]) >= BATCH_SIZE:
+                submit(key)
+
+        for key in list(batches):
+            submit(key)
+
+        status += pending.result()
+
+    return status
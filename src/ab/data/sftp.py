@@ -5,13 +5,33 @@ Built-in command-line too sftp is assumed to exist.
 
 """
 
-from typing import Final
-from collections.abc import Iterable
+import os
+import time
+import heapq
+import tempfile
+import threading
+from fnmatch import fnmatch
+from urllib.parse import urlparse
+from typing import (
+    IO,
+    Final,
+)
+from collections.abc import (
+    Callable,
+    Iterable,
+    Iterator,
+)
+from contextlib import (
+    contextmanager,
+    suppress,
+)
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import (
     dataclass,
     asdict,
 )
 import itertools as it
+import datetime as dt
 from pathlib import Path
 import subprocess as sub  # type: ignore
 import logging
@@ -20,7 +40,23 @@ from ab.paths import (
     resolve_wildcards,
     _parents,
 )
-from ab.data import TransferStatus
+from ab.data import (
+    TransferStatus,
+    pairs_to_try,
+    unlisted,
+    limits,
+)
+from ab.data import compress as _compress
+from ab.data import file as _file
+from ab.data import stats
+from ab.data.source import Source
+from ab.data.cache import get_cache
+from ab.data.claims import get_claims
+from ab.data.partial import part_of
+from ab.data.journal import (
+    get_journal,
+    is_current,
+)
 
 log = logging.getLogger(__name__)
 
@@ -30,8 +66,17 @@ type LocalRemoteType = dict[str, Path | str]
 MKDIR: Final = "-mkdir {remote_dir}"
 "SFTP-command structure for making a directory with a prefixed hyphen to suppress errors."
 
-PUT: Final = "put {fname} {remote_dir}"
-"SFTP-command structure for transfering a file to a remote directory"
+PUT: Final = "-put {fname} {remote_dir}"
+"SFTP-command structure for transfering a file to a remote directory with a prefixed hyphen to continue with the next file, if it fails."
+
+LIST: Final = "-ls -ln {remote_dir}"
+"SFTP-command structure for listing a remote directory with sizes in bytes"
+
+GET: Final = "-get -p {remote} {local}"
+"SFTP-command structure for fetching a file, preserving its modification time, with a prefixed hyphen to continue with the next file, if it fails."
+
+PROMPT: Final = "sftp> "
+"Prefix of each command, when echoed by sftp in batch mode"
 
 
 @dataclass
@@ -61,6 +106,99 @@ class LocalRemote:
         ]
 
 
+@dataclass
+class RemoteStat:
+    """
+    Size and modification time of a remote file as listed by `ls -ln`.
+
+    The listing gives the modification time in local time to the minute, or,
+    for files older than half a year, only the date.
+
+    """
+
+    size: int
+    mtime: dt.datetime
+    exact: bool = True
+
+    @classmethod
+    def parse(cls, line: str, now: dt.datetime) -> tuple[str, "RemoteStat"] | None:
+        """
+        Return filename and details of a regular file in a line of the listing,
+        or None, if the line is not for a regular file.
+
+        """
+        parts = line.split(maxsplit=8)
+        if len(parts) < 9 or not parts[0].startswith("-"):
+            return None
+
+        size, month, day, time_or_year, name = parts[4:]
+        try:
+            if ":" in time_or_year:
+                mtime = dt.datetime.strptime(
+                    f"{now.year} {month} {day} {time_or_year}", "%Y %b %d %H:%M"
+                )
+                # Files shown with a time were modified within the last year.
+                if mtime > now:
+                    mtime = mtime.replace(year=now.year - 1)
+                return Path(name).name, cls(int(size), mtime)
+
+            mtime = dt.datetime.strptime(f"{time_or_year} {month} {day}", "%Y %b %d")
+            return Path(name).name, cls(int(size), mtime, exact=False)
+
+        except ValueError:
+            log.debug(f"Could not parse remote file details {line!r} ...")
+            return None
+
+    def older_than(self, fname: Path) -> bool:
+        """
+        Return True, if given local file differs in size or is newer than the
+        remote file, to the precision of the listing.
+
+        """
+        stat = fname.stat()
+        if stat.st_size != self.size:
+            return True
+
+        mtime = dt.datetime.fromtimestamp(stat.st_mtime)
+        if self.exact:
+            return mtime.replace(second=0, microsecond=0) > self.mtime
+        return mtime.date() > self.mtime.date()
+
+
+def parse_listings(
+    output: str, remote_dirs: Iterable[str], now: dt.datetime | None = None
+) -> dict[str, dict[str, RemoteStat]]:
+    """
+    Return the remote files by filename in each of given remote directories,
+    read from the output of a batch of `LIST` commands.
+
+    """
+    now = now or dt.datetime.now()
+    commands = {
+        f"{PROMPT}{LIST.format(remote_dir=remote_dir)}": remote_dir
+        for remote_dir in remote_dirs
+    }
+    listings: dict[str, dict[str, RemoteStat]] = {
+        remote_dir: {} for remote_dir in commands.values()
+    }
+
+    current: str | None = None
+    for line in output.splitlines():
+        if line.startswith(PROMPT):
+            current = commands.get(line.strip())
+            continue
+
+        if current is None:
+            continue
+
+        parsed = RemoteStat.parse(line, now)
+        if parsed is not None:
+            fname, remote = parsed
+            listings[current][fname] = remote
+
+    return listings
+
+
 def _mkdir_commands(paths: Iterable[str]) -> list[str]:
     """
     Return list of commands to create each full path, part by part.
@@ -73,32 +211,212 @@ def _mkdir_commands(paths: Iterable[str]) -> list[str]:
     ]
 
 
-def update_status(
-    status: TransferStatus, result: sub.CompletedProcess
-) -> TransferStatus:
+TRANSFERS: Final = ("put", "get")
+"SFTP commands transferring a file"
+
+
+class BatchOutput:
     """
-    Assuming that each line is a successful transfer message, when the return
-    code is zero.
+    Follow the output of a batch of transfer commands, file by file.
+
+    In batch mode, sftp echoes each command before running it, and prints any
+    error after it. A file is transferred, if no error follows its command, and
+    the batch went on with the next command or finished successfully.
 
-    NOTE: This is not accounting for any failures.
+    The result of each transfer is kept by the first path in its command.
 
     """
-    if result.returncode == 0:
-        status.success += len(result.stdout.splitlines())
-    return status
 
+    def __init__(self) -> None:
+        self.status = TransferStatus()
+        self.results: dict[str, bool] = {}
+        self._current: str | None = None
+        self._errors: list[str] = []
+
+    def _done(self, success: bool) -> None:
+        if self._current is None:
+            return
+        success = success and not self._errors
+        if success:
+            log.debug(f"Transferred {self._current} ...")
+            self.status.success += 1
+        else:
+            log.warning(f"Could not transfer {self._current}: {' '.join(self._errors)}")
+            self.status.failed += 1
+        self.results[self._current] = success
+        self._current = None
+        self._errors = []
+
+    def feed(self, line: str) -> None:
+        line = line.rstrip("\n")
+        if line.startswith(PROMPT):
+            self._done(True)
+            command, *args = line.removeprefix(PROMPT).lstrip("-").split()
+            paths = [arg for arg in args if not arg.startswith("-")]
+            if command in TRANSFERS and paths:
+                self._current = paths[0]
+            return
+
+        if self._current is not None and not line.startswith(
+            ("Uploading ", "Fetching ")
+        ):
+            self._errors.append(line.strip())
+
+    def close(self, returncode: int, count: int) -> TransferStatus:
+        """
+        Return the status of given number of files in the batch, counting files
+        not reached as failed.
+
+        """
+        self._done(returncode == 0)
+        self.status.failed += count - self.status.success - self.status.failed
+        return self.status
+
+
+def _sftp(host: str, options: list[str] | None = None) -> list[str]:
+    return ["sftp", *(options or []), "-b", "-", host]
+
+
+def _batch(
+    host: str, commands: str, options: list[str] | None = None
+) -> sub.CompletedProcess:
+    with limits.slot(host):
+        return sub.run(
+            _sftp(host, options),
+            input=commands,
+            text=True,
+            check=True,
+            capture_output=True,
+        )
+
+
+def _write(stdin: IO[str], commands: list[str]) -> None:
+    # An sftp process stopping early closes its end of the pipe, and its exit
+    # status tells what went wrong.
+    with suppress(BrokenPipeError):
+        try:
+            stdin.write("\n".join(commands) + "\n")
+        finally:
+            stdin.close()
+
+
+def _transfer(
+    host: str, commands: list[str], count: int, options: list[str] | None = None
+) -> BatchOutput:
+    """
+    Run a batch of commands including given number of transfers, and count
+    each transfer, as its output arrives.
 
-def _batch(host: str, commands: str) -> sub.CompletedProcess:
-    return sub.run(
-        ["sftp", "-b", "-", host],
-        input=commands,
-        text=True,
-        check=True,
-        capture_output=True,
-    )
+    The commands are written from another thread, while the output is read, so
+    that neither sftp nor this process waits for the other to empty a full pipe
+    in a large batch.
+
+    Each batch runs in its own sftp session, which takes a transfer slot for
+    the host.
+
+    """
+    output = BatchOutput()
+    with (
+        limits.slot(host),
+        sub.Popen(
+            _sftp(host, options),
+            stdin=sub.PIPE,
+            stdout=sub.PIPE,
+            stderr=sub.STDOUT,
+            text=True,
+        ) as process,
+    ):
+        assert process.stdin is not None and process.stdout is not None
+        writer = threading.Thread(
+            target=_write,
+            args=(process.stdin, commands),
+            name=f"sftp-{host}-commands",
+        )
+        writer.start()
+        for line in process.stdout:
+            output.feed(line)
+        writer.join()
+
+    status = output.close(process.returncode, count)
+    if process.returncode != 0:
+        e = sub.CalledProcessError(process.returncode, process.args)
+        log.warning(f"Subprocess failed with error {e}")
+        status.exceptions.append(e)
+    return output
+
+
+def _partition_by[T](items: list[T], n: int, size: Callable[[T], int]) -> list[list[T]]:
+    """
+    Distribute items on at most `n` sessions, largest first, each to the
+    session with the fewest bytes to transfer so far.
+
+    """
+    if n < 2:
+        return [items] if items else []
+
+    sessions: list[tuple[int, int]] = [(0, ix) for ix in range(n)]
+    partitions: list[list[T]] = [[] for _ in range(n)]
+    for item, nbytes in sorted(
+        ((item, size(item)) for item in items), key=lambda pair: pair[1], reverse=True
+    ):
+        total, ix = heapq.heappop(sessions)
+        partitions[ix].append(item)
+        heapq.heappush(sessions, (total + nbytes, ix))
+    return [partition for partition in partitions if partition]
+
+
+def _local_size(lr: LocalRemote) -> int:
+    try:
+        return os.path.getsize(lr.fname)  # type: ignore
+    except OSError:
+        return 0
 
 
-def upload(host: str, pairs: list[LocalRemoteType]) -> TransferStatus:
+@contextmanager
+def _control_master(
+    host: str, sessions: int, options: list[str] | None = None
+) -> Iterator[list[str]]:
+    """
+    Yield the SSH options for sftp processes to share one connection to the
+    host, when more than one session is used.
+
+    If the shared connection can not be opened, each session connects on its
+    own.
+
+    """
+    options = options or []
+    if sessions < 2:
+        yield options
+        return
+
+    with tempfile.TemporaryDirectory(prefix="ab-sftp-") as directory:
+        control = [*options, "-o", f"ControlPath={directory}/master"]
+        master = sub.run(
+            ["ssh", "-f", "-N", "-o", "ControlMaster=yes", *control, host],
+            stdin=sub.DEVNULL,
+            stdout=sub.DEVNULL,
+            stderr=sub.DEVNULL,
+        )
+        if master.returncode != 0:
+            log.info(f"Could not open shared connection to {host} ...")
+        try:
+            yield [*control, "-o", "ControlMaster=no"]
+        finally:
+            if master.returncode == 0:
+                sub.run(
+                    ["ssh", *control, "-O", "exit", host],
+                    stdin=sub.DEVNULL,
+                    stdout=sub.DEVNULL,
+                    stderr=sub.DEVNULL,
+                )
+
+
+def upload(
+    host: str,
+    pairs: list[LocalRemoteType],
+    incremental: bool = False,
+    sessions: int = 1,
+) -> TransferStatus:
     """
     Using settings provided, upload pairs of local file/remote destination
     directory.
@@ -114,6 +432,15 @@ def upload(host: str, pairs: list[LocalRemoteType]) -> TransferStatus:
     ambiguous for files with wildcards, and, presumably, redundant, if concrete
     files are to be put into more than one destination directory.
 
+    If `incremental` is True, the remote directories are created and listed in
+    one batch, and only files that are not in the remote directory, or whose
+    size differs or that are newer than the remote file, are uploaded. The rest
+    are counted as existing.
+
+    The files are uploaded in the given number of sftp `sessions` at the same
+    time, sharing one SSH connection, if more than one. A file that can not be
+    uploaded is counted as failed, and the others are still uploaded.
+
     """
     log.info(f"Uploading files to {host} using SFTP ...")
 
@@ -136,24 +463,260 @@ def upload(host: str, pairs: list[LocalRemoteType]) -> TransferStatus:
     resolved = list(it.chain(*resolvable))
 
     log.info(f"Prepare commands to build remote directory tree ...")
-    remote_dirs = [str(lr.remote_dir) for lr in resolved]
-    cmd_mkdir = "\n".join(_mkdir_commands(remote_dirs))
+    remote_dirs = sorted({str(lr.remote_dir) for lr in resolved})
+    cmd_mkdir = _mkdir_commands(remote_dirs)
+
+    with _control_master(host, sessions) as options:
+        try:
+            if incremental or (sessions > 1 and resolved):
+                log.info(f"Batch-create and list remote directories on {host} ...")
+                cmd_list = (
+                    [LIST.format(remote_dir=remote_dir) for remote_dir in remote_dirs]
+                    if incremental
+                    else []
+                )
+                result = _batch(host, "\n".join(cmd_mkdir + cmd_list), options)
+                # The directories exist now.
+                cmd_mkdir = []
+
+            if incremental:
+                listings = parse_listings(result.stdout, remote_dirs)
+                changed = []
+                for lr in resolved:
+                    fname = Path(lr.fname)  # type: ignore
+                    remote = listings[str(lr.remote_dir)].get(fname.name)
+                    if remote is None or remote.older_than(fname):
+                        changed.append(lr)
+                status.existing += len(resolved) - len(changed)
+                log.info(f"Skip {status.existing} files already on {host} ...")
+                resolved = changed
+
+        except sub.CalledProcessError as e:
+            log.warn(f"Subprocess failed with error {e}")
+            status.exceptions.append(e)
+            status.failed += len(resolved)
+            resolved = []
+
+        partitions = _partition_by(resolved, sessions, _local_size)
+        log.info(
+            f"Batch-transfer {len(resolved)} local files to {host} "
+            f"in {len(partitions)} sessions ..."
+        )
+        with ThreadPoolExecutor(
+            max_workers=max(len(partitions), 1), thread_name_prefix=f"sftp-{host}"
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _transfer,
+                    host,
+                    cmd_mkdir + [PUT.format(**asdict(lr)) for lr in partition],
+                    len(partition),
+                    options,
+                )
+                for partition in partitions
+            ]
+            for future in futures:
+                status += future.result().status
+
+    log.info(status)
+    return status
+
 
-    log.info("Prepare commands to transfer local files to remote directories ...")
-    cmd_put = "\n".join(PUT.format(**asdict(lr)) for lr in resolved)
+@dataclass
+class _Get:
+    uri: str
+    remote: str
+    ofname: Path
+    size: int
+
+    @property
+    def part(self) -> Path:
+        # Compressed files are fetched next to, and under the name of, the
+        # remote file, before they are decompressed.
+        return part_of(self.ofname.with_name(Path(self.remote).name))
+
+
+def _target(source: Source) -> tuple[str, list[str]]:
+    """
+    Return host argument and SSH options for the host in the URL of the source.
+
+    """
+    parsed = urlparse(source.url_)
+    host = parsed.hostname or source.host
+    if parsed.username:
+        host = f"{parsed.username}@{host}"
+    options = ["-o", f"Port={parsed.port}"] if parsed.port else []
+    return host, options
+
+
+def _finish(get: _Get, decompress: bool) -> TransferStatus:
+    """
+    Give a fetched file its final name, decompressing it, if needed, and record
+    it in the journal.
 
+    """
+    unpack = _compress.decompressor(Path(get.remote)) if decompress else None
     try:
-        log.info(f"Batch-create directories on {host} ...")
-        result = _batch(host, cmd_mkdir)
-        status = update_status(status, result)
+        if unpack is None:
+            os.replace(get.part, get.ofname)
+        else:
+            log.info(f"Decompress {get.remote} to {get.ofname} ...")
+            _file.decompress(get.part, get.ofname, unpack)
+            get.part.unlink()
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not save {get.uri} as {get.ofname} ...")
+        get.part.unlink(missing_ok=True)
+        return TransferStatus(failed=1, exceptions=[e])
+
+    stat = get.ofname.stat()
+    get_journal().record(
+        get.uri, get.ofname, size=stat.st_size, remote_mtime=stat.st_mtime
+    )
+    return TransferStatus(success=1)
 
-        log.info(f"Batch-transfer local files to {host} ...")
-        result = _batch(host, cmd_put)
-        status = update_status(status, result)
 
-    except sub.CalledProcessError as e:
-        log.warn(f"Subprocess failed with error {e}")
-        status.exceptions.append(e)
+def _fetch(
+    host: str, gets: list[_Get], options: list[str], *, decompress: bool
+) -> TransferStatus:
+    """
+    Fetch files in one batch and hand each of them over to the destinations that
+    claimed the same remote file in the meantime.
+
+    """
+    started = time.monotonic()
+    commands = [GET.format(remote=get.remote, local=get.part) for get in gets]
+    output = _transfer(host, commands, len(gets), options)
+    seconds = time.monotonic() - started
+    total = sum(get.size for get in gets) or 1
+
+    status = TransferStatus(exceptions=output.status.exceptions)
+    claims = get_claims()
+    for get in gets:
+        if output.results.get(get.remote, False):
+            result = _finish(get, decompress)
+            if result.success:
+                result.transferred(host, get.size, seconds * get.size / total)
+        else:
+            get.part.unlink(missing_ok=True)
+            result = TransferStatus(failed=1)
+        status += claims.run(get.uri, get.ofname, lambda: result)
+    return status
+
+
+def download(
+    source: Source, *, listings: dict[str, list[str]] | None = None
+) -> TransferStatus:
+    """
+    Download paths resolved from a Source instance over SFTP.
+
+    The host in the source URL is given to `sftp` as it is, so it may be a
+    `Host` in the running user's SSH config file, which must provide the
+    details and credentials needed for non-interactive authentication.
+
+    *   All remote directories of the source are listed in one batch, and
+        filenames with wildcards are matched against the listings. Files not in
+        the listings are not found.
+
+    *   If `source.sync` is set, files are compared with the size of the remote
+        file instead of using `source.max_age`. The listings do not give the
+        modification time to the second.
+
+    *   The files to download are fetched in batches of `get` commands in
+        `source.workers` sftp sessions, sharing one SSH connection, if more
+        than one.
+
+    *   If `listings` is given, the listing of each remote directory is stored
+        in it, and files in a directory listed there already are counted as
+        existing, so that only files that appeared since are downloaded.
+
+    """
+    status = TransferStatus()
+    cache = get_cache()
+    claims = get_claims()
+    previous = dict(listings) if listings is not None else {}
+    host, options = _target(source)
+
+    pairs = list(pairs_to_try(source, status))
+
+    remote_dirs = sorted({pair.path_remote for pair in pairs})
+    if not remote_dirs:
+        return status
+
+    with _control_master(host, source.workers, options) as options:
+        log.info(f"Batch-list {len(remote_dirs)} remote directories on {host} ...")
+        try:
+            cmd_list = [
+                LIST.format(remote_dir=remote_dir) for remote_dir in remote_dirs
+            ]
+            result = _batch(host, "\n".join(cmd_list), options)
+        except sub.CalledProcessError as e:
+            log.warning(f"Could not list remote directories on {host} ...")
+            status.failed += len(pairs)
+            status.exceptions.append(e)
+            return status
+        remote_files = parse_listings(result.stdout, remote_dirs)
+
+        gets: list[_Get] = []
+        for pair in pairs:
+            listing = remote_files[pair.path_remote]
+            if listings is not None:
+                listings[pair.path_remote] = sorted(listing)
+
+            candidates = [fname for fname in listing if fnmatch(fname, pair.fname)]
+            if not candidates:
+                log.info(f"Found no files matching {pair.path_remote}/{pair.fname} ...")
+                cache.store_miss(pair.uri)
+                status.not_found += 1
+                continue
+
+            candidates = unlisted(previous, pair, candidates, status)
+
+            destination = Path(pair.path_local)
+            destination.mkdir(parents=True, exist_ok=True)
+            for fname in candidates:
+                ofname = destination / (
+                    _compress.decompressed(fname) if source.decompress else fname
+                )
+                remote = f"{pair.path_remote.rstrip('/')}/{fname}"
+                uri = f"{source.protocol}://{source.host}{remote}"
+
+                size = listing[fname].size
+                known = stats.comparable(
+                    stats.RemoteStat(size=size), decompressed=ofname.name != fname
+                )
+                if is_current(
+                    uri,
+                    ofname,
+                    max_age=source.max_age,
+                    remote=known if source.sync else None,
+                ):
+                    log.debug(f"{ofname.name} already downloaded ...")
+                    status.existing += 1
+                    continue
+
+                # Fetch each remote file only once per run
+                claimed = claims.claim(uri, ofname)
+                if claimed is not None:
+                    status += claimed
+                    continue
+
+                gets.append(_Get(uri, remote, ofname, size))
+
+        partitions = _partition_by(gets, source.workers, lambda get: get.size)
+        log.info(
+            f"Batch-fetch {len(gets)} files from {host} "
+            f"in {len(partitions)} sessions ..."
+        )
+        with ThreadPoolExecutor(
+            max_workers=max(len(partitions), 1), thread_name_prefix=f"sftp-{host}"
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _fetch, host, partition, options, decompress=source.decompress
+                )
+                for partition in partitions
+            ]
+            for future in futures:
+                status += future.result()
 
-    log.info(status)
     return status
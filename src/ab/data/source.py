@@ -4,8 +4,13 @@ Handle data sources
 """
 
 import os
+import hashlib
 from typing import Any
-from collections.abc import Iterable
+from collections.abc import (
+    Iterable,
+    Iterator,
+    Sized,
+)
 from dataclasses import dataclass
 import math
 from pathlib import Path
@@ -15,7 +20,11 @@ from urllib.parse import (
 )
 import logging
 
-from ab.parameters import permutations
+from ab.parameters import (
+    resolvable,
+    ipermutations,
+    count_permutations,
+)
 
 log = logging.getLogger(__name__)
 
@@ -99,6 +108,9 @@ class Source:
 
         -   If filenames are given, they are added to each resolved path.
 
+        -   Parameters not used in a given URL or the destination are left
+            out, when resolving that URL, so that they do not yield duplicates.
+
     *   Any filenames specified are resolved in the following manner:
 
         -   If there are more paths given a set of parameters, the specified
@@ -157,8 +169,40 @@ class Source:
     filenames: list[str | Path] | None = None
     parameters: dict[str, Iterable[Any]] | None = None
     max_age: int | float = math.inf
+    workers: int = 1
+    listing_ttl: int | float = 0
+    sync: bool = False
+    progress: bool = False
+    retry_interval: int | float = 0
+    checksum: dict[str, Any] | None = None
+    decompress: bool = False
+    poll_interval: int | float = 0
+    hardlink: bool = False
+    segments: int = 1
+    segment_threshold: int = 100 * 1024 * 1024
+    mirrors: list[str | Path] | None = None
 
     def __post_init__(self) -> None:
+        if self.workers < 1:
+            raise ValueError(f"Expected at least one worker. Got {self.workers!r} ...")
+
+        if self.segments < 1:
+            raise ValueError(
+                f"Expected at least one segment. Got {self.segments!r} ..."
+            )
+
+        if self.poll_interval < 0:
+            raise ValueError(
+                f"Expected a non-negative poll interval. Got {self.poll_interval!r} ..."
+            )
+
+        if self.checksum is not None:
+            if "sidecar" not in self.checksum:
+                raise ValueError(f"Expected a sidecar file for checksums ...")
+            algorithm = self.checksum.get("algorithm", "md5")
+            if algorithm not in hashlib.algorithms_available:
+                raise ValueError(f"Unknown checksum algorithm {algorithm!r} ...")
+
         # Path version for path joining
         self.destination = Path(self.destination)
 
@@ -176,26 +220,57 @@ class Source:
             self.protocol = "file"
         self.host = self._parsed.netloc
 
-    def resolve(self) -> list[RemoteLocalPair]:
+        # Parameter values are iterated once per URL and once for counting, so
+        # one-shot iterables are kept as tuples.
+        if self.parameters is not None:
+            self.parameters = {
+                key: values if isinstance(values, Sized) else tuple(values)
+                for (key, values) in self.parameters.items()
+            }
+
+    def _urls(self) -> list[str]:
+        if self.filenames:
+            return [os.path.join(self.url_, filename) for filename in self.filenames]
+        return [self.url_]
+
+    def _resolvable(self, url: str) -> dict[str, Iterable[Any]]:
+        # Parameters not used in the URL or the destination would only yield
+        # duplicate pairs.
+        return resolvable(self.parameters or {}, url + self.destination_)
+
+    def pairs(self) -> Iterator[RemoteLocalPair]:
         """
-        Return all combinations of URL + filename (if any of the latter).
+        Yield all combinations of URL + filename (if any of the latter).
 
         *   URIs are obtained for each filename, if given.
         *   Each URI is then expanded so that all parameter combinations are used.
 
+        Pairs are built one at a time, so that a download can start with the
+        first pair without expanding the full set of parameter permutations.
+
         """
-        if self.filenames:
-            urls = [os.path.join(self.url_, filename) for filename in self.filenames]
-        else:
-            urls = [self.url_]
+        for url in self._urls():
+            if self.parameters is None:
+                yield RemoteLocalPair(url, self.destination_)
+                continue
 
-        if self.parameters is None:
-            return [RemoteLocalPair(url, self.destination_) for url in urls]
+            for permutation in ipermutations(self._resolvable(url)):
+                yield RemoteLocalPair(
+                    url.format(**permutation), self.destination_.format(**permutation)
+                )
 
-        return [
-            RemoteLocalPair(
-                url.format(**permutation), self.destination_.format(**permutation)
-            )
-            for url in urls
-            for permutation in permutations(self.parameters)
-        ]
+    def resolve(self) -> list[RemoteLocalPair]:
+        """
+        Return all combinations of URL + filename (if any of the latter).
+
+        """
+        return list(self.pairs())
+
+    def count(self) -> int:
+        """
+        Return the number of pairs that `pairs` yields without building them.
+
+        """
+        if self.parameters is None:
+            return len(self._urls())
+        return sum(count_permutations(self._resolvable(url)) for url in self._urls())
@@ -7,6 +7,7 @@ import os
 import datetime as dt
 from typing import Any
 from collections.abc import Iterable
+from dataclasses import dataclass
 import math
 from pathlib import Path
 import functools
@@ -44,6 +45,83 @@ def already_updated(fname: Path, *, max_age: int | float = math.inf) -> bool:
     return fname.is_file() and file_age(fname) < max_age
 
 
+@dataclass
+class RemoteStat:
+    """
+    Size in bytes and modification time as POSIX timestamp of a remote file, as
+    far as the remote server tells.
+
+    """
+
+    size: int | None = None
+    mtime: float | None = None
+
+    @property
+    def known(self) -> bool:
+        return self.size is not None or self.mtime is not None
+
+
+def comparable(
+    remote: RemoteStat | None, *, decompressed: bool = False
+) -> RemoteStat | None:
+    """
+    Return what is known about a remote file to compare its local copy with.
+
+    A decompressed file has another size than the remote file, so only the
+    modification time is compared for it.
+
+    """
+    if remote is None or not decompressed:
+        return remote
+    return RemoteStat(mtime=remote.mtime)
+
+
+def already_synchronised(fname: Path, remote: RemoteStat) -> bool:
+    """
+    A file is already synchronised if it exists, and its size and modification
+    time match those known for the remote file.
+
+    Modification times are compared to whole seconds, which is the resolution
+    of most remote servers.
+
+    """
+    if not remote.known or not fname.is_file():
+        return False
+    stat = fname.stat()
+    if remote.size is not None and stat.st_size != remote.size:
+        return False
+    if remote.mtime is not None and abs(stat.st_mtime - remote.mtime) >= 1:
+        return False
+    return True
+
+
+def is_current(
+    fname: Path,
+    *,
+    max_age: int | float = math.inf,
+    remote: RemoteStat | None = None,
+) -> bool:
+    """
+    Compare with remote file, if anything is known about it, otherwise use the
+    age of the local file.
+
+    """
+    if remote is not None and remote.known:
+        return already_synchronised(fname, remote)
+    return already_updated(fname, max_age=max_age)
+
+
+def set_mtime(fname: Path, mtime: float | None) -> None:
+    """
+    Set modification time of local file to that of the remote file, so that
+    they can be compared in the next synchronisation.
+
+    """
+    if mtime is None:
+        return
+    os.utime(fname, (fname.stat().st_atime, mtime))
+
+
 @functools.cache
 def dir_size(start_path: str = ".") -> float:
     """
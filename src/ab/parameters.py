@@ -4,14 +4,29 @@ Resolve parameterised strings
 """
 
 from typing import Any
-from collections.abc import Iterable
+from collections.abc import (
+    Iterable,
+    Iterator,
+    Sized,
+)
 import itertools as it
+import math
 
 type ArgumentsType = dict[str, Any]
 type ParametersType = dict[str, Iterable[Any]]
 type PermutationType = dict[str, Any]
 
 
+def ipermutations(parameters: ParametersType) -> Iterator[PermutationType]:
+    """
+    Lazy version of `permutations`, yielding one permutation at a time.
+
+    """
+    keys = list(parameters.keys())
+    for values in it.product(*parameters.values()):
+        yield dict(zip(keys, values))
+
+
 def permutations(parameters: ParametersType) -> list[PermutationType]:
     """
     Parameter expansion for a mapping with at least one key and a sequence of at
@@ -31,19 +46,22 @@ def permutations(parameters: ParametersType) -> list[PermutationType]:
             {'year': 2021, 'hour': '01'}, {'year': 2022, 'hour': '01'},
         ]
 
-    Limitations:
-    ------------
-    The values must be given in a sequence that can be converted to a tuple,
-    since Python's dict type only takes immutable keys.
+    """
+    return list(ipermutations(parameters))
+
 
+def count_permutations(parameters: ParametersType) -> int:
     """
-    inverted: dict[tuple[Any], str] = {
-        tuple(values): key for (key, values) in parameters.items()
-    }
-    return [
-        {key: value for (key, value) in zip(parameters.keys(), values)}
-        for values in it.product(*inverted.keys())
-    ]
+    Return the number of permutations without expanding them.
+
+    Values that are not sized (e.g. generators) are counted by iterating over
+    them, which consumes them.
+
+    """
+    return math.prod(
+        len(values) if isinstance(values, Sized) else sum(1 for _ in values)
+        for values in parameters.values()
+    )
 
 
 def resolvable(parameters: ParametersType, string_to_format: str) -> ParametersType:
@@ -66,6 +84,12 @@ def resolvable(parameters: ParametersType, string_to_format: str) -> ParametersT
         if f"{{{parameter}}}" in string_to_format
         # Case: 'String with {parameter.property} whatever comes after'
         or f"{{{parameter}." in string_to_format
+        # Case: 'String with {parameter:03d} whatever comes after'
+        or f"{{{parameter}:" in string_to_format
+        # Case: 'String with {parameter[0]} whatever comes after'
+        or f"{{{parameter}[" in string_to_format
+        # Case: 'String with {parameter!r} whatever comes after'
+        or f"{{{parameter}!" in string_to_format
     }
 
 
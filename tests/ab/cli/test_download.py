@@ -0,0 +1,143 @@
+import io
+import csv
+import json
+import threading
+from types import SimpleNamespace
+
+from rich.console import Console
+
+from ab.cli import download as _download
+from ab.data import (
+    TransferStatus,
+    HostStatus,
+)
+from ab.data.source import Source
+from ab.data.claims import get_claims
+
+
+def report_statuses(
+    tmp_path,
+) -> tuple[list[tuple[Source, TransferStatus]], TransferStatus]:
+    source = Source("ORB", "", "ftp://example.com/pub/orbit.txt", tmp_path)
+    hosts = {"example.com": HostStatus(files=2, bytes=2048, seconds=2.0)}
+    status = TransferStatus(existing=1, success=2, bytes=2048, hosts=hosts)
+    total = TransferStatus(existing=1, success=2, bytes=2048, hosts=dict(hosts))
+    return [(source, status)], total
+
+
+def test_write_report_as_json(tmp_path):
+
+    # Arrange
+    statuses, total = report_statuses(tmp_path)
+    fname = tmp_path / "reports" / "download.json"
+
+    # Act
+    _download._write_report(fname, statuses, total)
+
+    # Assert
+    report = json.loads(fname.read_text())
+    assert "finished" in report, f"Expected {report!r} to have a finishing time ..."
+
+    [source] = report["sources"]
+    expected = {
+        "identifier": "ORB",
+        "protocol": "ftp",
+        "host": "example.com",
+        **statuses[0][1].summary(),
+        "hosts": {
+            "example.com": {
+                "files": 2,
+                "bytes": 2048,
+                "seconds": 2.0,
+                "throughput": 1024.0,
+            }
+        },
+    }
+    assert source == expected, f"Expected {source!r} to be {expected!r} ..."
+
+    result = report["total"]
+    expected = {**total.summary(), "hosts": expected["hosts"]}
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_write_report_as_csv(tmp_path):
+
+    # Arrange
+    statuses, total = report_statuses(tmp_path)
+    fname = tmp_path / "reports" / "download.csv"
+
+    # Act
+    _download._write_report(fname, statuses, total)
+
+    # Assert
+    with open(fname, newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    result = [row["scope"] for row in rows]
+    expected = ["source", "host", "total"]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    source, host, total_row = rows
+    assert len({row["finished"] for row in rows}) == 1
+    assert source["identifier"] == "ORB"
+    assert source["protocol"] == "ftp"
+    assert source["success"] == "2"
+    assert source["existing"] == "1"
+    assert source["files"] == ""
+
+    assert host["host"] == "example.com"
+    assert host["files"] == "2"
+    assert host["bytes"] == "2048"
+    assert host["throughput"] == "1024.0"
+    assert host["identifier"] == ""
+
+    assert total_row["success"] == "2"
+    assert total_row["bytes"] == "2048"
+    assert total_row["host"] == ""
+
+
+def test_watch_fetches_file_again_at_a_later_poll(tmp_path, monkeypatch):
+
+    # Arrange
+    ofname = tmp_path / "file.txt"
+    uri = "fake://example.com/pub/file.txt"
+    fetched: list[str] = []
+    polls: list[str] = []
+    # Keeps a source running, while the other is polled again.
+    release = threading.Event()
+
+    def fetch() -> TransferStatus:
+        fetched.append(uri)
+        ofname.write_text("content")
+        return TransferStatus(success=1)
+
+    def download(source, *, listings=None):
+        if source.identifier == "SLOW":
+            release.wait(timeout=10)
+            return TransferStatus()
+
+        polls.append(source.identifier)
+        if len(polls) > 2:
+            raise KeyboardInterrupt
+        if len(polls) == 2:
+            release.set()
+
+        # The file was removed since the previous poll.
+        ofname.unlink(missing_ok=True)
+        claims = get_claims()
+        claimed = claims.claim(uri, ofname)
+        if claimed is not None:
+            return claimed
+        return claims.run(uri, ofname, fetch)
+
+    monkeypatch.setitem(_download.PROTOCOLS, "fake", SimpleNamespace(download=download))
+    sources = [Source(identifier, "", uri, tmp_path) for identifier in ("FAST", "SLOW")]
+    console = Console(file=io.StringIO())
+
+    # Act
+    _download._watch(sources, 0, console)
+
+    # Assert
+    expected = [uri, uri]
+    assert fetched == expected, f"Expected {fetched!r} to be {expected!r} ..."
+    assert ofname.read_text() == "content"
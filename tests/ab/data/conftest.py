@@ -0,0 +1,24 @@
+import threading
+from http.server import (
+    ThreadingHTTPServer,
+    SimpleHTTPRequestHandler,
+)
+from contextlib import contextmanager
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve(handler):
+    # Requests are handled at the same time, as by a real server.
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,117 @@
+from ab.data.cache import Cache
+
+
+def test_listing_is_cached_within_run(tmp_path):
+
+    # Arrange
+    cache = Cache(tmp_path / "cache.sqlite")
+    entries = ["a.txt", "b.txt"]
+
+    # Act
+    before = cache.listing("example.com", "/pub")
+    cache.store_listing("example.com", "/pub", entries)
+    result = cache.listing("example.com", "/pub")
+
+    # Assert
+    assert before is None, f"Expected {before!r} to be None ..."
+    assert result == entries, f"Expected {result!r} to be {entries!r} ..."
+
+
+def test_listing_is_listed_again_in_new_run(tmp_path):
+
+    # Arrange
+    cache = Cache(tmp_path / "cache.sqlite")
+    entries = ["a.txt", "b.txt"]
+    cache.store_listing("example.com", "/pub", entries)
+
+    # Act
+    cache.new_run()
+    result = cache.listing("example.com", "/pub", max_age=0)
+
+    # Assert
+    assert result is None, f"Expected {result!r} to be None ..."
+
+
+def test_listing_max_age_across_runs(tmp_path):
+
+    # Arrange
+    fname = tmp_path / "cache.sqlite"
+    entries = ["a.txt", "b.txt"]
+    Cache(fname).store_listing("example.com", "/pub", entries)
+
+    # Act
+    cache = Cache(fname)
+    expired = cache.listing("example.com", "/pub", max_age=0)
+    result = cache.listing("example.com", "/pub", max_age=3600)
+
+    # Assert
+    assert expired is None, f"Expected {expired!r} to be None ..."
+    assert result == entries, f"Expected {result!r} to be {entries!r} ..."
+
+
+def test_invalidate_listings(tmp_path):
+
+    # Arrange
+    cache = Cache(tmp_path / "cache.sqlite")
+    cache.store_listing("example.com", "/pub", ["a.txt"])
+    cache.store_listing("example.org", "/pub", ["b.txt"])
+
+    # Act
+    cache.invalidate("example.com")
+
+    # Assert
+    result = cache.listing("example.com", "/pub")
+    assert result is None, f"Expected {result!r} to be None ..."
+    result = cache.listing("example.org", "/pub")
+    expected = ["b.txt"]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_validators(tmp_path):
+
+    # Arrange
+    cache = Cache(tmp_path / "cache.sqlite")
+    uri = "https://example.com/file.txt"
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    # Act
+    before = cache.validators(uri)
+    cache.store_validators(uri, '"abc"', last_modified)
+    result = cache.validators(uri)
+
+    # Assert
+    assert before == {}, f"Expected {before!r} to be empty ..."
+    expected = {"If-None-Match": '"abc"', "If-Modified-Since": last_modified}
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_missed(tmp_path):
+
+    # Arrange
+    cache = Cache(tmp_path / "cache.sqlite")
+    uri = "ftp://example.com/pub/missing.txt"
+
+    # Act
+    before = cache.missed(uri, within=3600)
+    cache.store_miss(uri)
+
+    # Assert
+    assert not before, f"Expected {uri!r} not to be missed yet ..."
+    assert cache.missed(uri, within=3600), f"Expected {uri!r} to be missed ..."
+    assert not cache.missed(uri, within=0), f"Expected {uri!r} to be retried ..."
+
+
+def test_performance_is_stored_across_runs(tmp_path):
+
+    # Arrange
+    fname = tmp_path / "cache.sqlite"
+    Cache(fname).store_performance("example.com", 0.05, 2e6)
+
+    # Act
+    result = Cache(fname).performance("example.com")
+    unknown = Cache(fname).performance("example.org")
+
+    # Assert
+    expected = (0.05, 2e6)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert unknown == (None, None), f"Expected {unknown!r} to be (None, None) ..."
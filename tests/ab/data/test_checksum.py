@@ -0,0 +1,131 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ab.data import TransferStatus
+from ab.data.checksum import (
+    parse,
+    Checksum,
+    Checksums,
+)
+
+
+def test_parse_checksum_formats():
+
+    # Arrange
+    text = """
+# Comment
+D41D8CD98F00B204E9800998ECF8427E  a.gz
+0cc175b9c0f1b6a831c399e269772661 *sub/b.gz
+MD5 (c.gz) = 92eb5ffee6ae2fec3ad71c777531578f
+"""
+
+    # Act
+    result = parse(text)
+
+    # Assert
+    expected = {
+        "a.gz": "d41d8cd98f00b204e9800998ecf8427e",
+        "b.gz": "0cc175b9c0f1b6a831c399e269772661",
+        "c.gz": "92eb5ffee6ae2fec3ad71c777531578f",
+    }
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_checksum_for_file_with_own_sidecar():
+
+    # Arrange
+    checksum = hashlib.md5(b"content").hexdigest()
+    read = {("/pub", "a.gz.md5"): checksum.encode()}
+    checksums = Checksums(
+        dict(sidecar="{fname}.md5"), read=lambda path, fname: read.get((path, fname))
+    )
+
+    # Act
+    result = checksums.checksum("/pub", "a.gz")
+
+    # Assert
+    expected = Checksum("md5", checksum)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_verify_deletes_mismatching_file(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "a.gz"
+    ofname.write_bytes(b"corrupt")
+    checksum = Checksum("md5", hashlib.md5(b"content").hexdigest())
+    digest = checksum.digest()
+    digest.update(b"corrupt")
+
+    # Act
+    result = checksum.verify(digest, ofname)
+
+    # Assert
+    assert not result, f"Expected {ofname.name} not to match ..."
+    assert not ofname.exists(), f"Expected {ofname} to be deleted ..."
+
+
+def test_checksums_retry_mismatches():
+
+    # Arrange
+    checksums = Checksums(
+        dict(sidecar="MD5SUMS", retries=2), read=lambda path, fname: b""
+    )
+    results = [TransferStatus(mismatch=1), TransferStatus(success=1)]
+
+    def retrieve(*, checksum):
+        return results.pop(0)
+
+    # Act
+    result = checksums.run("/pub", "a.gz", retrieve)
+
+    # Assert
+    expected = TransferStatus(success=1, mismatch=1, retries=1)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_checksums_give_up_after_retries():
+
+    # Arrange
+    checksums = Checksums(
+        dict(sidecar="MD5SUMS", retries=1), read=lambda path, fname: b""
+    )
+
+    def retrieve(*, checksum):
+        return TransferStatus(mismatch=1)
+
+    # Act
+    result = checksums.run("/pub", "a.gz", retrieve)
+
+    # Assert
+    expected = TransferStatus(failed=1, mismatch=2, retries=1)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_checksums_read_sidecars_at_the_same_time():
+
+    # Arrange
+    started = threading.Barrier(2, timeout=5)
+    reads = []
+
+    def read(path, fname):
+        reads.append(fname)
+        # Fails, unless the other sidecar file is read at the same time.
+        started.wait()
+        return f"{fname[0] * 32}  {fname.removesuffix('.md5')}".encode()
+
+    checksums = Checksums(dict(sidecar="{fname}.md5"), read=read)
+
+    # Act
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(checksums.checksum, "/pub", fname)
+            for fname in ("a.gz", "b.gz", "a.gz", "b.gz")
+        ]
+        result = [future.result().expected for future in futures]
+
+    # Assert
+    expected = ["a" * 32, "b" * 32, "a" * 32, "b" * 32]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert sorted(reads) == ["a.gz.md5", "b.gz.md5"], "Expected one read each ..."
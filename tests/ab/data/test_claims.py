@@ -0,0 +1,105 @@
+import pytest
+
+from ab.data import TransferStatus
+from ab.data import journal as _journal
+from ab.data.claims import Claims
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = _journal.Journal(tmp_path / "journal.sqlite")
+    monkeypatch.setattr(_journal, "_JOURNAL", journal)
+    return journal
+
+
+def fake_retrieve(ofname, content="content"):
+    ofname.parent.mkdir(parents=True, exist_ok=True)
+    ofname.write_text(content)
+    return TransferStatus(success=1)
+
+
+def test_claims_fetch_once_and_link_waiting_destinations(tmp_path, journal):
+
+    # Arrange
+    claims = Claims()
+    uri = "ftp://example.com/pub/file.txt"
+    first = tmp_path / "a" / "file.txt"
+    second = tmp_path / "b" / "file.txt"
+
+    # Act
+    claimed_first = claims.claim(uri, first)
+    claimed_second = claims.claim(uri, second)
+    result = claims.run(uri, first, fake_retrieve, first)
+
+    # Assert
+    assert claimed_first is None, "Expected first claim to fetch the file ..."
+    expected = TransferStatus()
+    assert (
+        claimed_second == expected
+    ), f"Expected {claimed_second!r} to be {expected!r} ..."
+
+    expected = TransferStatus(success=1, linked=1)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert second.read_text() == "content"
+    assert journal.entry(second).uri == uri
+
+
+def test_claims_link_after_fetch(tmp_path, journal):
+
+    # Arrange
+    claims = Claims()
+    uri = "ftp://example.com/pub/file.txt"
+    first = tmp_path / "a" / "file.txt"
+    second = tmp_path / "b" / "file.txt"
+    claims.claim(uri, first)
+    claims.run(uri, first, fake_retrieve, first)
+
+    # Act
+    result = claims.claim(uri, second)
+
+    # Assert
+    expected = TransferStatus(linked=1)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert second.read_text() == "content"
+
+
+def test_claims_failed_fetch_can_be_claimed_again(tmp_path, journal):
+
+    # Arrange
+    claims = Claims()
+    uri = "ftp://example.com/pub/file.txt"
+    first = tmp_path / "a" / "file.txt"
+    second = tmp_path / "b" / "file.txt"
+    claims.claim(uri, first)
+    claims.claim(uri, second)
+
+    # Act
+    result = claims.run(uri, first, lambda: TransferStatus(not_found=1))
+
+    # Assert
+    expected = TransferStatus(not_found=2)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert claims.claim(uri, second) is None
+
+
+def test_claims_forget_fetched_but_not_pending(tmp_path, journal):
+
+    # Arrange
+    claims = Claims()
+    fetched = "ftp://example.com/pub/fetched.txt"
+    pending = "ftp://example.com/pub/pending.txt"
+    first = tmp_path / "a" / "fetched.txt"
+    second = tmp_path / "a" / "pending.txt"
+    claims.claim(fetched, first)
+    claims.run(fetched, first, fake_retrieve, first)
+    claims.claim(pending, second)
+
+    # Act
+    claims.forget_fetched()
+    result = claims.claim(fetched, first)
+    result2 = claims.claim(pending, tmp_path / "b" / "pending.txt")
+
+    # Assert
+    assert result is None, f"Expected {result!r} to fetch the file again ..."
+    expected = TransferStatus()
+    assert result2 == expected, f"Expected {result2!r} to be {expected!r} ..."
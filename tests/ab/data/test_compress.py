@@ -0,0 +1,67 @@
+import gzip
+from pathlib import Path
+
+import pytest
+
+from ab.data.compress import (
+    GzipDecompressor,
+    LZWDecompressor,
+    decompressor,
+    decompressed,
+)
+
+COMPRESSED = Path(__file__).parent / "compressed"
+
+# Content of `compressed/sample.txt.Z`, compressed with a maximum code width of
+# 10 bits, so that the code width grows and the code table is cleared.
+SAMPLE = "".join(
+    f"{i * i % 977:5d}" + ("\n" if i % 16 == 15 else "") for i in range(3000)
+).encode()
+
+
+def unpack(unpacker, data, size):
+    chunks = [
+        unpacker.decompress(data[i : i + size]) for i in range(0, len(data), size)
+    ]
+    return b"".join(chunks) + unpacker.flush()
+
+
+@pytest.mark.parametrize("size", [1, 13, 4096, 1 << 20])
+def test_lzw_decompressor(size):
+    data = (COMPRESSED / "sample.txt.Z").read_bytes()
+    result = unpack(LZWDecompressor(), data, size)
+    expected = SAMPLE
+    assert result == expected, f"Expected decompressed data to match sample ..."
+
+
+def test_lzw_decompressor_invalid_header():
+    with pytest.raises(ValueError):
+        LZWDecompressor().decompress(b"\x1f\x8b\x08")
+
+
+@pytest.mark.parametrize("size", [1, 100, 1 << 20])
+def test_gzip_decompressor_with_several_members(size):
+    data = gzip.compress(SAMPLE) + gzip.compress(b"end")
+    result = unpack(GzipDecompressor(), data, size)
+    expected = SAMPLE + b"end"
+    assert result == expected, f"Expected decompressed data to match sample ..."
+
+
+def test_gzip_decompressor_truncated():
+    data = gzip.compress(SAMPLE)[:-20]
+    with pytest.raises(ValueError):
+        unpack(GzipDecompressor(), data, 100)
+
+
+def test_decompressor_and_name():
+    assert isinstance(decompressor("COD22860.EPH.Z"), LZWDecompressor)
+    assert isinstance(decompressor("BUDP00DNK.crx.gz"), GzipDecompressor)
+    assert decompressor("EUREF.STA") is None
+
+    result = decompressed("ABCD001A.24O.Z")
+    expected = "ABCD001A.24O"
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    result = decompressed("EUREF.STA")
+    expected = "EUREF.STA"
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
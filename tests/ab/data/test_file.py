@@ -0,0 +1,104 @@
+import os
+import errno
+
+from ab.data import file as _file
+from ab.data.file import (
+    RINEX2_PATTERN,
+    copy,
+    transfer,
+)
+
+
+def test_copy_preserves_data_and_metadata(tmp_path):
+
+    # Arrange
+    ifname = tmp_path / "in" / "ABCD1230.24O"
+    ifname.parent.mkdir()
+    ifname.write_bytes(os.urandom(100_000))
+    os.utime(ifname, (1_700_000_000, 1_700_000_000))
+    ofname = tmp_path / "ABCD1230.24O"
+
+    # Act
+    copy(ifname, ofname)
+
+    # Assert
+    result = (ofname.read_bytes(), ofname.stat().st_mtime)
+    expected = (ifname.read_bytes(), ifname.stat().st_mtime)
+    assert result == expected, f"Expected copy to match {ifname} ..."
+    assert not list(tmp_path.glob("*.part")), f"Expected no partial files ..."
+
+
+def test_transfer_hardlink(tmp_path):
+
+    # Arrange
+    ifname = tmp_path / "abcd1230.24d.Z"
+    ifname.write_bytes(b"data")
+    stat = ifname.stat()
+    ofname = tmp_path / "out" / "ABCD1230.24D.Z"
+    ofname.parent.mkdir()
+
+    # Act
+    status = transfer(
+        ifname,
+        ofname,
+        host="localhost",
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        hardlink=True,
+    )
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    assert ofname.samefile(ifname), f"Expected {ofname} to link to {ifname} ..."
+
+
+def test_transfer_hardlink_copies_across_file_systems(tmp_path, monkeypatch):
+
+    # Arrange
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    copied = []
+
+    def recording_copy(ifname, ofname):
+        copied.append(ofname)
+        copy(ifname, ofname)
+
+    monkeypatch.setattr(_file.os, "link", cross_device)
+    monkeypatch.setattr(_file, "copy", recording_copy)
+    ifname = tmp_path / "ABCD1230.24O"
+    ifname.write_bytes(os.urandom(1000))
+    stat = ifname.stat()
+    ofname = tmp_path / "out" / "ABCD1230.24O"
+    ofname.parent.mkdir()
+
+    # Act
+    status = transfer(
+        ifname,
+        ofname,
+        host="localhost",
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        hardlink=True,
+    )
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    assert copied == [ofname], f"Expected {ofname} to be copied with copy() ..."
+    assert not ofname.samefile(ifname), f"Expected {ofname} to be a copy ..."
+    assert ofname.read_bytes() == ifname.read_bytes(), "Expected the same data ..."
+    assert ofname.stat().st_mtime == stat.st_mtime, "Expected the same mtime ..."
+    assert not list(ofname.parent.glob("*.part")), "Expected no partial files ..."
+
+
+def test_rinex2_pattern():
+
+    # Arrange
+    names = ["abcd1230.24d.Z", "ABCD1230.24O", "abcd1230.24o.gz"]
+
+    # Act
+    result = [RINEX2_PATTERN.match(name) is not None for name in names]
+
+    # Assert
+    expected = [True, False, False]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
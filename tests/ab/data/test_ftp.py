@@ -0,0 +1,98 @@
+import threading
+
+from ab.data import ftp as _ftp
+
+
+class FakeFTP:
+    def __init__(self):
+        self.closed = False
+
+    def voidcmd(self, cmd):
+        return "200 OK"
+
+    def quit(self):
+        self.closed = True
+
+
+def test_connection_pool_reuses_connections(monkeypatch):
+
+    # Arrange
+    opened = []
+    pool = _ftp.ConnectionPool("example.com", size=1)
+    monkeypatch.setattr(
+        pool, "_connect", lambda: opened.append(FakeFTP()) or opened[-1]
+    )
+
+    # Act
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    # Assert
+    assert first is second, f"Expected {first!r} to be re-used ..."
+    result = len(opened)
+    expected = 1
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_connection_pool_limits_open_connections(monkeypatch):
+
+    # Arrange
+    size = 2
+    opened = []
+    lock = threading.Lock()
+    pool = _ftp.ConnectionPool("example.com", size=size)
+    monkeypatch.setattr(
+        pool, "_connect", lambda: opened.append(FakeFTP()) or opened[-1]
+    )
+
+    in_use = []
+    peak = []
+
+    def work():
+        with pool.connection():
+            with lock:
+                in_use.append(1)
+                peak.append(len(in_use))
+            threading.Event().wait(0.01)
+            with lock:
+                in_use.pop()
+
+    # Act
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    pool.close()
+
+    # Assert
+    result = max(peak)
+    assert result <= size, f"Expected {result!r} to be at most {size!r} ..."
+    result = len(opened)
+    assert result <= size, f"Expected {result!r} to be at most {size!r} ..."
+    assert all(ftp.closed for ftp in opened), f"Expected all connections closed ..."
+
+
+def test_connection_pool_discards_broken_connections(monkeypatch):
+
+    # Arrange
+    opened = []
+    pool = _ftp.ConnectionPool("example.com", size=1)
+    monkeypatch.setattr(
+        pool, "_connect", lambda: opened.append(FakeFTP()) or opened[-1]
+    )
+
+    # Act
+    try:
+        with pool.connection():
+            raise EOFError
+    except EOFError:
+        pass
+    with pool.connection():
+        pass
+
+    # Assert
+    result = len(opened)
+    expected = 2
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert opened[0].closed, f"Expected broken connection to be closed ..."
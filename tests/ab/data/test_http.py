@@ -0,0 +1,404 @@
+from http.server import BaseHTTPRequestHandler
+import time
+import threading
+from functools import partial
+
+from conftest import (
+    QuietHandler,
+    serve,
+)
+
+from ab.data.source import Source
+from ab.data.partial import (
+    part_of,
+    store_validator,
+    validator_of,
+)
+from ab.data.http import (
+    byte_ranges,
+    download,
+    head,
+    parse_index,
+    retrieve,
+    retrieve_segmented,
+)
+
+INDEX = """
+<html>
+<head><title>Index of /trop_products/GRID/1x1/VMF3/VMF3_OP/2023</title></head>
+<body>
+<h1>Index of /trop_products/GRID/1x1/VMF3/VMF3_OP/2023</h1>
+<table>
+<tr><th><a href="?C=N;O=D">Name</a></th><th><a href="?C=M;O=A">Last modified</a></th></tr>
+<tr><td><a href="/trop_products/GRID/1x1/VMF3/VMF3_OP/">Parent Directory</a></td></tr>
+<tr><td><a href="VMF3_20230101.H00">VMF3_20230101.H00</a></td></tr>
+<tr><td><a href="VMF3_20230101.H06">VMF3_20230101.H06</a></td></tr>
+<tr><td><a href="./VMF3_20230101.H12">VMF3_20230101.H12</a></td></tr>
+<tr><td><a href="/trop_products/GRID/1x1/VMF3/VMF3_OP/2023/VMF3_20230101.H18">VMF3_20230101.H18</a></td></tr>
+<tr><td><a href="subdirectory/">subdirectory/</a></td></tr>
+<tr><td><a href="https://example.com/elsewhere.txt">elsewhere</a></td></tr>
+</table>
+</body>
+</html>
+"""
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serve `CONTENT` at any path, sending byte ranges, unless the If-Range
+    validator is not the current ETag.
+
+    """
+
+    CONTENT = bytes(range(256)) * 4
+    ETAG = '"v1"'
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def _respond(self, body):
+        first, last = 0, len(self.CONTENT) - 1
+        requested = self.headers.get("Range")
+        ranged = requested is not None and (
+            self.headers.get("If-Range", self.ETAG) == self.ETAG
+        )
+        if ranged:
+            beg, _, end = requested.removeprefix("bytes=").partition("-")
+            first, last = int(beg), min(int(end or last), last)
+        self.send_response(206 if ranged else 200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.ETAG)
+        self.send_header("Content-Length", str(last - first + 1))
+        if ranged:
+            self.send_header(
+                "Content-Range", f"bytes {first}-{last}/{len(self.CONTENT)}"
+            )
+        self.end_headers()
+        if body:
+            self.wfile.write(self.CONTENT[first : last + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class DroppingHeadHandler(QuietHandler):
+    """
+    Close the connection without a response to a HEAD request for `b.txt`.
+
+    """
+
+    def do_HEAD(self):
+        if self.path.endswith("/b.txt"):
+            self.close_connection = True
+            return
+        super().do_HEAD()
+
+
+class ConcurrencyHandler(QuietHandler):
+    """
+    Count the most GET requests handled at the same time.
+
+    """
+
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(0.05)
+            super().do_GET()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+def test_parse_index():
+
+    # Arrange
+    directory = "https://vmf.geo.tuwien.ac.at/trop_products/GRID/1x1/VMF3/VMF3_OP/2023/"
+
+    # Act
+    result = parse_index(directory, INDEX)
+
+    # Assert
+    expected = [
+        "VMF3_20230101.H00",
+        "VMF3_20230101.H06",
+        "VMF3_20230101.H12",
+        "VMF3_20230101.H18",
+    ]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_byte_ranges():
+
+    # Arrange
+    cases = [
+        ((10, 3), [(0, 2), (3, 5), (6, 9)]),
+        ((4, 1), [(0, 3)]),
+        ((2, 4), [(0, 0), (1, 1)]),
+    ]
+
+    for (size, n), expected in cases:
+        # Act
+        result = byte_ranges(size, n)
+
+        # Assert
+        assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_retrieve_unconditionally_when_forced_or_changed_locally(tmp_path):
+
+    # Arrange
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "a.txt").write_text("a")
+    ofname = tmp_path / "a.txt"
+
+    with serve(partial(QuietHandler, directory=str(served))) as url:
+        uri = f"{url}/a.txt"
+        first = retrieve(uri, ofname)
+
+        # Act
+        unchanged = retrieve(uri, ofname)
+        forced = retrieve(uri, ofname, force=True)
+        ofname.write_text("changed locally")
+        changed = retrieve(uri, ofname)
+
+    # Assert
+    assert first.success == 1, f"Expected {first!r} to have one success ..."
+    assert unchanged.existing == 1, f"Expected {unchanged!r} to be existing ..."
+    assert forced.success == 1, f"Expected {forced!r} to have one success ..."
+    assert changed.success == 1, f"Expected {changed!r} to have one success ..."
+    result = ofname.read_text()
+    assert result == "a", f"Expected {result!r} to be 'a' ..."
+
+
+def test_retrieve_segmented(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "large.bin"
+
+    with serve(RangeHandler) as url:
+        uri = f"{url}/large.bin"
+        headers = head(uri)
+
+        # Act
+        status = retrieve_segmented(uri, ofname, headers=headers, segments=3)
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    assert status.bytes == len(RangeHandler.CONTENT)
+    result = ofname.read_bytes()
+    assert result == RangeHandler.CONTENT, "Expected the segments to be joined ..."
+
+
+def test_retrieve_segmented_fails_when_file_changed_meanwhile(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "large.bin"
+
+    with serve(RangeHandler) as url:
+        uri = f"{url}/large.bin"
+        # The server answers If-Range with the whole file, since the ETag
+        # changed after the HEAD request.
+        headers = {**head(uri), "ETag": '"v0"'}
+
+        # Act
+        status = retrieve_segmented(uri, ofname, headers=headers, segments=3)
+
+    # Assert
+    assert status.failed == 1, f"Expected {status!r} to have one failure ..."
+    assert not ofname.exists(), f"Expected {ofname} not to be created ..."
+    assert not list(tmp_path.iterdir()), "Expected the partial file to be removed ..."
+
+
+def test_retrieve_segmented_fails_when_short(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "large.bin"
+
+    with serve(RangeHandler) as url:
+        uri = f"{url}/large.bin"
+        # The last range is cut off at the end of the file.
+        size = len(RangeHandler.CONTENT) + 100
+        headers = {**head(uri), "Content-Length": str(size)}
+
+        # Act
+        status = retrieve_segmented(uri, ofname, headers=headers, segments=3)
+
+    # Assert
+    assert status.failed == 1, f"Expected {status!r} to have one failure ..."
+    assert not ofname.exists(), f"Expected {ofname} not to be created ..."
+    assert not list(tmp_path.iterdir()), "Expected the partial file to be removed ..."
+
+
+def test_retrieve_segmented_skips_unchanged_file_unless_forced(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "large.bin"
+
+    with serve(RangeHandler) as url:
+        uri = f"{url}/large.bin"
+        headers = head(uri)
+        first = retrieve_segmented(uri, ofname, headers=headers, segments=3)
+
+        # Act
+        unchanged = retrieve_segmented(uri, ofname, headers=headers, segments=3)
+        forced = retrieve_segmented(
+            uri, ofname, headers=headers, segments=3, force=True
+        )
+
+    # Assert
+    assert first.success == 1, f"Expected {first!r} to have one success ..."
+    assert unchanged.existing == 1, f"Expected {unchanged!r} to be existing ..."
+    assert unchanged.bytes == 0, f"Expected {unchanged!r} to transfer nothing ..."
+    assert forced.success == 1, f"Expected {forced!r} to have one success ..."
+
+
+def test_download_counts_failed_head_request_for_the_file_only(tmp_path):
+
+    # Arrange
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "a.txt").write_text("a")
+    (served / "b.txt").write_text("b")
+    destination = tmp_path / "destination"
+
+    with serve(partial(DroppingHeadHandler, directory=str(served))) as url:
+        source = Source(
+            "SYNCED",
+            "Source compared with the remote files",
+            f"{url}/",
+            destination,
+            filenames=["a.txt", "b.txt"],
+            sync=True,
+        )
+
+        # Act
+        status = download(source)
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    assert status.failed == 1, f"Expected {status!r} to have one failure ..."
+    assert (destination / "a.txt").read_text() == "a"
+    assert not (destination / "b.txt").exists()
+
+
+def test_download_in_one_stream_when_head_request_fails(tmp_path):
+
+    # Arrange
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "b.txt").write_text("b" * 100)
+    destination = tmp_path / "destination"
+
+    with serve(partial(DroppingHeadHandler, directory=str(served))) as url:
+        source = Source(
+            "SEGMENTED",
+            "Source with files downloaded in segments",
+            f"{url}/",
+            destination,
+            filenames=["b.txt"],
+            segments=2,
+            segment_threshold=1,
+        )
+
+        # Act
+        status = download(source)
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    result = (destination / "b.txt").read_text()
+    assert result == "b" * 100, f"Expected {result!r} to be the served file ..."
+
+
+def test_retrieve_resumes_partial_file_of_same_version(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "large.bin"
+    part = part_of(ofname)
+    part.write_bytes(RangeHandler.CONTENT[:400])
+    store_validator(part, RangeHandler.ETAG)
+
+    with serve(RangeHandler) as url:
+        # Act
+        status = retrieve(f"{url}/large.bin", ofname)
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    expected = len(RangeHandler.CONTENT) - 400
+    assert status.bytes == expected, f"Expected {expected} B to be received ..."
+    assert ofname.read_bytes() == RangeHandler.CONTENT
+    assert not validator_of(part).exists(), "Expected the validator to be removed ..."
+
+
+def test_retrieve_starts_over_with_partial_file_of_other_version(tmp_path):
+
+    # Arrange
+    stale = b"x" * 400
+    cases = [
+        # The server sends the whole file, since the validator does not match.
+        '"v0"',
+        # The partial file is not resumed without a validator.
+        None,
+    ]
+
+    for validator in cases:
+        ofname = tmp_path / "large.bin"
+        ofname.unlink(missing_ok=True)
+        part = part_of(ofname)
+        part.write_bytes(stale)
+        store_validator(part, validator)
+
+        with serve(RangeHandler) as url:
+            # Act
+            status = retrieve(f"{url}/large.bin", ofname)
+
+        # Assert
+        assert status.success == 1, f"Expected {status!r} to have one success ..."
+        result = ofname.read_bytes()
+        assert result == RangeHandler.CONTENT, "Expected no stale bytes ..."
+
+
+def test_download_files_concurrently(tmp_path):
+
+    # Arrange
+    served = tmp_path / "served"
+    served.mkdir()
+    fnames = [f"{ix}.txt" for ix in range(8)]
+    for fname in fnames:
+        (served / fname).write_text(fname * 100)
+    destination = tmp_path / "destination"
+
+    with serve(partial(ConcurrencyHandler, directory=str(served))) as url:
+        source = Source(
+            "CONCURRENT",
+            "Source with files downloaded at the same time",
+            f"{url}/",
+            destination,
+            filenames=fnames,
+            workers=4,
+        )
+
+        # Act
+        status = download(source)
+        again = download(source)
+
+    # Assert
+    assert status.success == 8, f"Expected {status!r} to have eight successes ..."
+    assert status.failed == 0, f"Expected {status!r} to have no failures ..."
+    expected = sum(len(fname * 100) for fname in fnames)
+    assert status.bytes == expected, f"Expected {expected} B to be received ..."
+    for fname in fnames:
+        assert (destination / fname).read_text() == fname * 100
+    assert ConcurrencyHandler.peak > 1, "Expected files downloaded at the same time ..."
+    assert again.existing == 8, f"Expected {again!r} to have eight existing ..."
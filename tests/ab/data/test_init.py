@@ -1,7 +1,15 @@
 import json
+import threading
 from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
 
-from ab.data import TransferStatus
+from ab.data import (
+    TransferStatus,
+    HostStatus,
+    Pending,
+    unlisted,
+)
+from ab.data.source import RemoteLocalPair
 
 
 def test_add_download_statusses():
@@ -37,6 +45,127 @@ def test_download_status_asdict():
         "success": 3,
         "failed": 0,
         "not_found": 0,
+        "skipped": 0,
+        "linked": 0,
+        "mismatch": 0,
+        "retries": 0,
+        "bytes": 0,
+        "seconds": 0.0,
+        "elapsed": 0.0,
+        "hosts": {},
         "exceptions": [],
     }
     assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_pending_transfers_are_summed():
+    # Arrange
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pending = Pending(executor, limit=2)
+
+        # Act
+        for _ in range(5):
+            pending.submit(TransferStatus, success=1)
+        result = pending.result()
+
+    # Assert
+    expected = TransferStatus(success=5)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_pending_interrupted_cancels_without_waiting():
+    # Arrange
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def running() -> TransferStatus:
+        release.wait(timeout=10)
+        return TransferStatus(success=1)
+
+    # Act
+    try:
+        with Pending(executor, limit=2) as pending:
+            pending.submit(running)
+            pending.submit(TransferStatus, success=1)
+            raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+
+    # Assert
+    futures = list(pending.futures)
+    assert not release.is_set()
+    assert sum(future.cancelled() for future in futures) == 1
+    release.set()
+    executor.shutdown()
+
+
+def test_add_transfer_statusses_with_hosts_and_exceptions():
+    # Arrange
+    error = OSError("Connection reset")
+    status1 = TransferStatus(success=1)
+    status1.transferred("ftp.example.com", 100, 2.0)
+    status2 = TransferStatus(failed=1, exceptions=[error])
+    status2.transferred("ftp.example.com", 300, 2.0)
+    status2.transferred("www.example.com", 50, 1.0)
+
+    # Act
+    result = status1 + status2
+
+    # Assert
+    expected = {
+        "ftp.example.com": HostStatus(2, 400, 4.0),
+        "www.example.com": HostStatus(1, 50, 1.0),
+    }
+    assert result.hosts == expected, f"Expected {result.hosts!r} to be {expected!r} ..."
+    assert result.exceptions == [error]
+    assert result.bytes == 450
+    assert result.hosts["ftp.example.com"].throughput == 100.0
+    assert status2.hosts["ftp.example.com"] == HostStatus(1, 300, 2.0)
+
+
+def test_transfer_status_summary():
+    # Arrange
+    status = TransferStatus(success=2, exceptions=[OSError()])
+    status.transferred("ftp.example.com", 1000, 4.0)
+    status.elapsed = 2.0
+
+    # Act
+    result = status.summary()
+
+    # Assert
+    assert result["throughput"] == 500.0
+    assert result["exceptions"] == 1
+    assert "hosts" not in result
+    json.dumps(result)
+
+
+def test_unlisted_counts_previously_listed_files_as_existing():
+    # Arrange
+    previous = {"/data": ["a.txt", "b.txt"]}
+    pair = RemoteLocalPair("ftp://host/data/*.txt", "/tmp")
+    status = TransferStatus()
+
+    # Act
+    result = unlisted(previous, pair, ["a.txt", "b.txt", "c.txt"], status)
+
+    # Assert
+    expected = ["c.txt"]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert status.existing == 2, f"Expected {status.existing!r} to be 2 ..."
+
+
+def test_unlisted_keeps_files_without_wildcard_or_previous_listing():
+    # Arrange
+    previous = {"/data": ["a.txt"]}
+    named = RemoteLocalPair("ftp://host/data/a.txt", "/tmp")
+    unknown = RemoteLocalPair("ftp://host/new/*.txt", "/tmp")
+    status = TransferStatus()
+
+    # Act
+    result = unlisted(previous, named, ["a.txt"], status)
+    result2 = unlisted(previous, unknown, ["a.txt"], status, key=str.upper)
+
+    # Assert
+    assert result == ["a.txt"], f"Expected {result!r} to be ['a.txt'] ..."
+    assert result2 == ["a.txt"], f"Expected {result2!r} to be ['a.txt'] ..."
+    assert status.existing == 0, f"Expected {status.existing!r} to be 0 ..."
@@ -0,0 +1,101 @@
+import pytest
+
+from ab.data import journal as _journal
+from ab.data.stats import RemoteStat
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = _journal.Journal(tmp_path / "journal.sqlite")
+    monkeypatch.setattr(_journal, "_JOURNAL", journal)
+    return journal
+
+
+def test_is_current_adds_existing_file_to_journal(tmp_path, journal):
+
+    # Arrange
+    uri = "ftp://example.com/pub/file.txt"
+    fname = tmp_path / "file.txt"
+    fname.write_text("content")
+
+    # Act
+    result = _journal.is_current(uri, fname)
+
+    # Assert
+    assert result, f"Expected {fname!r} to be current ..."
+    entry = journal.entry(fname)
+    assert entry is not None, f"Expected {fname!r} in journal ..."
+    assert entry.uri == uri, f"Expected {entry.uri!r} to be {uri!r} ..."
+    assert entry.size == len("content")
+
+
+def test_is_current_uses_journal(tmp_path, journal):
+
+    # Arrange
+    uri = "ftp://example.com/pub/file.txt"
+    fname = tmp_path / "file.txt"
+    # The size on disk differs from the entry, which is trusted instead.
+    fname.write_text("content")
+    journal.record(uri, fname, size=10, remote_mtime=1_700_000_000.0)
+
+    # Act and assert
+    assert _journal.is_current(uri, fname, max_age=1)
+    assert not _journal.is_current(uri, fname, max_age=0)
+    assert _journal.is_current(uri, fname, remote=RemoteStat(10, 1_700_000_000.0))
+    assert not _journal.is_current(uri, fname, remote=RemoteStat(11, 1_700_000_000.0))
+
+
+def test_is_current_requires_file_on_disk(tmp_path, journal):
+
+    # Arrange
+    uri = "ftp://example.com/pub/file.txt"
+    fname = tmp_path / "file.txt"
+    journal.record(uri, fname, size=10, remote_mtime=1_700_000_000.0)
+
+    # Act and assert
+    assert not _journal.is_current(uri, fname, max_age=1)
+    assert not _journal.is_current(uri, fname, remote=RemoteStat(10, 1_700_000_000.0))
+
+
+def test_is_current_records_remote_mtime(tmp_path, journal):
+
+    # Arrange
+    uri = "ftp://example.com/pub/file.txt"
+    fname = tmp_path / "file.txt"
+    fname.write_text("content")
+    remote = RemoteStat(len("content"), fname.stat().st_mtime)
+    no_remote = tmp_path / "other.txt"
+    no_remote.write_text("content")
+
+    # Act
+    _journal.is_current(uri, fname, remote=remote)
+    _journal.is_current(uri, no_remote)
+
+    # Assert
+    entry = journal.entry(fname)
+    assert entry is not None and entry.remote_mtime == remote.mtime
+    entry = journal.entry(no_remote)
+    assert entry is not None and entry.remote_mtime is None
+
+
+def test_reconcile(tmp_path, journal):
+
+    # Arrange
+    kept = tmp_path / "kept.txt"
+    kept.write_text("content")
+    changed = tmp_path / "changed.txt"
+    changed.write_text("content")
+    deleted = tmp_path / "deleted.txt"
+
+    journal.record("uri-kept", kept, size=len("content"))
+    journal.record("uri-changed", changed, size=1)
+    journal.record("uri-deleted", deleted, size=1)
+
+    # Act
+    checked, removed = _journal.reconcile(journal)
+
+    # Assert
+    assert (checked, removed) == (3, 2)
+    result = [entry.path for entry in journal.entries()]
+    expected = [str(kept)]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
@@ -0,0 +1,113 @@
+import threading
+
+from ab.data.limits import (
+    Limits,
+    Window,
+)
+
+
+def test_slots_per_host():
+
+    # Arrange
+    limits = Limits(total=3, per_host=1)
+    lock = threading.Lock()
+    active: dict[str, int] = {"a": 0, "b": 0}
+    peaks: dict[str, int] = {"a": 0, "b": 0}
+
+    def work(host):
+        with limits.slot(host):
+            with lock:
+                active[host] += 1
+                peaks[host] = max(peaks[host], active[host])
+            threading.Event().wait(0.01)
+            with lock:
+                active[host] -= 1
+
+    # Act
+    threads = [threading.Thread(target=work, args=(host,)) for host in "abab"]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    # Assert
+    expected = {"a": 1, "b": 1}
+    assert peaks == expected, f"Expected {peaks!r} to be {expected!r} ..."
+
+
+def test_window_increases_additively_and_halves_when_congested():
+
+    # Arrange
+    window = Window("example.com", 2, ceiling=4)
+
+    # Act
+    for _ in range(4):
+        window.completed(1024, 0.1, 0.01)
+    increased = window.slots
+    for _ in range(2):
+        window.completed(1024, 0.1, 0.01)
+    ceiling = window.slots
+    window.congested()
+    window.congested()
+    halved = window.slots
+
+    # Assert
+    result = (increased, ceiling, halved)
+    expected = (3, 4, 2)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_window_decreases_when_responses_slow_down():
+
+    # Arrange
+    window = Window("example.com", 4)
+
+    # Act
+    window.completed(1024, 0.1, 0.01)
+    window.completed(1024, 0.1, 0.5)
+    result = window.slots
+
+    # Assert
+    expected = 3
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_window_is_not_pinned_by_a_single_fast_response():
+
+    # Arrange
+    window = Window("example.com", 4)
+
+    # Act
+    window.completed(1024, 0.1, 0.001)
+    for ix in range(100):
+        window.completed(1024, 0.1, 0.04 if ix % 2 else 0.06)
+    result = window.slots
+
+    # Assert
+    assert result > 4, f"Expected {result!r} to be more than 4 ..."
+
+
+def test_adaptive_slots_per_host():
+
+    # Arrange
+    limits = Limits(total=8, per_host=2, adaptive=True)
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def work():
+        nonlocal active, peak
+        with limits.slot("a"):
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            threading.Event().wait(0.01)
+            with lock:
+                active -= 1
+
+    # Act
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    # Assert
+    expected = 2
+    assert peak == expected, f"Expected {peak!r} to be {expected!r} ..."
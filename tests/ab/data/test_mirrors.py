@@ -0,0 +1,207 @@
+import time
+from http.server import SimpleHTTPRequestHandler
+from functools import partial
+from urllib.parse import urlparse
+
+from conftest import (
+    QuietHandler,
+    serve,
+)
+
+from ab.data import http as _http
+from ab.data.cache import get_cache
+from ab.data.journal import get_journal
+from ab.data.source import Source
+from ab.data.mirrors import (
+    Mirror,
+    download,
+    rank,
+    root,
+    unfinished,
+)
+
+
+class UnavailableHandler(SimpleHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_error(503)
+
+    def do_GET(self):
+        self.send_error(503)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_root():
+
+    # Arrange
+    url = "https://example.com/pub/products/{gps_week}/IGS{gps_week}.SP3"
+
+    # Act
+    result = root(url)
+
+    # Assert
+    expected = "https://example.com/pub/products/"
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_mirror_score():
+
+    # Arrange
+    down = Mirror("ftp://a.example.com/", "a.example.com")
+    slow = Mirror("ftp://b.example.com/", "b.example.com", 0.5, 1e5)
+    fast = Mirror("ftp://c.example.com/", "c.example.com", 0.5, 1e7)
+
+    # Act
+    result = sorted([down, slow, fast], key=lambda mirror: mirror.score)
+
+    # Assert
+    expected = [fast, slow, down]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_rank_puts_host_down_last(tmp_path):
+
+    # Arrange
+    working = partial(QuietHandler, directory=str(tmp_path))
+
+    with serve(UnavailableHandler) as down, serve(working) as up:
+        source = Source(
+            "MIRRORED",
+            "Source with a mirror",
+            f"{down}/",
+            tmp_path,
+            mirrors=[f"{up}/"],
+        )
+
+        # Act
+        result = [mirror.url for mirror in rank(source)]
+
+    # Assert
+    expected = [f"{up}/", f"{down}/"]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_rank_keeps_history_of_host_down(tmp_path):
+
+    # Arrange
+    with serve(UnavailableHandler) as down:
+        host = urlparse(down).netloc
+        get_cache().store_performance(host, 0.1, 1e6)
+        source = Source("DOWN", "Source on a host that is down", f"{down}/", tmp_path)
+
+        # Act
+        rank(source)
+
+    # Assert
+    result = get_cache().performance(host)
+    expected = (0.1, 1e6)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_download_fails_over_to_mirror(tmp_path):
+
+    # Arrange
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "a.txt").write_text("a")
+    destination = tmp_path / "destination"
+
+    with (
+        serve(partial(QuietHandler, directory=str(empty))) as missing,
+        serve(partial(QuietHandler, directory=str(served))) as up,
+    ):
+        # Make the host without the file the fastest.
+        get_cache().store_performance(urlparse(missing).netloc, None, 1e9)
+        source = Source(
+            "MIRRORED",
+            "Source with a mirror",
+            f"{missing}/",
+            destination,
+            filenames=["a.txt"],
+            mirrors=[f"{up}/"],
+        )
+
+        # Act
+        status = download(source, {"http": _http})
+
+    # Assert
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    assert status.not_found == 0, f"Expected {status!r} to have no misses ..."
+    result = (destination / "a.txt").read_text()
+    assert result == "a", f"Expected {result!r} to be 'a' ..."
+
+
+def test_download_tries_only_missing_files_from_mirror(tmp_path):
+
+    # Arrange
+    partial_ = tmp_path / "partial"
+    partial_.mkdir()
+    (partial_ / "a.txt").write_text("a")
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "a.txt").write_text("a")
+    (served / "b.txt").write_text("b")
+    destination = tmp_path / "destination"
+
+    with (
+        serve(partial(QuietHandler, directory=str(partial_))) as incomplete,
+        serve(partial(QuietHandler, directory=str(served))) as up,
+    ):
+        # Make the host missing a file the fastest.
+        get_cache().store_performance(urlparse(incomplete).netloc, None, 1e9)
+        source = Source(
+            "MIRRORED",
+            "Source with a mirror",
+            f"{incomplete}/",
+            destination,
+            filenames=["a.txt", "b.txt"],
+            max_age=0,
+            mirrors=[f"{up}/"],
+        )
+
+        # Act
+        status = download(source, {"http": _http})
+
+    # Assert
+    result = (status.success, status.existing, status.not_found)
+    expected = (2, 0, 0)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    assert set(status.hosts) == {
+        urlparse(incomplete).netloc,
+        urlparse(up).netloc,
+    }, f"Expected {status!r} to have downloaded from both hosts ..."
+    assert status.hosts[urlparse(up).netloc].files == 1
+    result2 = [(destination / fname).read_text() for fname in ("a.txt", "b.txt")]
+    assert result2 == ["a", "b"], f"Expected {result2!r} to be ['a', 'b'] ..."
+
+
+def test_unfinished_pairs(tmp_path):
+
+    # Arrange
+    source = Source(
+        "MIRRORED",
+        "Source with a mirror",
+        "ftp://example.com/pub/",
+        tmp_path,
+        filenames=["a.txt", "b.txt", "*.sp3", "*.clk"],
+        max_age=0,
+    )
+    started = time.time()
+    for fname in ("a.txt", "x.sp3"):
+        (tmp_path / fname).write_text(fname)
+        get_journal().record(f"ftp://example.com/pub/{fname}", tmp_path / fname)
+    listings = {"/pub": ["a.txt", "b.txt", "x.sp3", "y.sp3"]}
+
+    # Act
+    result = unfinished(source, listings, started)
+    result2 = unfinished(source, listings, started, frozenset({0, 1}))
+
+    # Assert
+    # b.txt is missing, y.sp3 is missing, and no *.clk were listed
+    expected = frozenset({1, 2, 3})
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    expected2 = frozenset({1})
+    assert result2 == expected2, f"Expected {result2!r} to be {expected2!r} ..."
@@ -0,0 +1,46 @@
+from ab.data.partial import (
+    part_of,
+    offset,
+    complete,
+)
+
+
+def test_part_of(tmp_path):
+    result = part_of(tmp_path / "file.SNX.gz")
+    expected = tmp_path / "file.SNX.gz.part"
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_offset(tmp_path):
+
+    # Arrange
+    part = part_of(tmp_path / "file.txt")
+
+    # Act and assert
+    result = offset(part)
+    assert result == 0, f"Expected {result!r} to be 0 ..."
+
+    part.write_bytes(b"12345")
+    result = offset(part, size=10)
+    assert result == 5, f"Expected {result!r} to be 5 ..."
+
+    result = offset(part, size=4)
+    assert result == 0, f"Expected {result!r} to be 0 ..."
+    assert not part.exists(), f"Expected {part!r} to be deleted ..."
+
+
+def test_complete(tmp_path):
+
+    # Arrange
+    ofname = tmp_path / "file.txt"
+    part = part_of(ofname)
+    part.write_bytes(b"12345")
+
+    # Act and assert
+    assert not complete(part, ofname, size=10)
+    assert part.is_file(), f"Expected {part!r} to be kept for resuming ..."
+    assert not ofname.exists(), f"Expected {ofname!r} not to exist ..."
+
+    assert complete(part, ofname, size=5)
+    assert not part.exists(), f"Expected {part!r} to be renamed ..."
+    assert ofname.read_bytes() == b"12345"
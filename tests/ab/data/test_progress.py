@@ -0,0 +1,20 @@
+from ab.data.progress import Progress
+
+
+def test_progress_counts_bytes():
+
+    # Arrange
+    progress = Progress("file.txt", 10, offset=4)
+
+    # Act
+    progress(b"12")
+    progress(b"345")
+
+    # Assert
+    result = progress.bytes
+    expected = 5
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    result = progress._done()
+    expected = "90% (9 Bytes of 10 Bytes)"
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
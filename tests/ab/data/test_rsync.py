@@ -0,0 +1,164 @@
+import subprocess as sub
+from pathlib import Path
+
+from ab.data import rsync as _rsync
+from ab.data.source import (
+    Source,
+    RemoteLocalPair,
+)
+from ab.data.journal import get_journal
+from ab.data.rsync import (
+    Statistics,
+    _target,
+    download,
+    transfer,
+)
+
+
+def fake_rsync(commands, missing=()):
+    """
+    Return a stand-in for `subprocess.run`, which records the rsync commands and
+    receives each remote file, unless it is missing.
+
+    """
+
+    def run(command, **kwargs):
+        commands.append(command)
+        *_, destination = command
+        paths = [arg for arg in command[1:-1] if "://" in arg]
+        names = [path.rpartition("/")[2] for path in paths if path not in missing]
+        for name in names:
+            (Path(destination) / name).write_text(name)
+        stdout = "\n".join(f">f+++++++++ {name}" for name in names)
+        stdout += f"""
+Number of files: {len(names)} (reg: {len(names)})
+Number of regular files transferred: {len(names)}
+Total bytes received: {100 * len(names)}
+"""
+        stderr = "".join(
+            f'rsync: link_stat "{path}" failed: No such file or directory (2)\n'
+            for path in paths
+            if path in missing
+        )
+        return sub.CompletedProcess(command, 23 if stderr else 0, stdout, stderr)
+
+    return run
+
+
+def test_statistics_parse():
+
+    # Arrange
+    output = """\
+>f+++++++++ IGS0OPSFIN_20240010000_01D_15M_ORB.SP3.gz
+>f.st...... 2024/SUM/IGS24001.SUM
+cd+++++++++ 2024/new/
+
+Number of files: 1,234 (reg: 1,000, dir: 234)
+Number of created files: 2 (reg: 1, dir: 1)
+Number of deleted files: 0
+Number of regular files transferred: 2
+Total file size: 123,456,789 bytes
+Total transferred file size: 1,234,567 bytes
+Literal data: 12,345 bytes
+Matched data: 1,222,222 bytes
+File list size: 12,345
+File list generation time: 0.001 seconds
+File list transfer time: 0.000 seconds
+Total bytes sent: 1,234
+Total bytes received: 23,456
+
+sent 1,234 bytes  received 23,456 bytes  9,052.67 bytes/sec
+total size is 123,456,789  speedup is 9,094.09
+"""
+    expected = Statistics(
+        files=1000,
+        transferred=2,
+        received=23456,
+        received_files=[
+            "IGS0OPSFIN_20240010000_01D_15M_ORB.SP3.gz",
+            "2024/SUM/IGS24001.SUM",
+        ],
+    )
+
+    # Act
+    result = Statistics.parse(output)
+
+    # Assert
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_target():
+
+    # Arrange
+    uris = [
+        "rsync://igs.example.com/products/2024/",
+        "rsync+ssh://user@savedisk.example.com:2222/archive/2024/*.SNX",
+    ]
+    expected = [
+        ("rsync://igs.example.com/products/2024/", []),
+        (
+            "user@savedisk.example.com:/archive/2024/*.SNX",
+            ["--rsh", "ssh -p 2222"],
+        ),
+    ]
+
+    # Act
+    result = [_target(uri) for uri in uris]
+
+    # Assert
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_transfer(tmp_path, monkeypatch):
+
+    # Arrange
+    commands = []
+    missing = "rsync://example.com/pub/2024/B.SP3"
+    monkeypatch.setattr(_rsync.sub, "run", fake_rsync(commands, [missing]))
+    pairs = [
+        RemoteLocalPair("rsync://example.com/pub/2024/A.SP3", str(tmp_path)),
+        RemoteLocalPair(missing, str(tmp_path)),
+    ]
+
+    # Act
+    status = transfer("example.com", pairs, tmp_path)
+
+    # Assert
+    assert len(commands) == 1, f"Expected one rsync command. Got {commands!r} ..."
+    assert status.success == 1, f"Expected {status!r} to have one success ..."
+    assert status.not_found == 1, f"Expected {status!r} to have one miss ..."
+    assert status.bytes == 100, f"Expected {status!r} to have received 100 B ..."
+    entry = get_journal().entry(tmp_path / "A.SP3")
+    assert entry is not None, "Expected the received file to be recorded ..."
+    assert entry.uri == "rsync://example.com/pub/2024/A.SP3"
+
+
+def test_download_batches_by_remote_directory(tmp_path, monkeypatch):
+
+    # Arrange
+    commands = []
+    monkeypatch.setattr(_rsync.sub, "run", fake_rsync(commands))
+    source = Source(
+        "RSYNC",
+        "Files in two remote directories with one destination",
+        "rsync://example.com/pub/",
+        tmp_path,
+        filenames=["a/A.SP3", "a/B.SP3", "b/C.SP3"],
+    )
+
+    # Act
+    status = download(source)
+
+    # Assert
+    assert len(commands) == 2, f"Expected two rsync commands. Got {commands!r} ..."
+    assert status.success == 3, f"Expected {status!r} to have three successes ..."
+    result = {
+        name: get_journal().entry(tmp_path / name).uri
+        for name in ("A.SP3", "B.SP3", "C.SP3")
+    }
+    expected = {
+        "A.SP3": "rsync://example.com/pub/a/A.SP3",
+        "B.SP3": "rsync://example.com/pub/a/B.SP3",
+        "C.SP3": "rsync://example.com/pub/b/C.SP3",
+    }
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
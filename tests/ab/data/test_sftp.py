@@ -0,0 +1,209 @@
+import os
+import sys
+import threading
+import datetime as dt
+
+from ab.data import sftp as _sftp
+from ab.data import limits as _limits
+from ab.data.sftp import (
+    GET,
+    BatchOutput,
+    RemoteStat,
+    parse_listings,
+)
+
+# Stand-in for sftp in batch mode, echoing each command as it is read
+ECHO_COMMANDS = """
+import sys
+for line in sys.stdin:
+    print(f"sftp> {line.strip()}", flush=True)
+    print(f"Fetching {line.split()[-2]} to {line.split()[-1]}", flush=True)
+"""
+
+
+def test_parse_listings():
+
+    # Arrange
+    now = dt.datetime(2024, 1, 10, 12)
+    output = """\
+sftp> -mkdir pub
+sftp> -ls -ln pub/2290
+-rw-r--r--    1 1000     1000          123 Jan  9 08:15 pub/2290/A.SNX
+-rw-r--r--    1 1000     1000         4567 Dec 30 23:59 pub/2290/B.CRD
+-rw-r--r--    1 1000     1000            8 Mar  1  2023 pub/2290/C.SUM
+drwxr-xr-x    2 1000     1000         4096 Jan  9 08:15 pub/2290/sub
+sftp> -ls -ln pub/2291
+"""
+    expected = {
+        "pub/2290": {
+            "A.SNX": RemoteStat(123, dt.datetime(2024, 1, 9, 8, 15)),
+            "B.CRD": RemoteStat(4567, dt.datetime(2023, 12, 30, 23, 59)),
+            "C.SUM": RemoteStat(8, dt.datetime(2023, 3, 1), exact=False),
+        },
+        "pub/2291": {},
+    }
+
+    # Act
+    result = parse_listings(output, ["pub/2290", "pub/2291"], now=now)
+
+    # Assert
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_remote_stat_older_than(tmp_path):
+
+    # Arrange
+    fname = tmp_path / "A.SNX"
+    fname.write_text("abc")
+    mtime = dt.datetime(2024, 1, 9, 8, 15, 30)
+    os.utime(fname, (mtime.timestamp(), mtime.timestamp()))
+    same = RemoteStat(3, dt.datetime(2024, 1, 9, 8, 15))
+    older = RemoteStat(3, dt.datetime(2024, 1, 9, 8, 14))
+    resized = RemoteStat(4, dt.datetime(2024, 1, 9, 8, 15))
+    same_date = RemoteStat(3, dt.datetime(2024, 1, 9), exact=False)
+
+    # Act
+    results = [remote.older_than(fname) for remote in (same, older, resized, same_date)]
+
+    # Assert
+    expected = [False, True, True, False]
+    assert results == expected, f"Expected {results!r} to be {expected!r} ..."
+
+
+def test_batch_output_counts_each_file():
+
+    # Arrange
+    lines = [
+        "sftp> -mkdir pub",
+        'remote mkdir "/pub": Failure',
+        "sftp> -put A.SNX pub",
+        "sftp> -put B.SNX pub",
+        "stat B.SNX: No such file or directory",
+        "sftp> -put C.SNX pub",
+    ]
+    output = BatchOutput()
+
+    # Act
+    for line in lines:
+        output.feed(line)
+    status = output.close(returncode=0, count=4)
+
+    # Assert
+    result = (status.success, status.failed)
+    expected = (2, 2)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+    results = output.results
+    expected_results = {"A.SNX": True, "B.SNX": False, "C.SNX": True}
+    assert (
+        results == expected_results
+    ), f"Expected {results!r} to be {expected_results!r} ..."
+
+
+def test_batch_output_counts_interrupted_file_as_failed():
+
+    # Arrange
+    output = BatchOutput()
+
+    # Act
+    output.feed("sftp> -put A.SNX pub")
+    output.feed("sftp> -put B.SNX pub")
+    status = output.close(returncode=255, count=2)
+
+    # Assert
+    result = (status.success, status.failed)
+    expected = (1, 1)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_batch_output_follows_fetched_files():
+
+    # Arrange
+    output = BatchOutput()
+
+    # Act
+    output.feed("sftp> -get -p /data/A.24O /tmp/A.24O.part")
+    output.feed('remote open("/data/A.24O"): Permission denied')
+    output.close(returncode=0, count=1)
+
+    # Assert
+    result = output.results
+    expected = {"/data/A.24O": False}
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_transfer_large_batch(monkeypatch):
+
+    # Arrange
+    monkeypatch.setattr(
+        _sftp, "_sftp", lambda host, options=None: [sys.executable, "-c", ECHO_COMMANDS]
+    )
+    # Far more than fits in the pipe buffers both ways
+    count = 5_000
+    commands = [
+        GET.format(remote=f"/pub/{ix:05d}/file.txt", local=f"/tmp/{ix:05d}.txt.part")
+        for ix in range(count)
+    ]
+    outputs = []
+
+    # Act
+    worker = threading.Thread(
+        target=lambda: outputs.append(_sftp._transfer("example.com", commands, count)),
+        daemon=True,
+    )
+    worker.start()
+    worker.join(timeout=60)
+
+    # Assert
+    assert not worker.is_alive(), "Expected the batch to finish ..."
+    [output] = outputs
+    result = output.status
+    expected = count
+    assert (
+        result.success == expected
+    ), f"Expected {result.success!r} to be {expected!r} ..."
+    assert result.failed == 0, f"Expected {result.failed!r} to be 0 ..."
+
+
+def test_transfer_sessions_take_a_slot_each(monkeypatch):
+
+    # Arrange
+    monkeypatch.setattr(_limits, "_LIMITS", _limits.Limits(per_host=1))
+    monkeypatch.setattr(
+        _sftp, "_sftp", lambda host, options=None: [sys.executable, "-c", ECHO_COMMANDS]
+    )
+    lock = threading.Lock()
+    sessions = {"running": 0, "peak": 0}
+    Popen = _sftp.sub.Popen
+
+    class CountingPopen(Popen):
+        def __init__(self, *args, **kwargs):
+            with lock:
+                sessions["running"] += 1
+                sessions["peak"] = max(sessions["peak"], sessions["running"])
+            super().__init__(*args, **kwargs)
+
+        def __exit__(self, *args):
+            result = super().__exit__(*args)
+            with lock:
+                sessions["running"] -= 1
+            return result
+
+    monkeypatch.setattr(_sftp.sub, "Popen", CountingPopen)
+    batches = [
+        [GET.format(remote=f"/pub/{ix}/file.txt", local=f"/tmp/{ix}.txt.part")]
+        for ix in range(4)
+    ]
+
+    # Act
+    threads = [
+        threading.Thread(target=_sftp._transfer, args=("example.com", batch, 1))
+        for batch in batches
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    result = sessions["peak"]
+    assert result == 1, f"Expected {result!r} sftp session at a time ..."
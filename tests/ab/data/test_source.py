@@ -56,3 +56,84 @@ def test_create_Source_using_Path_instances():
     result = source.url_
     expected = url_
     assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_Source_count_matches_resolved_pairs():
+
+    # Arrange
+    source = Source(
+        "SOURCE",
+        "DESCRIPTION",
+        "ftp://example.com/{year}/",
+        "/data/{year}",
+        filenames=["A{doy:03d}.gz", "B{doy:03d}.gz"],
+        parameters=dict(year=(2023, 2024), doy=(value for value in range(1, 4))),
+    )
+
+    # Act
+    result = source.count()
+
+    # Assert
+    expected = len(source.resolve())
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    expected = 12
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_Source_pairs_yields_first_pair_lazily():
+
+    # Arrange
+    source = Source(
+        "SOURCE",
+        "DESCRIPTION",
+        "ftp://example.com/{a}/{b}/",
+        "/data",
+        filenames=["file.txt"],
+        parameters=dict(a=range(10**6), b=range(10**6)),
+    )
+
+    # Act
+    pair = next(source.pairs())
+
+    # Assert
+    result = pair.uri
+    expected = "ftp://example.com/0/0/file.txt"
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    result = source.count()
+    expected = 10**12
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_Source_pairs_ignores_unused_parameters():
+
+    # Arrange
+    source = Source(
+        "SOURCE",
+        "DESCRIPTION",
+        "ftp://example.com/{year}/",
+        "/data/{year}",
+        filenames=["COD.EPH", "COD{doy}.CLK"],
+        parameters=dict(year=(2023, 2024), doy=(1, 2, 3)),
+    )
+
+    # Act
+    result = [pair.uri for pair in source.pairs()]
+
+    # Assert
+    expected = [
+        "ftp://example.com/2023/COD.EPH",
+        "ftp://example.com/2024/COD.EPH",
+        "ftp://example.com/2023/COD1.CLK",
+        "ftp://example.com/2023/COD2.CLK",
+        "ftp://example.com/2023/COD3.CLK",
+        "ftp://example.com/2024/COD1.CLK",
+        "ftp://example.com/2024/COD2.CLK",
+        "ftp://example.com/2024/COD3.CLK",
+    ]
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    result = source.count()
+    expected = len(expected)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
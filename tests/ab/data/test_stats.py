@@ -0,0 +1,70 @@
+import os
+
+from ab.data.stats import (
+    RemoteStat,
+    comparable,
+    already_synchronised,
+    is_current,
+    set_mtime,
+)
+
+
+def test_already_synchronised(tmp_path):
+
+    # Arrange
+    fname = tmp_path / "file.txt"
+    fname.write_text("content")
+    mtime = 1_700_000_000.0
+    os.utime(fname, (mtime, mtime))
+    size = len("content")
+
+    # Act and assert
+    assert already_synchronised(fname, RemoteStat(size, mtime))
+    assert already_synchronised(fname, RemoteStat(size=size))
+    assert already_synchronised(fname, RemoteStat(mtime=mtime + 0.5))
+    assert not already_synchronised(fname, RemoteStat(size + 1, mtime))
+    assert not already_synchronised(fname, RemoteStat(size, mtime + 60))
+    assert not already_synchronised(fname, RemoteStat())
+    assert not already_synchronised(tmp_path / "missing.txt", RemoteStat(size, mtime))
+
+
+def test_comparable_drops_size_of_decompressed_file():
+    remote = RemoteStat(size=10, mtime=1_700_000_000.0)
+
+    result = comparable(remote, decompressed=True)
+    expected = RemoteStat(mtime=1_700_000_000.0)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+    result2 = comparable(remote)
+    assert result2 is remote, f"Expected {result2!r} to be {remote!r} ..."
+
+    result3 = comparable(None, decompressed=True)
+    assert result3 is None, f"Expected {result3!r} to be None ..."
+
+
+def test_is_current_falls_back_to_max_age(tmp_path):
+
+    # Arrange
+    fname = tmp_path / "file.txt"
+    fname.write_text("content")
+
+    # Act and assert
+    assert is_current(fname, remote=RemoteStat())
+    assert is_current(fname, max_age=1, remote=None)
+    assert not is_current(fname, max_age=0, remote=RemoteStat())
+    assert not is_current(fname, max_age=1, remote=RemoteStat(size=0))
+
+
+def test_set_mtime(tmp_path):
+
+    # Arrange
+    fname = tmp_path / "file.txt"
+    fname.touch()
+    mtime = 1_700_000_000.0
+
+    # Act
+    set_mtime(fname, mtime)
+
+    # Assert
+    result = fname.stat().st_mtime
+    assert result == mtime, f"Expected {result!r} to be {mtime!r} ..."
@@ -1,5 +1,7 @@
 from ab.parameters import (
+    ipermutations,
     permutations,
+    count_permutations,
     resolvable,
 )
 
@@ -16,9 +18,43 @@ def test_permutations():
     assert result == expected, f"Expected {result!r} to be {expected!r} ..."
 
 
+def test_permutations_with_equal_values():
+    parameters = dict(a=(0, 1), b=(0, 1))
+    expected = [
+        dict(a=0, b=0),
+        dict(a=0, b=1),
+        dict(a=1, b=0),
+        dict(a=1, b=1),
+    ]
+    result = permutations(parameters)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_ipermutations_is_lazy():
+    parameters = dict(a=range(10**6), b=range(10**6))
+    expected = dict(a=0, b=0)
+    result = next(ipermutations(parameters))
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_count_permutations():
+    parameters = dict(a=(0, 1, 2), b=[2, 3], c=(value for value in "xyz"))
+    expected = 18
+    result = count_permutations(parameters)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
 def test_resolvable():
     parameters = dict(a=1, b=2)
     template = "{a}{a.bit_count()}"
     expected = dict(a=1)
     result = resolvable(parameters, template)
     assert result == expected, f"Expected {result!r} to be {expected!r} ..."
+
+
+def test_resolvable_with_format_specification():
+    parameters = dict(a=1, b=2, c=3)
+    template = "{a:03d}{b[0]}"
+    expected = dict(a=1, b=2)
+    result = resolvable(parameters, template)
+    assert result == expected, f"Expected {result!r} to be {expected!r} ..."